@@ -1,15 +1,109 @@
+import json
+from operator import attrgetter
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from api import models
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from api import denorm, models
+from api.export import csv_response
 from django.utils.translation import gettext as _
 
 
+# below this many estimated rows the changelists count exactly
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimated_count(queryset):
+    '''
+    The number of rows of the queryset estimated by the Postgres planner,
+    None on other databases
+    '''
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    # psycopg2 returns the json column as text to Django
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+def names(destination, relation):
+    '''
+    The names of the tags or features of a destination, for the export
+    '''
+    if settings.DESTINATION_CACHED_NAMES:
+        pairs = getattr(destination, denorm.FIELDS[relation])
+        return ", ".join(name for _, name in pairs)
+    return ", ".join(
+        obj.name for obj in getattr(destination, relation).all())
+
+
+class EstimatedCountPaginator(Paginator):
+    '''
+    Paginator of large tables, COUNT(*) reads every matching row, so
+    large counts are the estimate of the planner instead
+    '''
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    '''
+    Admin of a table with millions of rows: estimated counts, the users
+    of a page in the same query, searches that use an index
+    '''
+    paginator = EstimatedCountPaginator
+    # no second COUNT(*) of the whole table next to the search results
+    show_full_result_count = False
+    # the primary key orders the pages and the autocomplete results
+    ordering = ["-id"]
+    list_select_related = ["user"]
+    autocomplete_fields = ["user"]
+    actions = ["export_csv"]
+    # (header, function of an object) of the columns of the export
+    csv_columns = [
+        ("id", attrgetter("id")),
+        ("name", attrgetter("name")),
+        ("user", attrgetter("user.email")),
+    ]
+
+    def get_export_queryset(self, queryset):
+        return queryset
+
+    @admin.action(description=_("Export selected %(verbose_name_plural)s "
+                                "as CSV"))
+    def export_csv(self, request, queryset):
+        '''
+        Stream the selected rows, or with "select all" the rows of the
+        filtered changelist, as a CSV file
+        '''
+        return csv_response(
+            self.get_export_queryset(queryset), self.csv_columns,
+            f"{self.model._meta.verbose_name_plural}.csv")
+
+
 class UserAdmin(BaseUserAdmin):
     '''
     Custom user admin
     '''
     ordering = ["id"]
     list_display = ["email", "name"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # the unique index of the email also serves prefix searches
+    search_fields = ["email__startswith"]
+    search_help_text = _("Email starts with")
     fieldsets = (
         (None, {"fields": ("email", "password")}),
         (("Personal Info"), {"fields": ("name",)}),
@@ -31,7 +125,73 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class UserDeletionAdmin(admin.ModelAdmin):
+    '''
+    Progress of the user deletions, purged by the purge_users command
+    '''
+    ordering = ["-requested_at"]
+    list_display = ["email", "user_id", "requested_at", "finished_at",
+                    "progress"]
+    readonly_fields = list_display
+
+    def has_add_permission(self, request):
+        return False
+
+
+class DestinationAdmin(LargeTableAdmin):
+    '''
+    Destination admin, the tags and features are picked with search
+    boxes instead of a select of every tag and feature
+    '''
+    list_display = ["name", "country", "city", "rating", "user"]
+    autocomplete_fields = ["user", "tags", "features"]
+    search_fields = ["name__startswith"]
+    search_help_text = _("Name starts with, or the exact user email")
+
+    csv_columns = [
+        ("id", attrgetter("id")),
+        ("name", attrgetter("name")),
+        ("description", attrgetter("description")),
+        ("country", attrgetter("country")),
+        ("city", attrgetter("city")),
+        ("rating", attrgetter("rating")),
+        ("user", attrgetter("user.email")),
+        ("tags", lambda obj: names(obj, "tags")),
+        ("features", lambda obj: names(obj, "features")),
+    ]
+
+    def get_export_queryset(self, queryset):
+        if settings.DESTINATION_CACHED_NAMES:
+            # the names are read from the destination rows
+            return queryset
+        # the links of each chunk of the iterator in one query each
+        return queryset.prefetch_related("tags", "features")
+
+    def get_search_results(self, request, queryset, search_term):
+        # an OR of the name and the email of the joined user can use
+        # neither index, so an email is searched by itself
+        if '@' in search_term:
+            return queryset.filter(user__email=search_term.strip()), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+class TagAdmin(LargeTableAdmin):
+    '''
+    Tag admin, also searched by the tags of the destination admin
+    '''
+    list_display = ["name", "user"]
+    search_fields = ["name__startswith"]
+    search_help_text = _("Name starts with")
+
+
+class FeatureAdmin(TagAdmin):
+    '''
+    Feature admin
+    '''
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Destination)
-admin.site.register(models.Tag)
-admin.site.register(models.Feature)
+admin.site.register(models.UserDeletion, UserDeletionAdmin)
+admin.site.register(models.Destination, DestinationAdmin)
+admin.site.register(models.Tag, TagAdmin)
+admin.site.register(models.Feature, FeatureAdmin)
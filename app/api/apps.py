@@ -1,6 +1,51 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, \
+    post_save, pre_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api import checks as api_checks
+        checks.register(api_checks.check_replica_cache)
+        checks.register(api_checks.check_throttle_cache)
+
+        from api.metrics import install_query_wrapper
+        # count the queries of each request for the metrics endpoint
+        connection_created.connect(install_query_wrapper)
+
+        from api import denorm, events, stats, sync
+        from api.models import Destination, Feature, Tag
+        # keep the denormalized tag and feature names of destinations
+        for relation in denorm.FIELDS:
+            m2m_changed.connect(
+                denorm.links_changed,
+                sender=getattr(Destination, relation).through)
+
+        # keep the statistics of the users
+        pre_save.connect(stats.destination_pre_save, sender=Destination)
+        post_save.connect(stats.destination_saved, sender=Destination)
+        post_delete.connect(stats.destination_deleted, sender=Destination)
+        for relation in stats.RELATIONS:
+            m2m_changed.connect(
+                stats.links_changed,
+                sender=getattr(Destination, relation).through)
+        for model in (Tag, Feature):
+            post_delete.connect(stats.target_deleted, sender=model)
+
+        # record the deletions for the incremental sync
+        for model in (Destination, Tag, Feature):
+            post_delete.connect(sync.object_deleted, sender=model)
+
+        # push the changes to the event streams of their user
+        for model in (Destination, Tag, Feature):
+            post_save.connect(events.object_saved, sender=model)
+            post_delete.connect(events.object_deleted, sender=model)
+        for relation in denorm.FIELDS:
+            m2m_changed.connect(
+                events.links_changed,
+                sender=getattr(Destination, relation).through)
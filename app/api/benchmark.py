@@ -0,0 +1,140 @@
+'''
+HTTP load driver shared by the benchmark management commands
+'''
+import json
+import threading
+import time
+import uuid
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def http_request(method, url, headers=None, body=None, timeout=30):
+    '''
+    Send a request and return the status code and the response body
+    '''
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body).encode()
+        headers = {'Content-Type': 'application/json', **(headers or {})}
+    request = urllib.request.Request(
+        url, data=body, headers=headers or {}, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read()
+
+
+def multipart_body(field, file_name, content, content_type):
+    '''
+    Encode one file as multipart/form-data, returns headers and body
+    '''
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; '
+        f'filename="{file_name}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    headers = {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+    return headers, body
+
+
+def percentile(sorted_values, percent):
+    '''
+    Nearest-rank percentile of an already sorted list
+    '''
+    if not sorted_values:
+        return None
+    rank = max(int(round(percent / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class LoadResult:
+    '''
+    Latencies and errors collected while driving one endpoint
+    '''
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.latencies.append(latency)
+            if not ok:
+                self.errors += 1
+
+    def summary(self):
+        '''
+        Request count, throughput and latency percentiles in milliseconds
+        '''
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'seconds': round(self.elapsed, 3),
+            'rps': round(count / self.elapsed, 1) if self.elapsed else 0.0,
+            'mean_ms': ms(sum(latencies) / count) if count else None,
+            'p50_ms': ms(percentile(latencies, 50)),
+            'p95_ms': ms(percentile(latencies, 95)),
+            'p99_ms': ms(percentile(latencies, 99)),
+            'max_ms': ms(latencies[-1]) if count else None,
+        }
+
+
+def drive(make_request, total, concurrency):
+    '''
+    Call make_request(i) total times from concurrency threads
+
+    make_request performs one request and returns True on success.
+    '''
+    result = LoadResult()
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                ok = make_request(i)
+            except OSError:
+                ok = False
+            result.record(time.perf_counter() - start, ok)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def compare(results, baseline):
+    '''
+    Relative change of rps and p95 latency against a baseline run
+    '''
+    changes = {}
+    for name, summary in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        change = {}
+        for key in ('rps', 'p95_ms'):
+            if previous.get(key) and summary.get(key) is not None:
+                change[key] = round(
+                    (summary[key] - previous[key]) / previous[key] * 100, 1)
+        changes[name] = change
+    return changes
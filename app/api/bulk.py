@@ -0,0 +1,217 @@
+'''
+Set-based updates and deletes of many destinations, tags or features
+
+QuerySet.update() and a raw DELETE change any number of rows in one
+statement, but they bypass the signals keeping the denormalized names,
+see api/denorm.py, and the statistics, see api/stats.py. Each function
+here changes the rows and then repairs what those signals would have
+maintained, with set-based statements as well:
+- the names cached on the destinations linked to renamed, deleted or
+  merged tags and features are refreshed after the change commits, in
+  short batches, as they may be on many destinations. An interrupted
+  refresh is repaired by the check_denormalized command
+- the statistics of the user are recomputed with stats.rebuild() after
+  destinations changed, the rows of deleted tags and features deleted,
+  those of merged ones recomputed
+- the updated rows get a new updated_at and the deleted ones a
+  tombstone, for the sync of api/sync.py, and the changes are published
+  to the event streams, see api/events.py
+
+QuerySet.delete() is not used for models with post_delete receivers:
+the deletion collector loads every object to send their signals.
+'''
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Value
+from api import denorm, events, stats, sync, uploads
+from api.models import ClockTimestamp, Destination, ImageUpload, UserStat
+
+
+def raw_delete(queryset):
+    '''
+    DELETE the rows of the queryset in one statement, without signals or
+    cascades, returns their number
+    '''
+    return queryset._raw_delete(queryset.db)
+
+
+def delete_destination_rows(ids):
+    '''
+    Delete the destinations with their links and upload sessions, returns
+    their number and their files, to remove with remove_files() once the
+    rows are gone
+    '''
+    images = list(Destination.objects.filter(id__in=ids)
+                  .exclude(image='').exclude(image=None)
+                  .values_list('image', flat=True))
+    sessions = ImageUpload.objects.filter(destination_id__in=ids)
+    temp_paths = [upload.temp_path for upload in sessions]
+    sessions.delete()
+    for relation in denorm.FIELDS:
+        getattr(Destination, relation).through.objects.filter(
+            destination_id__in=ids).delete()
+    count = raw_delete(Destination.objects.filter(id__in=ids))
+    return count, (temp_paths, images)
+
+
+def remove_files(files):
+    '''
+    Remove the partial uploads and images of deleted destinations
+    '''
+    temp_paths, images = files
+    uploads.remove(temp_paths)
+    for name in images:
+        default_storage.delete(name)
+
+
+def relation_of(model):
+    '''
+    The relation of destinations to tags or to features
+    '''
+    return next(relation for relation in denorm.FIELDS
+                if getattr(Destination, relation).field.related_model
+                is model)
+
+
+def linked_destination_ids(model, ids):
+    '''
+    The ids of the destinations linked to the tags or features
+    '''
+    through = model.destination_set.through
+    return list(through.objects.filter(
+        **{f'{model._meta.model_name}_id__in': ids}
+    ).values_list('destination_id', flat=True).distinct())
+
+
+@transaction.atomic
+def update_destinations(user, ids, values):
+    '''
+    Set the field values of the destinations of the user, returns the
+    number of destinations updated
+    '''
+    count = Destination.objects.filter(user=user, id__in=ids).update(
+        **values, updated_at=ClockTimestamp())
+    events.publish(user.id, sync.kind_of(Destination), events.UPDATED, ids)
+    if count and {'country', 'rating'} & set(values):
+        stats.rebuild([user.id])
+    return count
+
+
+@transaction.atomic
+def delete_destinations(user, ids):
+    '''
+    Delete the destinations of the user with their links, upload
+    sessions and images, returns the number of destinations deleted
+    '''
+    # only the destinations of the user, and what depends on them
+    ids = list(Destination.objects.filter(user=user, id__in=ids)
+               .values_list('id', flat=True))
+    count, files = delete_destination_rows(ids)
+    # files are removed once the rows are gone
+    transaction.on_commit(lambda: remove_files(files))
+    sync.bury(Destination, user.id, ids)
+    events.publish(user.id, sync.kind_of(Destination), events.DELETED, ids)
+    if count:
+        stats.rebuild([user.id])
+    return count
+
+
+def update_targets(model, user, ids, values):
+    '''
+    Set the field values of tags or features of the user, returns the
+    number of items updated
+    '''
+    with transaction.atomic():
+        ids = list(model.objects.filter(user=user, id__in=ids)
+                   .values_list('id', flat=True))
+        count = model.objects.filter(id__in=ids).update(
+            **values, updated_at=ClockTimestamp())
+        destination_ids = linked_destination_ids(model, ids) \
+            if count and 'name' in values else []
+        events.publish(user.id, sync.kind_of(model), events.UPDATED, ids)
+    denorm.refresh_in_batches(destination_ids, (relation_of(model),))
+    events.publish(user.id, sync.kind_of(Destination), events.UPDATED,
+                   destination_ids)
+    return count
+
+
+def delete_targets(model, user, ids):
+    '''
+    Delete tags or features of the user with their links, returns the
+    number of items deleted
+    '''
+    with transaction.atomic():
+        ids = list(model.objects.filter(user=user, id__in=ids)
+                   .values_list('id', flat=True))
+        destination_ids = linked_destination_ids(model, ids)
+        model.destination_set.through.objects.filter(
+            **{f'{model._meta.model_name}_id__in': ids}).delete()
+        count = raw_delete(model.objects.filter(id__in=ids))
+        sync.bury(model, user.id, ids)
+        events.publish(user.id, sync.kind_of(model), events.DELETED, ids)
+        UserStat.objects.filter(
+            user=user,
+            dimension=model._meta.model_name,
+            key__in=[str(target_id) for target_id in ids]
+        ).delete()
+    denorm.refresh_in_batches(destination_ids, (relation_of(model),))
+    events.publish(user.id, sync.kind_of(Destination), events.UPDATED,
+                   destination_ids)
+    return count
+
+
+def merge_targets(model, user, target_id, source_ids):
+    '''
+    Fold tags or features of the user into the target: link the
+    destinations of the sources to the target and delete the sources,
+    returns the number of sources merged
+    '''
+    relation = relation_of(model)
+    with transaction.atomic():
+        count, destination_ids = merge_links(
+            model, user, target_id, source_ids)
+    denorm.refresh_in_batches(destination_ids, (relation,))
+    events.publish(user.id, sync.kind_of(Destination), events.UPDATED,
+                   destination_ids)
+    return count
+
+
+def merge_links(model, user, target_id, source_ids):
+    '''
+    The set-based part of merge_targets(), returns the number of sources
+    merged and the ids of their destinations
+    '''
+    relation = relation_of(model)
+    through = model.destination_set.through
+    target_field = f'{model._meta.model_name}_id'
+    # lock the items, so no link to a source is added meanwhile
+    source_ids = list(
+        model.objects.select_for_update()
+        .filter(user=user, id__in=source_ids)
+        .exclude(id=target_id)
+        .values_list('id', flat=True))
+    if not source_ids:
+        return 0, []
+    destination_ids = linked_destination_ids(model, source_ids)
+
+    # one INSERT ... SELECT of the links, skipping the destinations
+    # already linked to the target
+    quote = connection.ops.quote_name
+    links = through.objects.filter(
+        **{f'{target_field}__in': source_ids}
+    ).values_list('destination_id', Value(target_id))
+    sql, params = links.query.sql_with_params()
+    columns = (through._meta.get_field('destination').column,
+               through._meta.get_field(model._meta.model_name).column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(through._meta.db_table)} '
+            f'({", ".join(map(quote, columns))}) {sql} '
+            f'ON CONFLICT DO NOTHING', params)
+    through.objects.filter(**{f'{target_field}__in': source_ids}).delete()
+    count = raw_delete(model.objects.filter(id__in=source_ids))
+    sync.bury(model, user.id, source_ids)
+    events.publish(user.id, sync.kind_of(model), events.DELETED, source_ids)
+
+    stats.rebuild_targets(relation, [target_id, *source_ids])
+    return count, destination_ids
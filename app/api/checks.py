@@ -0,0 +1,48 @@
+'''
+System checks of the settings the API relies on, registered in
+ApiConfig.ready()
+'''
+from django.conf import settings
+from django.core import checks
+
+
+# cache backends whose entries the other worker processes never see
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+CACHE_HINT = 'Set CACHE_BACKEND, e.g. to ' \
+    'django.core.cache.backends.redis.RedisCache, and CACHE_LOCATION.'
+
+
+def shared_cache():
+    '''
+    Whether the default cache is shared by all worker processes
+    '''
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES
+
+
+def check_replica_cache(app_configs, **kwargs):
+    '''
+    The pins of api/db/router.py must be seen by every worker, or the
+    reads after a write go to a lagging replica
+    '''
+    if settings.DATABASE_REPLICAS and not shared_cache():
+        return [checks.Error(
+            'DATABASE_REPLICAS needs a cache shared by all workers.',
+            hint=CACHE_HINT, id='api.E001')]
+    return []
+
+
+def check_throttle_cache(app_configs, **kwargs):
+    '''
+    The buckets of api/throttling.py must be shared by every worker, or
+    each one allows the whole rate
+    '''
+    if settings.THROTTLE_ENABLED and not settings.DEBUG \
+            and not shared_cache():
+        return [checks.Error(
+            'THROTTLE_ENABLED needs a cache shared by all workers.',
+            hint=CACHE_HINT + ' Or set THROTTLE_ENABLED=0.',
+            id='api.E002')]
+    return []
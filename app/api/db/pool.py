@@ -0,0 +1,279 @@
+'''
+Bounded, thread-safe pool of database connections per worker process
+
+Django opens a new connection for every request when CONN_MAX_AGE is 0
+and closes it when the request finishes. The pooled backend hands out
+connections from this pool instead and returns them to it on close, so
+a connection is only opened once per worker and reused across requests
+and threads.
+'''
+import os
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    '''
+    No connection became available before the checkout timeout
+    '''
+
+
+class PooledConnection:
+    '''
+    A connection together with its bookkeeping timestamps
+    '''
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+
+
+class ConnectionPool:
+    '''
+    Pool of at most max_size connections for one set of connection params
+
+    Connections are created lazily by the connect callable passed to
+    getconn(). Idle connections are reused last-in first-out so the
+    least recently used ones age out after max_idle seconds. On checkout
+    a connection is discarded when it is closed, older than max_lifetime,
+    or idle for more than health_check_after seconds and failing check().
+    '''
+
+    def __init__(self, max_size=10, timeout=10.0, max_lifetime=3600.0,
+                 max_idle=600.0, health_check_after=5.0, check=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.check = check or self.default_check
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        '''
+        Forget all connections and counters
+        '''
+        self._pid = os.getpid()
+        self._idle = []
+        self._in_use = {}
+        # connections that are idle, in use or being opened
+        self._size = 0
+        self._waiting = 0
+        self.checkouts = 0
+        self.connects = 0
+        self.discards = 0
+        self.health_check_failures = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @staticmethod
+    def default_check(connection):
+        '''
+        Round trip to the database server
+        '''
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+
+    @staticmethod
+    def is_closed(connection):
+        return bool(getattr(connection, 'closed', False))
+
+    def _check_fork(self):
+        '''
+        Drop the parent's connections in a forked worker
+
+        The sockets are shared with the parent process, closing them
+        here would terminate the parent's sessions, so they are only
+        forgotten.
+        '''
+        if self._pid != os.getpid():
+            with self._cond:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def _acquire(self, deadline):
+        '''
+        Take an idle connection, or a free slot to open one (None)
+        '''
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    # close connections idle for too long, oldest first
+                    while self._idle and \
+                            now - self._idle[0].returned_at > self.max_idle:
+                        self._close(self._idle.pop(0))
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f'No database connection available within '
+                            f'{self.timeout} seconds, all {self.max_size} '
+                            f'connections are in use'
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+    def _close(self, pooled):
+        '''
+        Close a connection and free its slot, caller holds the lock
+        '''
+        self._size -= 1
+        self.discards += 1
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+        self._cond.notify()
+
+    def _discard(self, pooled):
+        with self._cond:
+            self._close(pooled)
+
+    def _is_healthy(self, pooled):
+        '''
+        Health check on checkout, see the class docstring
+        '''
+        now = time.monotonic()
+        if self.is_closed(pooled.connection) or \
+                now - pooled.created_at > self.max_lifetime:
+            return False
+        if now - pooled.returned_at > self.health_check_after:
+            try:
+                self.check(pooled.connection)
+            except Exception:
+                self.health_check_failures += 1
+                return False
+        return True
+
+    def getconn(self, connect):
+        '''
+        Check out a connection, opening one with connect() if needed
+        '''
+        self._check_fork()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            pooled = self._acquire(deadline)
+            if pooled is None:
+                try:
+                    pooled = PooledConnection(connect())
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                self.connects += 1
+            elif not self._is_healthy(pooled):
+                self._discard(pooled)
+                continue
+            break
+
+        wait = time.monotonic() - start
+        with self._cond:
+            self._in_use[id(pooled.connection)] = pooled
+            self.checkouts += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        return pooled.connection
+
+    def putconn(self, connection, discard=False):
+        '''
+        Return a checked out connection to the pool
+        '''
+        with self._cond:
+            pooled = self._in_use.pop(id(connection), None)
+            if pooled is None:
+                # checked out before a fork, or not from this pool
+                if self._pid == os.getpid():
+                    connection.close()
+                return
+            if discard or self.is_closed(connection) or \
+                    time.monotonic() - pooled.created_at > self.max_lifetime:
+                self._close(pooled)
+                return
+            pooled.returned_at = time.monotonic()
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def closeall(self):
+        '''
+        Close the idle connections, in use ones are closed when returned
+        '''
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop())
+
+    def stats(self):
+        '''
+        Counters and gauges for wait time and pool saturation
+        '''
+        with self._cond:
+            in_use = len(self._in_use)
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': in_use,
+                'waiting': self._waiting,
+                'saturation': in_use / self.max_size,
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'discards': self.discards,
+                'health_check_failures': self.health_check_failures,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': self.wait_seconds_total,
+                'wait_seconds_max': self.wait_seconds_max,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, **options):
+    '''
+    Return the pool of this process for the key, creating it once
+    '''
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(**options)
+    return pool
+
+
+def pool_stats():
+    '''
+    Stats of every pool of this process by database alias
+    '''
+    return {key[0]: pool.stats() for key, pool in list(_pools.items())}
+
+
+def close_pools():
+    '''
+    Close the idle connections of every pool of this process
+    '''
+    for pool in list(_pools.values()):
+        pool.closeall()
+
+
+def _forget_pools():
+    _pools.clear()
+
+
+# a forked worker starts with empty pools, the parent's connections
+# stay untouched (see ConnectionPool._check_fork)
+os.register_at_fork(after_in_child=_forget_pools)
@@ -0,0 +1,77 @@
+'''
+PostgreSQL backend that reuses connections from a per-worker pool
+
+Set 'ENGINE': 'api.db.postgresql' and configure the pool with the
+'POOL' key of the database settings (see api/db/pool.py).
+'''
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation \
+    as BaseDatabaseCreation
+from django.db.backends.base.base import NO_DB_ALIAS
+from api.db.pool import get_pool, close_pools
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+    '''
+    Close pooled connections before copying or dropping a test database,
+    Postgres refuses both while other sessions are connected
+    '''
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_pools()
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        '''
+        Pool of this worker for the alias and connection params
+        '''
+        options = {
+            key.lower(): value
+            for key, value in self.settings_dict.get('POOL', {}).items()
+        }
+        key = (self.alias, tuple(sorted(
+            (name, str(value)) for name, value in conn_params.items())))
+        return get_pool(key, **options)
+
+    @property
+    def pooling(self):
+        # the maintenance connection to the 'postgres' database
+        # is short-lived and never pooled
+        return self.alias != NO_DB_ALIAS and \
+            self.settings_dict.get('POOL', {}).get('MAX_SIZE', 1) > 0
+
+    def get_new_connection(self, conn_params):
+        if not self.pooling:
+            return super().get_new_connection(conn_params)
+        self._pool = self.get_pool(conn_params)
+        return self._pool.getconn(
+            lambda: super(DatabaseWrapper, self)
+            .get_new_connection(conn_params)
+        )
+
+    def _close(self):
+        pool = getattr(self, '_pool', None)
+        if self.connection is None or pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            connection = self.connection
+            # Django keeps using a connection closed inside an atomic
+            # block until the block exits, so it must not be handed out,
+            # and neither should one that raised a database error
+            discard = self.in_atomic_block or self.errors_occurred
+            # never hand out a connection with an open transaction
+            if not discard and not pool.is_closed(connection) \
+                    and not connection.autocommit:
+                try:
+                    connection.rollback()
+                except base.Database.Error:
+                    discard = True
+            pool.putconn(connection, discard=discard)
@@ -0,0 +1,99 @@
+'''
+Database router sending reads of the destination API to replicas
+
+Replicas are the aliases in settings.DATABASE_REPLICAS. Reads only go
+to a replica inside use_replica(), which the viewsets enter for safe
+requests through ReplicaReadMixin. After a successful write a user is
+pinned to the primary for settings.REPLICA_STICKY_SECONDS, so their
+next reads see their own writes even if the replicas lag behind.
+'''
+import contextvars
+import random
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+
+_read_alias = contextvars.ContextVar('replica_read_alias', default=None)
+
+
+def pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    '''
+    Read from the primary for the user during the sticky window
+    '''
+    if settings.DATABASE_REPLICAS:
+        cache.set(pin_key(user_id), True,
+                  settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(pin_key(user_id), False)
+
+
+@contextmanager
+def use_replica(user_id=None):
+    '''
+    Route the reads inside the block to a random replica,
+    unless there are none or the user is pinned to the primary
+    '''
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas or (user_id is not None and is_pinned(user_id)):
+        yield None
+        return
+    alias = random.choice(replicas)
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    '''
+    Read from the replica chosen by use_replica(), write to the primary
+    '''
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same data as the primary
+        return True
+
+
+class ReplicaReadMixin:
+    '''
+    Serve safe requests of a viewset from a replica and pin users
+    to the primary after their writes
+    '''
+    # actions only reading, whatever their method
+    read_actions = ()
+
+    def is_read(self, request):
+        return request.method in SAFE_METHODS \
+            or getattr(self, 'action', None) in self.read_actions
+
+    def initial(self, request, *args, **kwargs):
+        # authenticate first, stickiness is decided per user
+        super().initial(request, *args, **kwargs)
+        if self.is_read(request):
+            self._replica = use_replica(request.user.id)
+            self._replica.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica = getattr(self, '_replica', None)
+        if replica is not None:
+            self._replica = None
+            replica.__exit__(None, None, None)
+        elif not self.is_read(request) and \
+                response.status_code < 400 and request.user.is_authenticated:
+            pin_to_primary(request.user.id)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,179 @@
+'''
+Denormalized tag and feature names of destinations
+
+Destination.cached_tags and cached_features hold the [id, name] pairs
+of its tags and features sorted by id, so destination lists serve them
+from the destination rows without joining the link tables. They are
+kept up to date by:
+- DestinationSerializer, which writes them with the destination row
+  and suspends the signal below while it changes the links
+- the m2m_changed signal of Destination.tags and features, for the
+  links changed anywhere else
+- TagViewSet and FeatureViewSet, when a tag or feature is renamed or
+  deleted
+
+A refresh also sets the updated_at of the destinations, as their
+representation changed, so the sync of api/sync.py sends them again.
+
+The check_denormalized command finds and repairs drift, e.g. after a
+rename in the admin or a raw SQL update.
+'''
+import json
+import threading
+from contextlib import contextmanager
+from django.db import connection, transaction
+from api.models import ClockTimestamp, Destination
+
+
+# the cached field of each many-to-many relation of destinations
+FIELDS = {'tags': 'cached_tags', 'features': 'cached_features'}
+BATCH_SIZE = 1000
+
+_state = threading.local()
+
+
+def entries(objs):
+    '''
+    The cached value of tags or features
+    '''
+    return sorted([obj.id, obj.name] for obj in objs)
+
+
+def expected(destination_ids, relation):
+    '''
+    The cached values of the destinations from their link table
+    '''
+    field = getattr(Destination, relation).field
+    through = field.remote_field.through
+    target = field.m2m_reverse_field_name()
+    values = {destination_id: [] for destination_id in destination_ids}
+    for destination_id, target_id, name in (
+            through.objects
+            .filter(destination_id__in=destination_ids)
+            .order_by(target + '_id')
+            .values_list('destination_id', target + '_id',
+                         target + '__name')):
+        values[destination_id].append([target_id, name])
+    return values
+
+
+def refresh_sql(destination_ids, relations):
+    '''
+    refresh() on Postgres, a single UPDATE aggregating the names of each
+    relation
+    '''
+    quote = connection.ops.quote_name
+    table = quote(Destination._meta.db_table)
+    assignments = []
+    for relation in relations:
+        field = getattr(Destination, relation).field
+        through = field.remote_field.through._meta
+        target = field.related_model._meta
+        target_column = through.get_field(
+            field.m2m_reverse_field_name()).column
+        destination_column = through.get_field(field.m2m_field_name()).column
+        assignments.append(
+            f'{quote(FIELDS[relation])} = COALESCE(('
+            f'SELECT jsonb_agg(jsonb_build_array(target.id, target.name) '
+            f'ORDER BY target.id) '
+            f'FROM {quote(through.db_table)} link '
+            f'JOIN {quote(target.db_table)} target '
+            f'ON target.id = link.{quote(target_column)} '
+            f'WHERE link.{quote(destination_column)} = {table}.id'
+            f"), '[]'::jsonb)")
+    assignments.append(f'{quote("updated_at")} = CLOCK_TIMESTAMP()')
+    sql = f'UPDATE {table} SET {", ".join(assignments)}'
+    returning = ', '.join(quote(FIELDS[relation]) for relation in relations)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} WHERE id = ANY(%s) RETURNING id, {returning}',
+                       [list(destination_ids)])
+        # psycopg2 returns jsonb as text to Django
+        return {row[0]: {FIELDS[relation]: json.loads(value)
+                         for relation, value in zip(relations, row[1:])}
+                for row in cursor.fetchall()}
+
+
+def refresh(destination_ids, relations=tuple(FIELDS)):
+    '''
+    Rewrite the cached values of the destinations from the link tables,
+    returns the new values of each destination
+    '''
+    if connection.vendor == 'postgresql':
+        return refresh_sql(list(destination_ids), relations)
+    destination_ids = sorted(set(destination_ids))
+    fields = [FIELDS[relation] for relation in relations] + ['updated_at']
+    updated = {}
+    for start in range(0, len(destination_ids), BATCH_SIZE):
+        batch = destination_ids[start:start + BATCH_SIZE]
+        values = {relation: expected(batch, relation)
+                  for relation in relations}
+        objs = [Destination(id=destination_id, updated_at=ClockTimestamp(), **{
+                    FIELDS[relation]: values[relation][destination_id]
+                    for relation in relations})
+                for destination_id in batch]
+        Destination.objects.bulk_update(objs, fields)
+        updated.update(
+            (obj.id, {FIELDS[relation]: getattr(obj, FIELDS[relation])
+                      for relation in relations})
+            for obj in objs)
+    return updated
+
+
+def refresh_in_batches(destination_ids, relations=tuple(FIELDS),
+                       batch_size=BATCH_SIZE):
+    '''
+    refresh() with a transaction per batch, so refreshing many
+    destinations never locks all of them at once
+    '''
+    destination_ids = list(destination_ids)
+    for start in range(0, len(destination_ids), batch_size):
+        with transaction.atomic():
+            refresh(destination_ids[start:start + batch_size], relations)
+
+
+@contextmanager
+def suspended():
+    '''
+    Do not refresh the cached values when links change in the block,
+    the caller writes them itself
+    '''
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = False
+
+
+def is_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+def links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    '''
+    m2m_changed receiver of the links of destinations
+    '''
+    if is_suspended():
+        return
+    relation = next(name for name in FIELDS
+                    if getattr(Destination, name).through is sender)
+    if reverse and action == 'pre_clear':
+        # the destinations are unknown once the links are gone
+        instance._cleared_destination_ids = list(
+            instance.destination_set.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        ids = [instance.pk]
+    elif action == 'post_clear':
+        ids = instance.__dict__.pop('_cleared_destination_ids', [])
+    else:
+        ids = pk_set
+    if action != 'post_clear' and not pk_set:
+        return
+    updated = refresh(ids, (relation,))
+    if not reverse:
+        # a later save() of the instance must not write the old value
+        setattr(instance, FIELDS[relation],
+                updated[instance.pk][FIELDS[relation]])
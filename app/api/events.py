@@ -0,0 +1,269 @@
+'''
+Change events of destinations, tags and features, pushed to the event
+streams of their user, see destination/async_events.py
+
+Writers publish() the ids of the created, updated or deleted items once
+their transaction commits:
+- receivers of post_save, post_delete and m2m_changed publish the
+  changes made through the ORM
+- the set-based writes of api/bulk.py publish their own
+
+On Postgres an event is sent with NOTIFY, unless EVENTS_NOTIFY is off,
+so it reaches the ASGI workers from any process. Every ASGI worker
+LISTENs on one dedicated connection, read by its event loop, and its
+Broker hands each event to the subscriptions of the user in memory.
+Otherwise the events of the process go straight to its broker. So an
+idle stream costs a subscription in memory, neither a thread nor a
+database connection.
+
+A subscription buffers EVENTS_QUEUE_SIZE events, a client reading
+slower, or missing events while the listener reconnects, gets an
+overflow event and resyncs with the changes endpoint, see api/sync.py.
+'''
+import asyncio
+import json
+import logging
+from collections import defaultdict, deque
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from django.conf import settings
+from django.db import connection, connections, transaction
+from api import denorm, sync
+from api.models import Destination
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'api_events'
+CREATED, UPDATED, DELETED = 'created', 'updated', 'deleted'
+# ids per NOTIFY, whose payload is limited to 8000 bytes
+NOTIFY_IDS = 500
+# seconds between two connection attempts of the listener
+RECONNECT_SECONDS = 5
+
+
+def notifies():
+    '''
+    Whether the events go through NOTIFY instead of the process
+    '''
+    return settings.EVENTS_NOTIFY and connection.vendor == 'postgresql'
+
+
+def publish(user_id, kind, action, ids):
+    '''
+    Send an event with the ids of destinations, tags or features of the
+    user once the current transaction commits
+    '''
+    ids = list(ids)
+    if not settings.EVENTS_ENABLED or not ids:
+        return
+    payloads = [json.dumps({'user_id': user_id, 'kind': kind,
+                            'action': action,
+                            'ids': ids[start:start + NOTIFY_IDS]})
+                for start in range(0, len(ids), NOTIFY_IDS)]
+    if notifies():
+        transaction.on_commit(lambda: notify(payloads))
+    else:
+        transaction.on_commit(lambda: broker.publish(payloads))
+
+
+def notify(payloads):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, payload) '
+                       'FROM unnest(%s::text[]) payload',
+                       [CHANNEL, payloads])
+
+
+def object_saved(sender, instance, created, **kwargs):
+    '''
+    post_save receiver of destinations, tags and features
+    '''
+    publish(instance.user_id, sync.kind_of(sender),
+            CREATED if created else UPDATED, [instance.pk])
+
+
+def object_deleted(sender, instance, **kwargs):
+    '''
+    post_delete receiver of destinations, tags and features
+    '''
+    publish(instance.user_id, sync.kind_of(sender), DELETED, [instance.pk])
+
+
+def links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    '''
+    m2m_changed receiver of the links of destinations, which change
+    their tags or features
+    '''
+    # the caller saves the destination, which publishes it
+    if denorm.is_suspended():
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    ids = pk_set if reverse else [instance.pk]
+    if ids:
+        publish(instance.user_id, sync.kind_of(Destination), UPDATED, ids)
+
+
+class Subscription:
+    '''
+    The events of a user for one stream, buffered until it reads them
+    '''
+
+    def __init__(self, user_id, max_size):
+        self.user_id = user_id
+        self.max_size = max_size
+        self.events = deque()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+        self.closed = False
+
+    def push(self, event):
+        if len(self.events) >= self.max_size:
+            self.overflowed = True
+        else:
+            self.events.append(event)
+        self.ready.set()
+
+    def overflow(self):
+        self.overflowed = True
+        self.ready.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    async def next(self, timeout):
+        '''
+        The events pushed since the last call, waiting up to timeout
+        seconds for one, [] after the timeout
+        '''
+        if not self.events and not self.overflowed and not self.closed:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.ready.clear()
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+
+class Listener:
+    '''
+    LISTEN on a dedicated connection, polled by the event loop when the
+    socket is readable, reconnecting after errors
+    '''
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.conn = None
+        self.loop = None
+        # the scheduled reconnection
+        self.handle = None
+
+    def connect(self):
+        # the parameters of Django, without its pool
+        conn = psycopg2.connect(
+            **connections['default'].get_connection_params())
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return conn
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        try:
+            self.conn = await self.loop.run_in_executor(None, self.connect)
+        except psycopg2.Error as error:
+            logger.warning('Cannot listen to events: %s', error)
+            self.retry()
+            return
+        self.loop.add_reader(self.conn.fileno(), self.read)
+
+    def retry(self):
+        self.handle = self.loop.call_later(
+            RECONNECT_SECONDS, lambda: asyncio.ensure_future(self.start()))
+
+    def stop(self):
+        if self.handle:
+            self.handle.cancel()
+        if self.conn and not self.conn.closed:
+            self.loop.remove_reader(self.conn.fileno())
+            self.conn.close()
+
+    def read(self):
+        try:
+            self.conn.poll()
+        except psycopg2.Error as error:
+            logger.warning('Lost the events connection: %s', error)
+            self.loop.remove_reader(self.conn.fileno())
+            self.conn.close()
+            # the events sent meanwhile are lost
+            self.broker.overflow()
+            self.retry()
+            return
+        while self.conn.notifies:
+            notification = self.conn.notifies.pop(0)
+            self.broker.dispatch(json.loads(notification.payload))
+
+
+class Broker:
+    '''
+    The subscriptions of the streams of the process, per user
+    '''
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.loop = None
+        self.listener = None
+
+    async def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.stop()
+            self.loop = loop
+            if notifies():
+                self.listener = Listener(self)
+                await self.listener.start()
+        subscription = Subscription(user_id, settings.EVENTS_QUEUE_SIZE)
+        self.subscriptions[user_id].add(subscription)
+        return subscription
+
+    def stop(self):
+        '''
+        Close the listener, a new one starts with the next subscription
+        '''
+        if self.listener:
+            self.listener.stop()
+        self.listener = None
+        self.loop = None
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscriptions[subscription.user_id]
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscriptions[subscription.user_id]
+
+    def dispatch(self, event):
+        '''
+        Hand the event to the subscriptions of its user, in the loop
+        '''
+        for subscription in self.subscriptions.get(event['user_id'], ()):
+            subscription.push(event)
+
+    def overflow(self):
+        for subscriptions in self.subscriptions.values():
+            for subscription in subscriptions:
+                subscription.overflow()
+
+    def publish(self, payloads):
+        '''
+        Dispatch events of this process from any thread
+        '''
+        if self.loop is None or self.loop.is_closed():
+            return
+        for payload in payloads:
+            self.loop.call_soon_threadsafe(self.dispatch, json.loads(payload))
+
+
+broker = Broker()
@@ -0,0 +1,51 @@
+'''
+CSV exports of large querysets, streamed
+
+The rows are read with QuerySet.iterator(), a chunk at a time (with a
+server-side cursor on Postgres), and each chunk is written to the
+client as soon as it is read. So exporting a million destinations
+never holds more than a chunk in the memory of the worker, and the
+download starts at once.
+'''
+import csv
+from django.http import StreamingHttpResponse
+
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    '''
+    File-like object returning what is written to it, for csv.writer
+    '''
+
+    def write(self, value):
+        return value
+
+
+def rows(queryset, columns, chunk_size=CHUNK_SIZE):
+    '''
+    The CSV lines of the objects of the queryset, a chunk of lines at
+    a time, columns are (header, function of an object) pairs
+    '''
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _ in columns])
+    lines = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        lines.append(writer.writerow([value(obj) for _, value in columns]))
+        if len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def csv_response(queryset, columns, filename, chunk_size=CHUNK_SIZE):
+    '''
+    A download of the objects of the queryset as a CSV file
+    '''
+    response = StreamingHttpResponse(
+        rows(queryset, columns, chunk_size),
+        content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,89 @@
+'''
+Readiness checks of a worker
+
+The checks run at most once per settings.READINESS_CACHE_SECONDS in
+each worker process, probes in between get the cached result. Once
+all migrations are applied they stay applied for the life of the
+worker, so that check only runs until it first succeeds.
+'''
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from api.db.pool import PoolTimeout
+
+
+_lock = threading.Lock()
+_result = None
+_checked_at = None
+_migrated = False
+
+
+def check_database():
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def check_migrations():
+    global _migrated
+    if _migrated:
+        return
+    executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if plan:
+        raise RuntimeError(f'{len(plan)} unapplied migrations')
+    _migrated = True
+
+
+def check_media():
+    with tempfile.TemporaryFile(dir=settings.MEDIA_ROOT) as probe:
+        probe.write(b'ready')
+
+
+CHECKS = {
+    'database': check_database,
+    'migrations': check_migrations,
+    'media': check_media,
+}
+
+
+def run_checks():
+    '''
+    Run every check, returns the error of each failed one
+    '''
+    errors = {}
+    for name, check in CHECKS.items():
+        if name == 'migrations' and 'database' in errors:
+            errors[name] = 'skipped, the database is unavailable'
+            continue
+        try:
+            check()
+        except (DatabaseError, PoolTimeout, OSError, RuntimeError) as error:
+            errors[name] = str(error) or error.__class__.__name__
+    return errors
+
+
+def readiness():
+    '''
+    The result of the checks, cached per worker
+    '''
+    global _result, _checked_at
+    with _lock:
+        now = time.monotonic()
+        if _checked_at is None or \
+                now - _checked_at >= settings.READINESS_CACHE_SECONDS:
+            _result = run_checks()
+            _checked_at = now
+        return _result
+
+
+def reset():
+    '''
+    Forget the cached result, for tests
+    '''
+    global _result, _checked_at, _migrated
+    with _lock:
+        _result = _checked_at = None
+        _migrated = False
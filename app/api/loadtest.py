@@ -0,0 +1,164 @@
+'''
+Seeded dataset and request scenarios of the loadtest command
+
+seed() fills the database with users that share an email prefix, each
+with the same number of destinations, using the generator of
+api/synthetic.py. The same options always produce the same dataset.
+'''
+import io
+import json
+import random
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from api.benchmark import http_request, multipart_body
+from api.synthetic import PASSWORD, Generator, Writer
+
+
+BATCH_SIZE = 1000
+
+
+@transaction.atomic
+def seed(prefix='loadtest', users=10, destinations=100, tags=10, features=10,
+         tags_per_destination=3, features_per_destination=3, seed=0):
+    '''
+    Replace the users of the prefix with a fresh dataset,
+    returns the auth token of every user
+    '''
+    user_model = get_user_model()
+    user_model.objects.filter(email__startswith=f'{prefix}-').delete()
+    Generator(
+        users=users,
+        destinations=users * destinations,
+        tags_per_user=tags,
+        features_per_user=features,
+        tags_per_destination=tags_per_destination,
+        features_per_destination=features_per_destination,
+        prefix=prefix,
+        seed=seed,
+    ).run(Writer())
+
+    created = user_model.objects.filter(email__startswith=f'{prefix}-')
+    Token.objects.bulk_create(
+        [Token(user=user, key=Token.generate_key()) for user in created],
+        batch_size=BATCH_SIZE)
+    return dict(Token.objects.filter(user__in=created)
+                .values_list('user__email', 'key'))
+
+
+def sample_image():
+    image = Image.new('RGB', (64, 64), (200, 120, 40))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class Scenarios:
+    '''
+    One request per scenario, spread over the seeded users
+
+    Every method takes the request number and returns True when the
+    response has the expected status code.
+    '''
+
+    def __init__(self, base_url, prefix, tokens):
+        self.base_url = base_url.rstrip('/')
+        self.prefix = prefix
+        self.emails = sorted(tokens)
+        self.tokens = [tokens[email] for email in self.emails]
+        self.destination_ids = {}
+        self.image = sample_image()
+        self.run_id = random.randrange(1 << 32)
+
+    def url(self, path):
+        return f'{self.base_url}/api/{path}'
+
+    def auth(self, i):
+        return {'Authorization': f'Token {self.tokens[i % len(self.tokens)]}'}
+
+    def destination_id(self, i):
+        '''
+        The id of one destination of the i-th user, read once
+        '''
+        index = i % len(self.tokens)
+        if index not in self.destination_ids:
+            _, body = http_request(
+                'GET', self.url('destination/destinations/'),
+                headers=self.auth(i))
+            ids = [item['id'] for item in json.loads(body)]
+            self.destination_ids[index] = ids[0] if ids else None
+        return self.destination_ids[index]
+
+    def user_create(self, i):
+        status, _ = http_request('POST', self.url('user/create/'), body={
+            'email': f'{self.prefix}-new-{self.run_id}-{i}@example.com',
+            'password': PASSWORD,
+            'name': f'New user {i}',
+        })
+        return status == 201
+
+    def token(self, i):
+        status, _ = http_request('POST', self.url('user/token/'), body={
+            'email': self.emails[i % len(self.emails)],
+            'password': PASSWORD,
+        })
+        return status == 200
+
+    def destination_list(self, i):
+        status, _ = http_request('GET', self.url('destination/destinations/'),
+                                 headers=self.auth(i))
+        return status == 200
+
+    def destination_detail(self, i):
+        destination_id = self.destination_id(i)
+        status, _ = http_request(
+            'GET', self.url(f'destination/destinations/{destination_id}/'),
+            headers=self.auth(i))
+        return status == 200
+
+    def destination_create(self, i):
+        status, _ = http_request(
+            'POST', self.url('destination/destinations/'),
+            headers=self.auth(i), body={
+                'name': f'Load test {i}',
+                'country': 'France',
+                'city': 'Paris',
+                'rating': '4.5',
+                'tags': [{'name': 'Beach'}, {'name': 'City'}],
+                'features': [{'name': 'Wifi'}],
+            })
+        return status == 201
+
+    def tag_list(self, i):
+        status, _ = http_request('GET', self.url('destination/tags/'),
+                                 headers=self.auth(i))
+        return status == 200
+
+    def feature_list(self, i):
+        status, _ = http_request('GET', self.url('destination/features/'),
+                                 headers=self.auth(i))
+        return status == 200
+
+    def upload_image(self, i):
+        destination_id = self.destination_id(i)
+        headers, body = multipart_body(
+            'image', f'load-{i}.jpg', self.image, 'image/jpeg')
+        status, _ = http_request(
+            'POST',
+            self.url(f'destination/destinations/{destination_id}'
+                     '/upload-image/'),
+            headers={**self.auth(i), **headers}, body=body)
+        return status == 200
+
+
+SCENARIOS = {
+    'user-create': Scenarios.user_create,
+    'token': Scenarios.token,
+    'destination-list': Scenarios.destination_list,
+    'destination-detail': Scenarios.destination_detail,
+    'destination-create': Scenarios.destination_create,
+    'tag-list': Scenarios.tag_list,
+    'feature-list': Scenarios.feature_list,
+    'upload-image': Scenarios.upload_image,
+}
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+import json
+from api.benchmark import drive, http_request
+
+
+class Command(BaseCommand):
+    """
+    Django command comparing the concurrency capacity of the uWSGI
+    and the ASGI server for the same read endpoint.
+
+    Start both servers with the same number of workers, e.g.
+    scripts/run.sh and scripts/run-asgi.sh with WORKERS=4, then:
+
+    python manage.py bench_concurrency --token <token> \\
+        --wsgi-url http://localhost:8000/api/destination/destinations/ \\
+        --asgi-url http://localhost:8001/api/async/destination/destinations/
+    """
+    help = 'Compare throughput and latency of the uWSGI and ASGI servers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', required=True)
+        parser.add_argument('--asgi-url', required=True)
+        parser.add_argument('--token', required=True,
+                            help='Auth token sent with every request')
+        parser.add_argument('--concurrency', default='1,8,32,128',
+                            help='Comma separated client concurrency levels')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requests per server and concurrency level')
+        parser.add_argument('--output', help='Write the results as JSON')
+
+    def handle(self, *args, **options):
+        headers = {'Authorization': f'Token {options["token"]}'}
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        servers = {'wsgi': options['wsgi_url'], 'asgi': options['asgi_url']}
+        results = []
+
+        self.stdout.write(
+            f'{"concurrency":>11} {"server":>6} {"rps":>8} '
+            f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>6}')
+        for level in levels:
+            for server, url in servers.items():
+                def make_request(i, url=url):
+                    status, _ = http_request('GET', url, headers=headers)
+                    return status == 200
+
+                summary = drive(make_request, options['requests'], level)
+                summary = summary.summary()
+                results.append(
+                    {'server': server, 'concurrency': level, **summary})
+                self.stdout.write(
+                    f'{level:>11} {server:>6} {summary["rps"]:>8} '
+                    f'{summary["p50_ms"]:>8} {summary["p95_ms"]:>8} '
+                    f'{summary["p99_ms"]:>8} {summary["errors"]:>6}')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Results written to {options["output"]}'))
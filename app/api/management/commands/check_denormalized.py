@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from api import denorm
+from api.models import Destination
+
+
+class Command(BaseCommand):
+    """
+    Django command comparing the denormalized tag and feature names of
+    destinations with the link tables, batch by batch, and rewriting
+    the ones that drifted:
+
+    python manage.py check_denormalized --dry-run
+    """
+    help = 'Find and repair drift of the denormalized names of destinations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report, fail if anything drifted')
+        parser.add_argument('--batch-size', type=int,
+                            default=denorm.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        checked = 0
+        drifted = []
+        last_id = 0
+        fields = list(denorm.FIELDS.values())
+        while True:
+            rows = list(Destination.objects
+                        .filter(id__gt=last_id).order_by('id')
+                        .values_list('id', *fields)
+                        [:options['batch_size']])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            ids = [row[0] for row in rows]
+            expected = [denorm.expected(ids, relation)
+                        for relation in denorm.FIELDS]
+            batch = [row[0] for row in rows
+                     if any(row[1 + index] != values[row[0]]
+                            for index, values in enumerate(expected))]
+            checked += len(rows)
+            drifted += batch
+            if batch and not options['dry_run']:
+                denorm.refresh(batch)
+
+        self.stdout.write(f'Checked {checked} destinations, '
+                          f'{len(drifted)} drifted')
+        if drifted and options['dry_run']:
+            raise CommandError(
+                'Drifted destinations: '
+                + ', '.join(map(str, drifted[:20]))
+                + (' ...' if len(drifted) > 20 else ''))
+        if drifted:
+            self.stdout.write(self.style.SUCCESS(
+                f'Repaired {len(drifted)} destinations'))
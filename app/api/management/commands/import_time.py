@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+import re
+import subprocess
+import sys
+
+
+IMPORT_TIME_RE = re.compile(
+    r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse(report):
+    '''
+    Entries of a -X importtime report as (module, self us, cumulative us,
+    depth), in the order Python finished importing them
+    '''
+    entries = []
+    for line in report.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us),
+                            (len(indent) - 1) // 2))
+    return entries
+
+
+class Command(BaseCommand):
+    """
+    Django command measuring the import cost of setting up Django and
+    importing a module in a fresh interpreter with -X importtime, by
+    default what a uWSGI worker loads at boot:
+
+    python manage.py import_time --top 30 --output importtime.txt
+
+    The raw report written by --output can be opened with tuna.
+    """
+    help = 'Report the modules that are slowest to import at boot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='app.wsgi',
+                            help='Module to import')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--sort', choices=('self', 'cumulative'),
+                            default='self',
+                            help='Rank modules by their own import time, '
+                                 'or including their imports')
+        parser.add_argument('--output', help='Write the raw report')
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c',
+             f'import django; django.setup(); import {options["module"]}'],
+            capture_output=True, text=True)
+        if result.returncode:
+            error = '\n'.join(
+                line for line in result.stderr.splitlines()
+                if not IMPORT_TIME_RE.match(line))
+            raise CommandError(
+                f'Importing {options["module"]} failed:\n{error}')
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(result.stderr)
+
+        entries = parse(result.stderr)
+        total = sum(entry[1] for entry in entries)
+        key = 1 if options['sort'] == 'self' else 2
+        self.stdout.write(f'{"self ms":>9} {"cumul. ms":>9}  module')
+        for module, self_us, cumulative_us, depth in sorted(
+                entries, key=lambda entry: entry[key],
+                reverse=True)[:options['top']]:
+            self.stdout.write(
+                f'{self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}  '
+                f'{module}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(entries)} modules imported in {total / 1000:.0f}ms'))
@@ -0,0 +1,160 @@
+from django.core.management.base import BaseCommand, CommandError
+import json
+import os
+import subprocess
+import sys
+import time
+from rest_framework.authtoken.models import Token
+from api.benchmark import compare, drive, http_request
+from api.loadtest import SCENARIOS, Scenarios, seed
+
+
+class Command(BaseCommand):
+    """
+    Django command seeding a large dataset and load testing the API.
+
+    Runs fully locally against the configured database, SQLite or
+    Postgres. With --serve a development server is started on --port,
+    otherwise --base-url must point at a running server, e.g. uWSGI
+    started by scripts/run.sh with THROTTLE_ENABLED=0:
+
+    python manage.py loadtest --users 50 --destinations 200 \\
+        --concurrency 16 --output results.json --baseline before.json
+    """
+    help = 'Seed a dataset and report latency and throughput per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='loadtest',
+                            help='Email prefix of the seeded users')
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--destinations', type=int, default=100,
+                            help='Destinations per user')
+        parser.add_argument('--tags', type=int, default=10,
+                            help='Tags per user')
+        parser.add_argument('--features', type=int, default=10,
+                            help='Features per user')
+        parser.add_argument('--tags-per-destination', type=int, default=3)
+        parser.add_argument('--features-per-destination', type=int,
+                            default=3)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random dataset')
+        parser.add_argument('--seed-only', action='store_true',
+                            help='Seed the dataset without load testing')
+        parser.add_argument('--no-seed', action='store_true',
+                            help='Reuse the dataset of a previous run')
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--serve', action='store_true',
+                            help='Start a development server for the run')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help='Comma separated scenarios to run')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per scenario')
+        parser.add_argument('--output', help='Write the results as JSON')
+        parser.add_argument('--baseline',
+                            help='JSON results of a previous run to compare')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'].split(',')
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(
+                f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+        if options['no_seed']:
+            tokens = self.existing_tokens(options['prefix'])
+        else:
+            start = time.perf_counter()
+            tokens = seed(
+                prefix=options['prefix'],
+                users=options['users'],
+                destinations=options['destinations'],
+                tags=options['tags'],
+                features=options['features'],
+                tags_per_destination=options['tags_per_destination'],
+                features_per_destination=options['features_per_destination'],
+                seed=options['seed'],
+            )
+            self.stdout.write(
+                f'Seeded {len(tokens)} users in '
+                f'{time.perf_counter() - start:.1f}s')
+        if options['seed_only']:
+            return
+        if not tokens:
+            raise CommandError('No seeded users, run without --no-seed')
+
+        server = None
+        base_url = options['base_url']
+        if options['serve']:
+            base_url = f'http://127.0.0.1:{options["port"]}'
+            server = self.serve(options['port'], base_url)
+        try:
+            results = self.run(
+                Scenarios(base_url, options['prefix'], tokens), names,
+                options['requests'], options['concurrency'])
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                self.report_changes(compare(results, json.load(baseline)))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Results written to {options["output"]}'))
+
+    def existing_tokens(self, prefix):
+        return dict(Token.objects.filter(user__email__startswith=f'{prefix}-')
+                    .exclude(user__email__startswith=f'{prefix}-new-')
+                    .values_list('user__email', 'key'))
+
+    def serve(self, port, base_url):
+        '''
+        Start runserver with the settings of this process, without
+        throttling, and wait for its health check
+        '''
+        server = subprocess.Popen(
+            [sys.executable, 'manage.py', 'runserver', '--noreload',
+             f'127.0.0.1:{port}'],
+            cwd=os.path.dirname(os.path.abspath(sys.argv[0])),
+            env={**os.environ, 'THROTTLE_ENABLED': '0'},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(50):
+            try:
+                status, _ = http_request(
+                    'GET', f'{base_url}/api/health-check/', timeout=1)
+                if status == 200:
+                    return server
+            except OSError:
+                pass
+            time.sleep(0.2)
+        server.terminate()
+        raise CommandError('The development server did not start')
+
+    def run(self, scenarios, names, requests, concurrency):
+        results = {}
+        self.stdout.write(
+            f'{"scenario":>20} {"rps":>8} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"p99 ms":>8} {"errors":>6}')
+        for name in names:
+            scenario = SCENARIOS[name]
+            summary = drive(
+                lambda i: scenario(scenarios, i), requests, concurrency)
+            summary = results[name] = {
+                'concurrency': concurrency, **summary.summary()}
+            self.stdout.write(
+                f'{name:>20} {summary["rps"]:>8} {summary["p50_ms"]:>8} '
+                f'{summary["p95_ms"]:>8} {summary["p99_ms"]:>8} '
+                f'{summary["errors"]:>6}')
+        return results
+
+    def report_changes(self, changes):
+        self.stdout.write(f'{"scenario":>20} {"rps %":>8} {"p95 %":>8}')
+        for name, change in changes.items():
+            self.stdout.write(
+                f'{name:>20} {change.get("rps", "-"):>8} '
+                f'{change.get("p95_ms", "-"):>8}')
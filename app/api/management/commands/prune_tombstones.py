@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+import time
+from api import sync
+
+
+class Command(BaseCommand):
+    """
+    Django command deleting the tombstones of the incremental sync older
+    than SYNC_TOMBSTONE_DAYS, and with --loop again every interval:
+
+    python manage.py prune_tombstones --loop --interval 86400
+    """
+    help = 'Delete the tombstones older than SYNC_TOMBSTONE_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep pruning every interval')
+        parser.add_argument('--interval', type=float, default=86400,
+                            help='Seconds between two prunes with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            count = sync.prune()
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {count} tombstones older than '
+                f'{settings.SYNC_TOMBSTONE_DAYS} days'))
+            if not options['loop']:
+                return
+            # do not hold a connection while idle
+            close_old_connections()
+            time.sleep(options['interval'])
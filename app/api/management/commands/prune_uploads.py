@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+import time
+from api import uploads
+
+
+class Command(BaseCommand):
+    """
+    Django command deleting the resumable upload sessions started more
+    than RESUMABLE_UPLOAD_EXPIRY_HOURS ago with their partial files, and
+    with --loop again every interval:
+
+    python manage.py prune_uploads --loop --interval 3600
+    """
+    help = 'Delete the expired resumable upload sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep pruning every interval')
+        parser.add_argument('--interval', type=float, default=3600,
+                            help='Seconds between two prunes with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            count = uploads.prune()
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {count} upload sessions older than '
+                f'{settings.RESUMABLE_UPLOAD_EXPIRY_HOURS} hours'))
+            if not options['loop']:
+                return
+            # do not hold a connection while idle
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+import time
+from api import purge
+
+
+class Command(BaseCommand):
+    """
+    Django command deleting the data of deactivated users whose deletion
+    was requested, a batch of rows per transaction, and with --loop
+    waiting for new deletions:
+
+    python manage.py purge_users --loop --interval 10
+    """
+    help = 'Delete the users whose deletion was requested, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=purge.BATCH_SIZE,
+                            help='Rows deleted per transaction')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep waiting for new deletions')
+        parser.add_argument('--interval', type=float, default=10,
+                            help='Seconds between two checks with --loop')
+
+    def report(self, deletion):
+        progress = ', '.join(f'{count} {name}'
+                             for name, count in deletion.progress.items())
+        state = 'deleted' if deletion.finished_at else 'deleting'
+        self.stdout.write(f'{deletion} {state}: {progress or "no rows"}')
+
+    def handle(self, *args, **options):
+        while True:
+            for deletion in purge.pending():
+                start = time.perf_counter()
+                purge.purge(deletion, options['batch_size'], self.report)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Purged {deletion} in '
+                    f'{time.perf_counter() - start:.1f}s'))
+            if not options['loop']:
+                return
+            # do not hold a connection while idle
+            close_old_connections()
+            time.sleep(options['interval'])
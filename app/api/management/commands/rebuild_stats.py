@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+import time
+from api import stats
+
+
+class Command(BaseCommand):
+    """
+    Django command recomputing the per-user statistics from the
+    destinations, a batch of users per transaction:
+
+    python manage.py rebuild_stats --batch-size 500
+    """
+    help = 'Recompute the statistics of all or some users from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='user_ids',
+                            help='Id of a user to rebuild, repeatable')
+        parser.add_argument('--batch-size', type=int,
+                            default=stats.BATCH_SIZE,
+                            help='Users per transaction')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rows = stats.rebuild(options['user_ids'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {rows} statistics rows in '
+            f'{time.perf_counter() - start:.1f}s'))
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+import time
+from django.db import connection
+from api.synthetic import Generator, Writer
+
+
+class Command(BaseCommand):
+    """
+    Django command generating a large synthetic dataset, see
+    api/synthetic.py for the distributions. The same options and seed
+    always generate the same rows, e.g.:
+
+    python manage.py seed_data --users 100000 --destinations 2000000 \\
+        --tag-skew 1.2 --copy --no-fk-checks
+    """
+    help = 'Generate users, destinations, tags and features in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--destinations', type=int, default=10000,
+                            help='Destinations of all users')
+        parser.add_argument('--tags-per-user', type=int, default=10)
+        parser.add_argument('--features-per-user', type=int, default=10)
+        parser.add_argument('--tags-per-destination', type=float, default=3,
+                            help='Mean number of tags of a destination')
+        parser.add_argument('--features-per-destination', type=float,
+                            default=3)
+        parser.add_argument('--tag-skew', type=float, default=1.1,
+                            help='Zipf exponent of the tag popularity')
+        parser.add_argument('--owner-skew', type=float, default=0.0,
+                            help='Zipf exponent of destinations per user, '
+                                 '0 spreads them evenly')
+        parser.add_argument('--rating-mean', type=float, default=3.8)
+        parser.add_argument('--rating-spread', type=float, default=0.7)
+        parser.add_argument('--prefix', default='seed',
+                            help='Email prefix of the generated users')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--copy', action='store_true',
+                            help='Write with COPY instead of bulk_create, '
+                                 'Postgres only')
+        parser.add_argument('--no-fk-checks', action='store_true',
+                            help='Skip foreign key checks while loading, '
+                                 'needs a Postgres superuser')
+
+    def handle(self, *args, **options):
+        if (options['copy'] or options['no_fk_checks']) and \
+                connection.vendor != 'postgresql':
+            raise CommandError(
+                '--copy and --no-fk-checks need a Postgres database')
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+
+        generator = Generator(
+            users=options['users'],
+            destinations=options['destinations'],
+            tags_per_user=options['tags_per_user'],
+            features_per_user=options['features_per_user'],
+            tags_per_destination=options['tags_per_destination'],
+            features_per_destination=options['features_per_destination'],
+            tag_skew=options['tag_skew'],
+            owner_skew=options['owner_skew'],
+            rating_mean=options['rating_mean'],
+            rating_spread=options['rating_spread'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+
+        def progress(label, rows, seconds):
+            self.stdout.write(
+                f'{label}: {rows} rows, {rows / seconds:.0f} rows/s')
+
+        start = time.perf_counter()
+        writer = Writer(use_copy=options['copy'],
+                        skip_checks=options['no_fk_checks'],
+                        batch_size=options['batch_size'])
+        rows = generator.run(writer, progress)
+        seconds = time.perf_counter() - start
+        for table, count in rows.items():
+            self.stdout.write(f'{table:>24} {count:>10}')
+        total = sum(rows.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} rows in {seconds:.1f}s, {total / seconds:.0f} rows/s'))
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+import hashlib
+import os
+import time
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+
+MANIFEST_NAME = '.collectstatic-manifest'
+
+
+class Command(BaseCommand):
+    """
+    Django command preparing a container in one process: wait for the
+    database, collect static files unless their content is unchanged
+    and migrate when migrations are pending. Prints the time of every
+    phase.
+    """
+    help = 'Wait for the database, collect static files and migrate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds to wait for the database')
+        parser.add_argument('--no-static', action='store_true',
+                            help='Skip collecting static files')
+        parser.add_argument('--no-migrate', action='store_true',
+                            help='Skip applying migrations')
+
+    def handle(self, *args, **options):
+        phases = [('wait_for_db', lambda: self.wait_for_db(options))]
+        if not options['no_static']:
+            phases.append(('collectstatic', self.collect_static))
+        if not options['no_migrate']:
+            phases.append(('migrate', self.migrate))
+
+        start = time.perf_counter()
+        for name, run in phases:
+            phase_start = time.perf_counter()
+            result = run()
+            self.stdout.write(
+                f'{name}: {time.perf_counter() - phase_start:.2f}s'
+                f'{f" ({result})" if result else ""}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Startup took {time.perf_counter() - start:.2f}s'))
+
+    def wait_for_db(self, options):
+        call_command('wait_for_db', timeout=options['timeout'],
+                     stdout=self.stdout)
+
+    def static_manifest(self):
+        '''
+        Hash of the paths and contents of all static files
+        '''
+        digest = hashlib.sha256()
+        found = set()
+        for finder in finders.get_finders():
+            for path, storage in finder.list(['CVS', '.*', '*~']):
+                # like collectstatic, the first finder of a path wins
+                if path in found:
+                    continue
+                found.add(path)
+                digest.update(path.encode() + b'\0')
+                with storage.open(path) as static_file:
+                    for chunk in static_file.chunks():
+                        digest.update(chunk)
+        return digest.hexdigest()
+
+    def collect_static(self):
+        manifest_path = os.path.join(settings.STATIC_ROOT, MANIFEST_NAME)
+        manifest = self.static_manifest()
+        try:
+            with open(manifest_path) as manifest_file:
+                if manifest_file.read() == manifest:
+                    return 'unchanged, skipped'
+        except OSError:
+            pass
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(manifest_path, 'w') as manifest_file:
+            manifest_file.write(manifest)
+        return 'collected'
+
+    def migrate(self):
+        executor = MigrationExecutor(connections[DEFAULT_DB_ALIAS])
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if not plan:
+            return 'nothing to apply, skipped'
+        call_command('migrate', interactive=False, stdout=self.stdout)
+        return f'{len(plan)} applied'
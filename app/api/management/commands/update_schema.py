@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api import schema
+
+
+class Command(BaseCommand):
+    """
+    Django command regenerating the OpenAPI schema stored in
+    settings.SCHEMA_FILE and served at /api/schema/. Run it after
+    changing the API and commit the file; with --check it only fails
+    when the stored schema is out of date.
+    """
+    help = 'Regenerate the stored OpenAPI schema'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Fail if the stored schema is out of '
+                                 'date instead of writing it')
+
+    def handle(self, *args, **options):
+        generated = schema.generate()
+        if generated == schema.stored():
+            self.stdout.write('The stored schema is up to date')
+            return
+        if options['check']:
+            raise CommandError(
+                f'{settings.SCHEMA_FILE} is out of date, '
+                'run python manage.py update_schema')
+        with open(settings.SCHEMA_FILE, 'wb') as schema_file:
+            schema_file.write(generated)
+        schema.reset()
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {settings.SCHEMA_FILE}'))
@@ -1,20 +1,62 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 import time
 from psycopg2 import OperationalError as Psycopg2OpError
+from django.db import connections
 from django.db.utils import OperationalError
+from api.db.pool import PoolTimeout
 
 
 class Command(BaseCommand):
-    """Django command to pause execution until database is ready."""
+    """
+    Django command to pause execution until database is ready.
+
+    Retries with exponential backoff, from --initial-delay doubling up
+    to --max-delay, and fails once --timeout seconds have passed.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds to wait in total')
+        parser.add_argument('--connect-timeout', type=int, default=3,
+                            help='Seconds to wait for one connection')
+        parser.add_argument('--initial-delay', type=float, default=0.1)
+        parser.add_argument('--max-delay', type=float, default=5)
+
+    def probe(self, alias, connect_timeout):
+        '''
+        Open and close one connection to the database,
+        an open connection is left as it is
+        '''
+        connection = connections[alias]
+        if connection.connection is not None:
+            return
+        options = connection.settings_dict.setdefault('OPTIONS', {})
+        previous = options.copy()
+        if connection.vendor == 'postgresql':
+            options.setdefault('connect_timeout', connect_timeout)
+        try:
+            connection.ensure_connection()
+        finally:
+            connection.close()
+            connection.settings_dict['OPTIONS'] = previous
 
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database...')
-        db_ready = False
-        while db_ready is False:
+        deadline = time.monotonic() + options['timeout']
+        delay = options['initial_delay']
+        while True:
             try:
-                self.check(databases=['default'])
-                db_ready = True
-            except (Psycopg2OpError, OperationalError):
-                self.stdout.write('Database is not ready, waiting 1 second...')
-                time.sleep(1)
+                self.probe(options['database'], options['connect_timeout'])
+                break
+            except (Psycopg2OpError, OperationalError, PoolTimeout):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]}s')
+                delay = min(delay, remaining)
+                self.stdout.write(
+                    f'Database is not ready, waiting {delay:.1f} seconds...')
+                time.sleep(delay)
+                delay = min(delay * 2, options['max_delay'])
         self.stdout.write(self.style.SUCCESS('Database is ready!'))
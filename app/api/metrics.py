@@ -0,0 +1,263 @@
+'''
+Request metrics aggregated across worker processes
+
+Every worker keeps its counters in memory and dumps them to its own
+file in settings.METRICS_DIR at most once per METRICS_FLUSH_INTERVAL
+seconds. The /metrics endpoint sums the files of all workers and
+renders them in the Prometheus text exposition format. The files of
+workers that exited keep counting in the counters, not in the pool
+gauges, which only describe the workers alive.
+'''
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from django.conf import settings
+from api.db.pool import pool_stats
+
+
+# upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+COUNTERS = {
+    'http_requests_total':
+        'Requests by route, method and status code',
+    'db_queries_total':
+        'Database queries by route',
+    'db_query_duration_seconds_total':
+        'Time spent in database queries by route',
+}
+HISTOGRAMS = {
+    'http_request_duration_seconds':
+        ('Request latency by route', LATENCY_BUCKETS),
+    'http_response_size_bytes':
+        ('Response body size by route', SIZE_BUCKETS),
+}
+POOL_GAUGES = ('max_size', 'size', 'idle', 'in_use', 'waiting')
+POOL_COUNTERS = ('checkouts', 'connects', 'timeouts',
+                 'health_check_failures', 'wait_seconds_total')
+
+# database time of the request being handled, also visible from
+# the threads sync_to_async runs queries in
+current_queries = contextvars.ContextVar('metrics_queries', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    '''
+    Execute wrapper counting queries of the current request
+    '''
+    queries = current_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries[0] += 1
+        queries[1] += time.perf_counter() - start
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    '''
+    connection_created receiver adding record_query to new connections
+    '''
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Registry:
+    '''
+    Counters and histograms of one worker process
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            # bucket counts, with +Inf last, followed by the sum
+            self.histograms = {}
+            self._flushed_at = time.monotonic()
+
+    def _observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        values = self.histograms.get(key)
+        if values is None:
+            values = self.histograms[key] = [0] * (len(buckets) + 2)
+        values[bisect_left(buckets, value)] += 1
+        values[-1] += value
+
+    def _inc(self, name, labels, value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe_request(self, route, method, status, duration, size,
+                        queries, query_time):
+        '''
+        Record one request, on the hot path of every request
+        '''
+        route_labels = (('route', route),)
+        with self._lock:
+            self._inc('http_requests_total', route_labels + (
+                ('method', method), ('status', str(status))))
+            self._observe('http_request_duration_seconds', route_labels,
+                          duration)
+            if size is not None:
+                self._observe('http_response_size_bytes', route_labels, size)
+            if queries:
+                self._inc('db_queries_total', route_labels, queries)
+                self._inc('db_query_duration_seconds_total', route_labels,
+                          query_time)
+            due = time.monotonic() - self._flushed_at >= \
+                settings.METRICS_FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value
+                             in self.counters.items()],
+                'histograms': [[name, labels, values] for (name, labels),
+                               values in self.histograms.items()],
+                'pool': pool_stats(),
+            }
+
+    def flush(self):
+        '''
+        Write the metrics of this worker to its file in METRICS_DIR
+        '''
+        with self._lock:
+            self._flushed_at = time.monotonic()
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as temp_file:
+            json.dump(self.snapshot(), temp_file)
+        # readers never see a partially written file
+        os.replace(temp_path, path)
+
+
+registry = Registry()
+
+
+def worker_alive(file_name):
+    '''
+    Whether the worker process of a metrics-<pid>.json file still runs
+    '''
+    try:
+        pid = int(file_name[len('metrics-'):-len('.json')])
+    except ValueError:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # alive, as a process of another user
+        pass
+    return True
+
+
+def collect():
+    '''
+    Sum the metrics of every worker process
+    '''
+    registry.flush()
+    counters = {}
+    histograms = {}
+    pool_gauges = {}
+    pool_counters = {}
+    directory = settings.METRICS_DIR
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, file_name)) as metrics_file:
+                snapshot = json.load(metrics_file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(values):
+                total[index] += value
+        alive = worker_alive(file_name)
+        for alias, stats in snapshot.get('pool', {}).items():
+            # the connections of an exited worker are closed
+            for stat in POOL_GAUGES if alive else ():
+                key = (stat, alias)
+                pool_gauges[key] = pool_gauges.get(key, 0) + stats[stat]
+            for stat in POOL_COUNTERS:
+                key = (stat, alias)
+                pool_counters[key] = pool_counters.get(key, 0) + stats[stat]
+    return counters, histograms, pool_gauges, pool_counters
+
+
+def format_labels(labels):
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"'))
+        for name, value in labels) + '}'
+
+
+def render():
+    '''
+    Metrics of all workers in the Prometheus text exposition format
+    '''
+    counters, histograms, pool_gauges, pool_counters = collect()
+    lines = []
+
+    for metric, help_text in COUNTERS.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f'{metric}{format_labels(labels)} {value}')
+
+    for metric, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {metric} {help_text}',
+                  f'# TYPE {metric} histogram']
+        for (name, labels), values in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), values):
+                cumulative += count
+                le_labels = labels + (('le', bound),)
+                lines.append(
+                    f'{metric}_bucket{format_labels(le_labels)} {cumulative}')
+            lines.append(f'{metric}_sum{format_labels(labels)} {values[-1]}')
+            lines.append(f'{metric}_count{format_labels(labels)} {cumulative}')
+
+    for stat in POOL_GAUGES:
+        metric = f'db_pool_{stat}'
+        lines += [f'# HELP {metric} Connection pool {stat} of all workers',
+                  f'# TYPE {metric} gauge']
+        for (name, alias), value in sorted(pool_gauges.items()):
+            if name == stat:
+                labels = format_labels((('alias', alias),))
+                lines.append(f'{metric}{labels} {value}')
+
+    for stat in POOL_COUNTERS:
+        metric = f'db_pool_{stat}'
+        if not metric.endswith('_total'):
+            metric += '_total'
+        lines += [f'# HELP {metric} Connection pool {stat} of all workers',
+                  f'# TYPE {metric} counter']
+        for (name, alias), value in sorted(pool_counters.items()):
+            if name == stat:
+                labels = format_labels((('alias', alias),))
+                lines.append(f'{metric}{labels} {value}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,113 @@
+'''
+Middleware of the API
+'''
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from api import nplusone, profiling
+from api.metrics import registry, current_queries
+
+
+class MetricsMiddleware:
+    '''
+    Record count, latency, size, status and database time of requests
+    per route name, e.g. destination:destination-list
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries = [0, 0.0]
+        token = current_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.observe(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = [0, 0.0]
+        token = current_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.observe(request, response, time.perf_counter() - start, queries)
+        return response
+
+    def observe(self, request, response, duration, queries):
+        match = request.resolver_match
+        registry.observe_request(
+            route=match.view_name if match else 'unmatched',
+            method=request.method,
+            status=response.status_code,
+            duration=duration,
+            size=None if response.streaming else len(response.content),
+            queries=queries[0],
+            query_time=queries[1],
+        )
+
+
+class ProfilingMiddleware:
+    '''
+    Profile requests of staff users that ask for it, see api/profiling.py
+
+    Requests without the profile flag only pay for one header and one
+    query string lookup. Profiling runs on the sync (uWSGI) path,
+    async requests are passed through unprofiled.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async or not profiling.is_requested(request):
+            return self.get_response(request)
+        user = profiling.get_user(request)
+        if user is None or not user.is_staff:
+            return self.get_response(request)
+        return profiling.profile(request, self.get_response)
+
+
+class NPlusOneMiddleware:
+    '''
+    Report statements repeated by a request, see api/nplusone.py
+
+    Only installed when settings.NPLUSONE_ENABLED is set. Like the
+    profiler it checks the sync path, async requests are passed through.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.get_response(request)
+        with nplusone.track_queries() as tracker:
+            response = self.get_response(request)
+        nplusone.check(tracker, f'{request.method} {request.path}')
+        return response
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_imageupload'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feature',
+            index=models.Index(fields=['user', 'name'], name='api_feature_user_id_cac310_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name'], name='api_tag_user_id_ef3bf5_idx'),
+        ),
+    ]
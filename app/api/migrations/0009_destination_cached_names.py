@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:37
+
+from django.db import migrations, models
+
+
+# the [id, name] pairs of the tags and features of each destination,
+# sorted by id, in a single UPDATE
+FILL_SQL = """
+UPDATE api_destination SET
+    cached_tags = COALESCE((
+        SELECT jsonb_agg(jsonb_build_array(tag.id, tag.name) ORDER BY tag.id)
+        FROM api_destination_tags link
+        JOIN api_tag tag ON tag.id = link.tag_id
+        WHERE link.destination_id = api_destination.id
+    ), '[]'::jsonb),
+    cached_features = COALESCE((
+        SELECT jsonb_agg(jsonb_build_array(feature.id, feature.name)
+                         ORDER BY feature.id)
+        FROM api_destination_features link
+        JOIN api_feature feature ON feature.id = link.feature_id
+        WHERE link.destination_id = api_destination.id
+    ), '[]'::jsonb)
+"""
+
+
+def fill_cached_names(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(FILL_SQL)
+        return
+    Destination = apps.get_model('api', 'Destination')
+    cached = {}
+    for relation, target in (('tags', 'tag'), ('features', 'feature')):
+        links = getattr(Destination, relation).through.objects \
+            .order_by(f'{target}_id') \
+            .values_list('destination_id', f'{target}_id', f'{target}__name')
+        for destination_id, target_id, name in links:
+            values = cached.setdefault(destination_id, {'tags': [],
+                                                        'features': []})
+            values[relation].append([target_id, name])
+    # the destinations without links keep the default []
+    Destination.objects.bulk_update(
+        [Destination(id=destination_id, cached_tags=values['tags'],
+                     cached_features=values['features'])
+         for destination_id, values in cached.items()],
+        ['cached_tags', 'cached_features'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_tag_feature_user_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='cached_features',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='cached_tags',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.RunPython(fill_cached_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# the statistics of the existing destinations, in total, per country,
+# per tag and per feature
+FILL_SQL = """
+INSERT INTO api_userstat (user_id, dimension, "key", destination_count,
+                          rating_sum)
+SELECT user_id, 'total', '', COUNT(*), SUM(rating)
+FROM api_destination
+GROUP BY user_id
+UNION ALL
+SELECT user_id, 'country', country, COUNT(*), SUM(rating)
+FROM api_destination
+GROUP BY user_id, country
+UNION ALL
+SELECT destination.user_id, 'tag', CAST(link.tag_id AS varchar(255)),
+       COUNT(*), SUM(destination.rating)
+FROM api_destination_tags link
+JOIN api_destination destination ON destination.id = link.destination_id
+GROUP BY destination.user_id, link.tag_id
+UNION ALL
+SELECT destination.user_id, 'feature', CAST(link.feature_id AS varchar(255)),
+       COUNT(*), SUM(destination.rating)
+FROM api_destination_features link
+JOIN api_destination destination ON destination.id = link.destination_id
+GROUP BY destination.user_id, link.feature_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_destination_cached_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('country', 'Country'), ('tag', 'Tag'), ('feature', 'Feature')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=255)),
+                ('destination_count', models.IntegerField(default=0)),
+                ('rating_sum', models.DecimalField(decimal_places=1, default=0, max_digits=12)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='userstat',
+            constraint=models.UniqueConstraint(fields=('user', 'dimension', 'key'), name='api_userstat_user_dimension_key'),
+        ),
+        migrations.RunSQL(FILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_userdeletion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='destination',
+            index=models.Index(fields=['name'], name='api_destination_name_like', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='feature',
+            index=models.Index(fields=['name'], name='api_feature_name_like', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['name'], name='api_tag_name_like', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 05:52
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_sync'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='destination',
+            name='updated_at',
+            field=api.models.WriteTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='feature',
+            name='updated_at',
+            field=api.models.WriteTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='updated_at',
+            field=api.models.WriteTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='deleted_at',
+            field=models.DateTimeField(default=api.models.ClockTimestamp),
+        ),
+    ]
@@ -2,13 +2,53 @@
 Database models for the API
 '''
 from django.db import models
+from django.db.models.functions import Now
 from django.contrib.auth.models import AbstractBaseUser, \
     BaseUserManager, PermissionsMixin
 from django.conf import settings
+from django.utils import timezone
 import uuid
 import os
 
 
+class ClockTimestamp(Now):
+    '''
+    The time of the clock of Postgres when the row is written, not at
+    the start of the statement or transaction like Now()
+    '''
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection,
+                           template='CLOCK_TIMESTAMP()', **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # on the host of the process, and in the format of the other
+        # datetimes, which the comparisons of the text values rely on
+        return '%s', [connection.ops.adapt_datetimefield_value(
+            timezone.now())]
+
+
+class WriteTimeField(models.DateTimeField):
+    '''
+    Like auto_now, the time of the last save(), but a ClockTimestamp, so
+    the times written by all app hosts agree; the instance keeps its
+    previous value, read the saved one from the database
+    '''
+
+    def __init__(self, *args, **kwargs):
+        kwargs['editable'] = False
+        kwargs['blank'] = True
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs['editable'], kwargs['blank']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        return ClockTimestamp()
+
+
 def destination_image_file_path(instance, file_name):
     '''
     Image path for destination
@@ -84,6 +124,20 @@ class Destination(models.Model):
     tags = models.ManyToManyField('Tag')
     features = models.ManyToManyField('Feature')
     image = models.ImageField(null=True, upload_to=destination_image_file_path)
+    # [id, name] of the tags and features, see api/denorm.py
+    cached_tags = models.JSONField(default=list, editable=False)
+    cached_features = models.JSONField(default=list, editable=False)
+    # also set when the cached names change, see api/sync.py
+    updated_at = WriteTimeField()
+
+    class Meta:
+        indexes = [
+            # prefix searches of the admin, LIKE 'name%' on Postgres
+            models.Index(fields=['name'], name='api_destination_name_like',
+                         opclasses=['varchar_pattern_ops']),
+            # the changes of a user since a sync
+            models.Index(fields=['user', 'updated_at', 'id']),
+        ]
 
     def __str__(self):
         return self.name
@@ -99,8 +153,20 @@ class Tag(models.Model):
         on_delete=models.CASCADE
     )
     name = models.CharField(max_length=255)
-    # return the name of the tag when convert object to a string
+    updated_at = WriteTimeField()
 
+    class Meta:
+        indexes = [
+            # the tags of a user, sorted by name
+            models.Index(fields=['user', 'name']),
+            # prefix searches of the admin
+            models.Index(fields=['name'], name='api_tag_name_like',
+                         opclasses=['varchar_pattern_ops']),
+            # the changes of a user since a sync
+            models.Index(fields=['user', 'updated_at', 'id']),
+        ]
+
+    # return the name of the tag when convert object to a string
     def __str__(self):
         return self.name
 
@@ -114,6 +180,122 @@ class Feature(models.Model):
         on_delete=models.CASCADE
     )
     name = models.CharField(max_length=255)
+    updated_at = WriteTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'name']),
+            models.Index(fields=['name'], name='api_feature_name_like',
+                         opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['user', 'updated_at', 'id']),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class UserStat(models.Model):
+    '''
+    Destination count and rating sum of a user, in total or per country,
+    tag or feature, kept up to date by api/stats.py
+    '''
+    TOTAL = 'total'
+    COUNTRY = 'country'
+    TAG = 'tag'
+    FEATURE = 'feature'
+    DIMENSIONS = [(TOTAL, 'Total'), (COUNTRY, 'Country'), (TAG, 'Tag'),
+                  (FEATURE, 'Feature')]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    dimension = models.CharField(max_length=10, choices=DIMENSIONS)
+    # the country, or the id of the tag or feature, empty for the total
+    key = models.CharField(max_length=255, blank=True)
+    destination_count = models.IntegerField(default=0)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=1,
+                                     default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'dimension', 'key'],
+            name='api_userstat_user_dimension_key')]
+
+    def __str__(self):
+        return f'{self.dimension} {self.key}'.strip()
+
+
+class ImageUpload(models.Model):
+    '''
+    Resumable upload session for a destination image
+    '''
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE
+    )
+    destination = models.ForeignKey(
+        Destination,
+        on_delete=models.CASCADE,
+        related_name='uploads'
+    )
+    file_name = models.CharField(max_length=255)
+    # total number of bytes the client announced for the image
+    size = models.PositiveIntegerField()
+    # number of contiguous bytes received so far
+    offset = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def temp_path(self):
+        '''
+        Path of the partial file the chunks are appended to
+        '''
+        return os.path.join(settings.RESUMABLE_UPLOAD_DIR, f'{self.id}.part')
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+    def __str__(self):
+        return self.file_name
+
+
+class UserDeletion(models.Model):
+    '''
+    Deletion of a deactivated user, purged in batches by api/purge.py
+    '''
+    # not a foreign key, the deletion outlives the user
+    user_id = models.BigIntegerField(unique=True)
+    email = models.EmailField(max_length=255)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # number of rows deleted so far per model
+    progress = models.JSONField(default=dict)
+
+    def __str__(self):
+        return self.email
+
+
+class Tombstone(models.Model):
+    '''
+    A deleted destination, tag or feature, for the sync of api/sync.py
+    '''
+    # not a foreign key, the tombstones of deleted users age out
+    user_id = models.BigIntegerField()
+    # destinations, tags or features, see api/sync.py
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=ClockTimestamp)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'deleted_at', 'id']),
+            # pruning of the old tombstones
+            models.Index(fields=['deleted_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
@@ -0,0 +1,129 @@
+'''
+Detection of N+1 queries
+
+Statements are reduced to a fingerprint without their literal values,
+so the query of each item in a loop counts as the same statement. A
+request that runs the same fingerprint more than NPLUSONE_THRESHOLD
+times is reported together with the stack of the code that issued it.
+
+NPlusOneMiddleware logs the reports when settings.NPLUSONE_ENABLED is
+set, which defaults to DEBUG. The test runner in api/test_runner.py
+raises them instead, failing the test that sent the request.
+'''
+import logging
+import os
+import re
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|%\(\w+\)s|\?')
+IN_LIST_RE = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+# transaction control repeats by design, e.g. the savepoints of
+# nested atomic blocks
+IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class NPlusOneError(AssertionError):
+    '''
+    Raised for repeated statements when the detector runs in tests
+    '''
+
+
+def fingerprint(sql):
+    '''
+    The statement with literals and placeholders replaced by ?
+    '''
+    sql = STRING_RE.sub('?', sql)
+    sql = PLACEHOLDER_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def project_stack():
+    '''
+    The frames of the current stack inside the project, without the
+    frames of installed packages, middleware and execute wrappers
+    '''
+    base_dir = str(settings.BASE_DIR)
+    api_dir = os.path.dirname(__file__)
+    skipped = [os.path.join(base_dir, 'manage.py')] + [
+        os.path.join(api_dir, name)
+        for name in ('nplusone.py', 'middleware.py', 'metrics.py',
+                     'profiling.py')]
+    return [frame for frame in traceback.extract_stack()[:-1]
+            if frame.filename.startswith(base_dir) and
+            frame.filename not in skipped and
+            f'{os.sep}site-packages{os.sep}' not in frame.filename]
+
+
+class QueryTracker:
+    '''
+    Execute wrapper counting fingerprints, keeping the stack of the
+    first execution over the threshold
+    '''
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.statements = {}
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(IGNORED_PREFIXES):
+            key = fingerprint(sql)
+            self.counts[key] += 1
+            self.statements.setdefault(key, sql)
+            if self.counts[key] == self.threshold + 1:
+                self.stacks[key] = project_stack()
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        '''
+        Fingerprints over the threshold with their count and stack
+        '''
+        return [(key, count, self.stacks[key])
+                for key, count in self.counts.most_common()
+                if count > self.threshold]
+
+    def report(self, label):
+        lines = [f'N+1 queries in {label}:']
+        for key, count, stack in self.repeated():
+            lines.append(f'{count}x {self.statements[key]}')
+            lines += ['  ' + line.rstrip('\n').replace('\n', '\n  ')
+                      for line in traceback.format_list(stack)]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def track_queries(threshold=None):
+    '''
+    Track the statements of all connections inside the block
+    '''
+    tracker = QueryTracker(settings.NPLUSONE_THRESHOLD
+                           if threshold is None else threshold)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(tracker))
+        yield tracker
+
+
+def check(tracker, label):
+    '''
+    Log or, in tests, raise the repeated statements of the tracker
+    '''
+    if not tracker.repeated():
+        return
+    report = tracker.report(label)
+    if settings.NPLUSONE_RAISE:
+        raise NPlusOneError(report)
+    logger.warning(report)
@@ -0,0 +1,161 @@
+'''
+Per-request profiling for staff users
+
+A request with an "X-Profile: 1" header or a "profile=1" query flag
+from a staff user runs under cProfile and a stack sampler while its SQL
+is recorded. The artifacts are stored in settings.PROFILE_DIR under the
+request id:
+
+<id>.pstats     cProfile stats, for pstats or snakeviz
+<id>.collapsed  sampled stacks in the collapsed format of flamegraph.pl
+                and speedscope
+<id>.sql.json   executed statements with their duration
+'''
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+ARTIFACTS = {
+    'pstats': '.pstats',
+    'collapsed': '.collapsed',
+    'sql': '.sql.json',
+}
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9-]{1,64}$')
+
+
+def is_requested(request):
+    '''
+    Cheap check for the profile flag, before any authentication
+    '''
+    return request.META.get(PROFILE_HEADER) == '1' or \
+        request.GET.get('profile') == '1'
+
+
+def get_user(request):
+    '''
+    The session user, or the user of the token sent to the API
+    '''
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    try:
+        result = TokenAuthentication().authenticate(Request(request))
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def get_request_id(request):
+    request_id = request.META.get('HTTP_X_REQUEST_ID', '')
+    return request_id if REQUEST_ID_RE.match(request_id) \
+        else uuid.uuid4().hex
+
+
+def artifact_path(request_id, kind):
+    return os.path.join(settings.PROFILE_DIR, request_id + ARTIFACTS[kind])
+
+
+class StackSampler(threading.Thread):
+    '''
+    Sample the stack of one thread at a fixed interval
+    '''
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in self.stacks.most_common())
+
+
+class QueryRecorder:
+    '''
+    Execute wrapper keeping each statement with its duration
+    '''
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': repr(params),
+                'many': many,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+            })
+
+
+def profile(request, get_response):
+    '''
+    Run the rest of the request under the profilers and store artifacts
+    '''
+    request_id = get_request_id(request)
+    recorder = QueryRecorder()
+    sampler = StackSampler(threading.get_ident(),
+                           settings.PROFILE_SAMPLE_INTERVAL)
+    profiler = cProfile.Profile()
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        sampler.start()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+            sampler.stop()
+
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(artifact_path(request_id, 'pstats'))
+    with open(artifact_path(request_id, 'collapsed'), 'w') as collapsed:
+        collapsed.write(sampler.collapsed())
+    with open(artifact_path(request_id, 'sql'), 'w') as sql:
+        json.dump({
+            'path': request.get_full_path(),
+            'count': len(recorder.queries),
+            'ms': round(sum(query['ms'] for query in recorder.queries), 3),
+            'queries': recorder.queries,
+        }, sql, indent=2)
+
+    response['X-Profile-Id'] = request_id
+    return response
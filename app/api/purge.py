@@ -0,0 +1,122 @@
+'''
+Deletion of users with large datasets, without blocking
+
+User.delete() collects every destination, tag, feature and link of the
+user in memory before deleting them, in one transaction locking all of
+them. Instead request() deactivates the user at once, so the account
+can no longer be used, and records a UserDeletion with the email of the
+user, which is replaced so it can sign up again right away. The purge_users
+command then deletes the data of the user in batches of ids with raw
+DELETE statements, one short transaction per batch, and stores the
+number of rows deleted so far on the UserDeletion. The user row is
+deleted last, when little is left to collect.
+
+A purge is idempotent, an interrupted one resumes where it stopped.
+'''
+import uuid
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from api.bulk import delete_destination_rows, raw_delete, remove_files
+from api.models import Destination, Feature, Tag, UserDeletion, UserStat
+
+
+BATCH_SIZE = 1000
+
+
+def request(user):
+    '''
+    Deactivate the user, free their email and record their deletion,
+    returns the UserDeletion to purge
+    '''
+    with transaction.atomic():
+        deletion, created = UserDeletion.objects.get_or_create(
+            user_id=user.pk, defaults={'email': user.email})
+        if created:
+            # unique, and never the address of a new user
+            user.email = f'deleted-{user.pk}-{uuid.uuid4().hex}' \
+                '@deleted.invalid'
+        user.is_active = False
+        user.save(update_fields=['is_active', 'email'])
+        Token.objects.filter(user=user).delete()
+    return deletion
+
+
+def batches(queryset, batch_size):
+    '''
+    The ids of the rows of the queryset, a batch at a time, until the
+    caller deleted all of them
+    '''
+    while True:
+        ids = list(queryset.order_by('id').values_list('id', flat=True)
+                   [:batch_size])
+        if not ids:
+            return
+        yield ids
+
+
+def delete_destinations(ids):
+    '''
+    Delete the destinations with their links, upload sessions and images
+    '''
+    with transaction.atomic():
+        count, files = delete_destination_rows(ids)
+    # files are removed once the rows are gone
+    remove_files(files)
+    return count
+
+
+def delete_targets(model, ids):
+    '''
+    Delete tags or features with their links
+    '''
+    with transaction.atomic():
+        model.destination_set.through.objects.filter(
+            **{f'{model._meta.model_name}_id__in': ids}).delete()
+        return raw_delete(model.objects.filter(id__in=ids))
+
+
+def delete_stats(ids):
+    return raw_delete(UserStat.objects.filter(id__in=ids))
+
+
+# the models of the data of a user, in the order they are purged
+STEPS = (
+    (Destination, delete_destinations),
+    (Tag, lambda ids: delete_targets(Tag, ids)),
+    (Feature, lambda ids: delete_targets(Feature, ids)),
+    (UserStat, delete_stats),
+)
+
+
+def purge(deletion, batch_size=BATCH_SIZE, report=None):
+    '''
+    Delete the data of the user of the deletion in batches, then the
+    user, calling report with the deletion after each batch
+    '''
+    for model, delete in STEPS:
+        name = model._meta.model_name
+        for ids in batches(model.objects.filter(user_id=deletion.user_id),
+                           batch_size):
+            deletion.progress[name] = \
+                deletion.progress.get(name, 0) + delete(ids)
+            deletion.save(update_fields=['progress'])
+            if report:
+                report(deletion)
+
+    with transaction.atomic():
+        # what is left is small: tokens, admin log entries, permissions
+        get_user_model().objects.filter(pk=deletion.user_id).delete()
+        deletion.finished_at = timezone.now()
+        deletion.save(update_fields=['finished_at'])
+    if report:
+        report(deletion)
+
+
+def pending():
+    '''
+    The deletions left to purge, oldest first
+    '''
+    return UserDeletion.objects.filter(
+        finished_at=None).order_by('requested_at', 'id')
@@ -0,0 +1,94 @@
+'''
+The OpenAPI schema of the API, precomputed
+
+Generating the schema introspects every view, so it is generated once
+with the update_schema command and stored in settings.SCHEMA_FILE.
+Each worker reads that file once and keeps the schema rendered as YAML
+and JSON, plain and gzipped, with an ETag for each. Without the file
+the schema is generated on the first request instead.
+'''
+import gzip
+import hashlib
+import json
+import threading
+from collections import namedtuple
+from django.conf import settings
+import yaml
+
+
+CONTENT_TYPES = {
+    'yaml': 'application/vnd.oai.openapi',
+    'json': 'application/vnd.oai.openapi+json',
+}
+
+Document = namedtuple('Document', ['content_type', 'body', 'gzipped',
+                                   'etag', 'gzipped_etag'])
+
+_lock = threading.Lock()
+_documents = None
+
+
+def generate():
+    '''
+    The schema of the current code in YAML, as drf-spectacular serves it
+    '''
+    from drf_spectacular.renderers import OpenApiYamlRenderer
+    from drf_spectacular.settings import spectacular_settings
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return OpenApiYamlRenderer().render(
+        generator.get_schema(request=None, public=True))
+
+
+def stored():
+    '''
+    The schema in settings.SCHEMA_FILE, None without the file
+    '''
+    try:
+        with open(settings.SCHEMA_FILE, 'rb') as schema_file:
+            return schema_file.read()
+    except FileNotFoundError:
+        return None
+
+
+def render(body):
+    '''
+    The YAML schema as a document of each format
+    '''
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    bodies = {
+        'yaml': body,
+        'json': json.dumps(yaml.load(body, Loader=loader), indent=4,
+                           ensure_ascii=False).encode(),
+    }
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    documents = {}
+    for name, content in bodies.items():
+        documents[name] = Document(
+            content_type=CONTENT_TYPES[name],
+            body=content,
+            # no timestamp in the header, so the output is stable
+            gzipped=gzip.compress(content, mtime=0),
+            etag=f'"{digest}-{name}"',
+            gzipped_etag=f'"{digest}-{name}-gzip"',
+        )
+    return documents
+
+
+def documents():
+    '''
+    The schema in every format, loaded once per process
+    '''
+    global _documents
+    with _lock:
+        if _documents is None:
+            _documents = render(stored() or generate())
+        return _documents
+
+
+def reset():
+    '''
+    Forget the loaded schema, for tests
+    '''
+    global _documents
+    with _lock:
+        _documents = None
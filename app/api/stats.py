@@ -0,0 +1,256 @@
+'''
+Per-user destination statistics, maintained incrementally
+
+UserStat holds the destination count and rating sum of every user in
+total and per country, tag and feature. Instead of aggregating on each
+request, every change of a destination or of its links adds its delta
+to the rows it affects with a single upsert:
+- pre_save reads the previous country and rating of a destination,
+  post_save adds the new ones and subtracts the previous ones
+- post_delete subtracts the destination, with its tags and features
+  from its denormalized names, see api/denorm.py, because the links
+  are deleted without m2m_changed
+- m2m_changed of the tags and features adds or subtracts the links
+
+QuerySet.update(), bulk_create() and raw SQL bypass the signals, the
+rebuild_stats command recomputes the rows from scratch in batches.
+'''
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import CharField, Count, F, Sum, Value
+from django.db.models.functions import Cast
+from api.models import Destination, UserStat
+
+
+BATCH_SIZE = 500
+# the dimension of each many-to-many relation of destinations
+RELATIONS = {'tags': UserStat.TAG, 'features': UserStat.FEATURE}
+
+
+def contributions(user_id, country, rating, tag_ids=(), feature_ids=()):
+    '''
+    The rows a destination counts in, as deltas of one destination
+    '''
+    rating = Decimal(str(rating))
+    deltas = {(user_id, UserStat.TOTAL, ''): [1, rating],
+              (user_id, UserStat.COUNTRY, country): [1, rating]}
+    for dimension, ids in ((UserStat.TAG, tag_ids),
+                           (UserStat.FEATURE, feature_ids)):
+        for target_id in ids:
+            deltas[(user_id, dimension, str(target_id))] = [1, rating]
+    return deltas
+
+
+def combine(*signed_deltas):
+    '''
+    Sum (sign, deltas) pairs, dropping the rows that do not change
+    '''
+    total = {}
+    for sign, deltas in signed_deltas:
+        for row, (count, rating_sum) in deltas.items():
+            current = total.setdefault(row, [0, Decimal(0)])
+            current[0] += sign * count
+            current[1] += sign * rating_sum
+    return {row: delta for row, delta in total.items() if any(delta)}
+
+
+def apply(deltas):
+    '''
+    Add the deltas to their rows in one statement, creating the
+    missing rows
+    '''
+    if not deltas:
+        return
+    quote = connection.ops.quote_name
+    table = quote(UserStat._meta.db_table)
+    count = quote('destination_count')
+    rating_sum = quote('rating_sum')
+    values = []
+    params = []
+    for (user_id, dimension, key), (delta, rating_delta) in deltas.items():
+        values.append('(%s, %s, %s, %s, %s)')
+        params += [user_id, dimension, key, delta, rating_delta]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({quote("user_id")}, {quote("dimension")}, '
+            f'{quote("key")}, {count}, {rating_sum}) '
+            f'VALUES {", ".join(values)} '
+            f'ON CONFLICT ({quote("user_id")}, {quote("dimension")}, '
+            f'{quote("key")}) DO UPDATE SET '
+            f'{count} = {table}.{count} + EXCLUDED.{count}, '
+            f'{rating_sum} = {table}.{rating_sum} + EXCLUDED.{rating_sum}',
+            params)
+
+
+def link_ids(instance):
+    '''
+    The tag and feature ids of a destination from its denormalized names
+    '''
+    return ([target_id for target_id, _ in instance.cached_tags],
+            [target_id for target_id, _ in instance.cached_features])
+
+
+def destination_pre_save(sender, instance, raw, **kwargs):
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._previous_stats = Destination.objects.filter(
+        pk=instance.pk).values_list('user_id', 'country', 'rating').first()
+
+
+def destination_saved(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    previous = instance.__dict__.pop('_previous_stats', None)
+    if previous is None:
+        # a new destination has no links yet, they count when added
+        apply(combine((1, contributions(
+            instance.user_id, instance.country, instance.rating))))
+        return
+    # the links count with the rating of the destination, the deltas of
+    # their rows cancel out unless the rating changed
+    links = link_ids(instance)
+    apply(combine(
+        (1, contributions(instance.user_id, instance.country,
+                          instance.rating, *links)),
+        (-1, contributions(*previous, *links))))
+
+
+def destination_deleted(sender, instance, **kwargs):
+    apply(combine((-1, contributions(
+        instance.user_id, instance.country, instance.rating,
+        *link_ids(instance)))))
+
+
+def links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    '''
+    m2m_changed receiver of the links of destinations
+    '''
+    relation = next(name for name in RELATIONS
+                    if getattr(Destination, name).through is sender)
+    dimension = RELATIONS[relation]
+    linked = instance.destination_set if reverse \
+        else getattr(instance, relation)
+    if action in ('pre_remove', 'pre_clear'):
+        # keep the links that exist, they are unknown once deleted
+        if action == 'pre_remove':
+            linked = linked.filter(pk__in=pk_set)
+        instance._removed_links = set(linked.values_list('id', flat=True))
+        return
+    if action == 'post_add':
+        sign = 1
+    elif action in ('post_remove', 'post_clear'):
+        sign = -1
+        pk_set = instance.__dict__.pop('_removed_links', set())
+    else:
+        return
+    if not pk_set:
+        return
+
+    if not reverse:
+        deltas = {(instance.user_id, dimension, str(target_id)):
+                  [1, Decimal(str(instance.rating))] for target_id in pk_set}
+    else:
+        deltas = {}
+        for user_id, rating in Destination.objects.filter(
+                pk__in=pk_set).values_list('user_id', 'rating'):
+            delta = deltas.setdefault(
+                (user_id, dimension, str(instance.pk)), [0, Decimal(0)])
+            delta[0] += 1
+            delta[1] += rating
+    apply(combine((sign, deltas)))
+
+
+def target_deleted(sender, instance, **kwargs):
+    '''
+    post_delete receiver of tags and features, their links are deleted
+    without m2m_changed
+    '''
+    UserStat.objects.filter(
+        user_id=instance.user_id,
+        dimension=sender._meta.model_name,
+        key=str(instance.pk)
+    ).delete()
+
+
+def insert_from(queryset):
+    '''
+    INSERT the (user, dimension, key, count, rating sum) rows selected by
+    the queryset without loading them, returns their number
+    '''
+    quote = connection.ops.quote_name
+    columns = ('user_id', 'dimension', 'key', 'destination_count',
+               'rating_sum')
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(UserStat._meta.db_table)} '
+            f'({", ".join(map(quote, columns))}) {sql}', params)
+        return cursor.rowcount
+
+
+def relation_rows(relation, **filters):
+    '''
+    SELECT the (user, dimension, key, count, rating sum) rows of the
+    links of a relation matching the filters
+    '''
+    field = getattr(Destination, relation).field
+    target = field.m2m_reverse_field_name()
+    return (field.remote_field.through.objects
+            .filter(**filters)
+            .values('destination__user', target)
+            .annotate(dimension=Value(RELATIONS[relation]),
+                      key=Cast(target, CharField()),
+                      count=Count('*'),
+                      rating=Sum('destination__rating'))
+            .values_list('destination__user', 'dimension', 'key', 'count',
+                         'rating'))
+
+
+def rebuild(user_ids=None, batch_size=BATCH_SIZE):
+    '''
+    Recompute the statistics of the users from their destinations,
+    of all users without user_ids, returns the number of rows written
+    '''
+    if user_ids is None:
+        user_ids = get_user_model().objects.order_by('id').values_list(
+            'id', flat=True)
+    user_ids = list(user_ids)
+    aggregates = {'count': Count('*'), 'rating': Sum('rating')}
+    columns = ('dimension', 'key', 'count', 'rating')
+    written = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        destinations = Destination.objects.filter(user__in=batch)
+        selects = [
+            destinations.values('user').annotate(
+                dimension=Value(UserStat.TOTAL), key=Value(''),
+                **aggregates).values_list('user', *columns),
+            destinations.values('user', 'country').annotate(
+                dimension=Value(UserStat.COUNTRY), key=F('country'),
+                **aggregates).values_list('user', *columns),
+        ]
+        for relation in RELATIONS:
+            selects.append(relation_rows(
+                relation, destination__user__in=batch))
+        with transaction.atomic():
+            UserStat.objects.filter(user__in=batch).delete()
+            for select in selects:
+                written += insert_from(select)
+    return written
+
+
+@transaction.atomic
+def rebuild_targets(relation, target_ids):
+    '''
+    Recompute the statistics of tags or features, e.g. after their links
+    were rewritten with raw SQL, returns the number of rows written
+    '''
+    target_ids = list(target_ids)
+    target = getattr(Destination, relation).field.m2m_reverse_field_name()
+    UserStat.objects.filter(
+        dimension=RELATIONS[relation],
+        key__in=[str(target_id) for target_id in target_ids]
+    ).delete()
+    return insert_from(relation_rows(
+        relation, **{f'{target}_id__in': target_ids}))
@@ -0,0 +1,188 @@
+'''
+Incremental sync of the destinations, tags and features of a user
+
+Destination, Tag and Feature have an indexed updated_at, set by every
+save(), by the set-based updates of api/bulk.py, and on the destinations
+whose cached tag or feature names change, see api/denorm.py. A deleted
+destination, tag or feature leaves a Tombstone, written by a post_delete
+receiver or by the raw deletes of api/bulk.py. Both times come from the
+clock of Postgres when the row is written, see ClockTimestamp, so the
+clocks of the app hosts do not matter.
+
+changes() returns what changed after a cursor as one stream ordered by
+(time, kind, id), merged from one range scan of the (user, updated_at,
+id) index per kind, so a sync reads the rows that changed and no other.
+The cursor is the position of the last change returned.
+
+A row is only visible once its transaction commits, possibly after a
+row written later, e.g. by a bulk delete or merge running for seconds.
+The stream ends at the horizon, which is SYNC_SETTLE_SECONDS before the
+time of the database, and on Postgres no later than the start of the
+oldest transaction still open, as its rows are written after it. So a
+cursor never moves past a write still to commit, however long its
+transaction runs. Only the transactions of the same database role are
+visible in pg_stat_activity, others must commit within the settle
+window. Tombstones are kept SYNC_TOMBSTONE_DAYS, a client with an older
+cursor syncs from scratch.
+'''
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from api.models import Destination, Feature, Tag, Tombstone
+
+
+BATCH_SIZE = 1000
+# the kinds of changes, in the order of their rank in the stream, with
+# their model and time field
+KINDS = (
+    ('destinations', Destination, 'updated_at'),
+    ('tags', Tag, 'updated_at'),
+    ('features', Feature, 'updated_at'),
+    ('deleted', Tombstone, 'deleted_at'),
+)
+# "<microseconds since the epoch>.<rank>.<id>"
+CURSOR_RE = re.compile(r'^(\d{1,20})\.(\d)\.(\d{1,20})$')
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+Cursor = namedtuple('Cursor', ['time', 'rank', 'id'])
+START = Cursor(0, 0, 0)
+# the time of the database less the settle window, or the start of the
+# oldest transaction that is writing, or running a statement which may
+# write, if earlier
+HORIZON_SQL = '''
+SELECT LEAST(
+    CLOCK_TIMESTAMP() - make_interval(secs => %s),
+    (SELECT min(xact_start) FROM pg_stat_activity
+     WHERE datname = current_database() AND pid <> pg_backend_pid()
+     AND (backend_xid IS NOT NULL OR state = 'active')))
+'''
+
+
+def microseconds(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def parse_cursor(value):
+    '''
+    The Cursor of its string, raises ValueError when it is invalid
+    '''
+    match = CURSOR_RE.match(value)
+    if not match or int(match[2]) >= len(KINDS):
+        raise ValueError(f'Invalid cursor {value!r}')
+    return Cursor(*map(int, match.groups()))
+
+
+def format_cursor(cursor):
+    return '.'.join(map(str, cursor))
+
+
+def expired(cursor):
+    '''
+    Whether deletions after the cursor may have been pruned
+    '''
+    return cursor != START and cursor.time < microseconds(
+        timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS))
+
+
+def after(cursor, rank, field):
+    '''
+    The rows of the kind of the rank after the cursor in the stream
+    '''
+    time = EPOCH + timedelta(microseconds=cursor.time)
+    quote = connection.ops.quote_name
+    if rank < cursor.rank:
+        return Q(**{f'{field}__gt': time})
+    if rank > cursor.rank:
+        return Q(**{f'{field}__gte': time})
+    # a row comparison is a range of the index, so a page is read in
+    # order up to its limit, even among many rows of the same time
+    return RawSQL(f'({quote(field)}, {quote("id")}) > (%s, %s)',
+                  (connection.ops.adapt_datetimefield_value(time), cursor.id),
+                  output_field=BooleanField())
+
+
+def horizon():
+    '''
+    The time before which every change is committed
+    '''
+    settle = settings.SYNC_SETTLE_SECONDS
+    if connection.vendor != 'postgresql':
+        # a single writer at a time, on the host of the database
+        return timezone.now() - timedelta(seconds=settle)
+    with connection.cursor() as cursor:
+        cursor.execute(HORIZON_SQL, [settle])
+        return cursor.fetchone()[0]
+
+
+def changes(user, cursor=START, limit=500):
+    '''
+    The first changes of the user after the cursor, at most limit of
+    them, as the changed objects per kind, the ids of the deleted ones
+    per kind, the cursor to continue from, and whether more changes
+    are left
+    '''
+    end = horizon()
+    stream = []
+    for rank, (_, model, field) in enumerate(KINDS):
+        # one more than the limit tells whether more changes are left
+        for obj in (model.objects
+                    .filter(after(cursor, rank, field), user_id=user.id,
+                            **{f'{field}__lt': end})
+                    .order_by(field, 'id')[:limit + 1]):
+            stream.append((Cursor(microseconds(getattr(obj, field)),
+                                  rank, obj.id), obj))
+    stream.sort(key=lambda item: item[0])
+
+    page = {name: [] for name, model, _ in KINDS if model is not Tombstone}
+    page['deleted'] = {name: [] for name in page}
+    for _, obj in stream[:limit]:
+        if isinstance(obj, Tombstone):
+            page['deleted'][obj.kind].append(obj.object_id)
+        else:
+            page[kind_of(type(obj))].append(obj)
+    has_more = len(stream) > limit
+    if has_more:
+        cursor = stream[limit - 1][0]
+    else:
+        # everything before the horizon was returned
+        cursor = max(cursor, Cursor(microseconds(end), 0, 0))
+    page.update(cursor=format_cursor(cursor), has_more=has_more)
+    return page
+
+
+def kind_of(model):
+    return next(name for name, kind_model, _ in KINDS if kind_model is model)
+
+
+def bury(model, user_id, ids):
+    '''
+    Record the deletion of destinations, tags or features of the user
+    whose rows were deleted without signals
+    '''
+    Tombstone.objects.bulk_create(
+        [Tombstone(user_id=user_id, kind=kind_of(model), object_id=obj_id)
+         for obj_id in ids],
+        batch_size=BATCH_SIZE)
+
+
+def object_deleted(sender, instance, **kwargs):
+    '''
+    post_delete receiver of destinations, tags and features
+    '''
+    Tombstone.objects.create(user_id=instance.user_id, kind=kind_of(sender),
+                             object_id=instance.pk)
+
+
+def prune():
+    '''
+    Delete the tombstones older than SYNC_TOMBSTONE_DAYS, returns their
+    number
+    '''
+    # a single DELETE, tombstones have no signals nor relations
+    return Tombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(
+        days=settings.SYNC_TOMBSTONE_DAYS)).delete()[0]
@@ -0,0 +1,339 @@
+'''
+Synthetic dataset generator of the seed_data command
+
+Rows are generated with pre-assigned primary keys, so the destinations
+and their tag and feature links are computed without reading back what
+was inserted. They are written inside one transaction with batched
+bulk_create, or on Postgres with COPY streaming the rows while they
+are generated.
+
+Distributions:
+- destinations are spread evenly over the users, or by a Zipf law
+  with owner_skew > 0, so a few users own most of them
+- each user has tags_per_user tags; the number of tags of a destination
+  is normally spread around tags_per_destination, and a tag's chance
+  to be picked follows a Zipf law of exponent tag_skew over its rank
+- features are picked the same way
+- ratings are normally spread around rating_mean by rating_spread
+
+The statistics of the generated users are rebuilt at the end, see
+api/stats.py.
+'''
+import io
+import itertools
+import json
+import random
+import time
+from bisect import bisect_left
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from api import stats
+from api.models import Destination, Tag, Feature
+
+
+PASSWORD = 'seed-pass'
+COUNTRIES = (
+    ('France', ('Paris', 'Lyon', 'Nice', 'Bordeaux')),
+    ('Italy', ('Rome', 'Florence', 'Venice', 'Naples')),
+    ('Japan', ('Tokyo', 'Kyoto', 'Osaka', 'Sapporo')),
+    ('Peru', ('Lima', 'Cusco', 'Arequipa')),
+    ('Canada', ('Toronto', 'Montreal', 'Vancouver')),
+    ('Kenya', ('Nairobi', 'Mombasa')),
+    ('Chile', ('Santiago', 'Valparaiso')),
+    ('Norway', ('Oslo', 'Bergen', 'Tromso')),
+)
+TAG_NAMES = ('Beach', 'Mountain', 'City', 'Nature', 'History', 'Food',
+             'Nightlife', 'Family', 'Adventure', 'Relax', 'Culture',
+             'Shopping', 'Wildlife', 'Island', 'Desert', 'Lake')
+FEATURE_NAMES = ('Wifi', 'Parking', 'Pool', 'Spa', 'Gym', 'Restaurant',
+                 'Bar', 'Airport shuttle', 'Pet friendly', 'Sea view',
+                 'Breakfast', 'Air conditioning', 'Kitchen', 'Garden')
+
+USER_COLUMNS = ('id', 'password', 'email', 'name', 'is_active', 'is_staff',
+                'is_superuser')
+DESTINATION_COLUMNS = ('id', 'user_id', 'name', 'description', 'country',
+                       'city', 'rating', 'image', 'cached_tags',
+                       'cached_features', 'updated_at')
+NAMED_COLUMNS = ('id', 'user_id', 'name', 'updated_at')
+
+
+def zipf_weights(count, exponent):
+    '''
+    Cumulative weights of ranks 1 to count, for random.choices
+    '''
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def name_of(names, rank):
+    '''
+    The rank-th name, numbered once the names run out
+    '''
+    name = names[rank % len(names)]
+    return name if rank < len(names) else f'{name} {rank // len(names)}'
+
+
+COPY_ESCAPES = str.maketrans(
+    {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_line(row):
+    '''
+    A row in the text format of COPY
+    '''
+    return '\t'.join([
+        str(value) if type(value) is int else
+        '\\N' if value is None else
+        ('t' if value else 'f') if type(value) is bool else
+        json.dumps(value).translate(COPY_ESCAPES) if type(value) is list else
+        str(value).translate(COPY_ESCAPES)
+        for value in row]) + '\n'
+
+
+class CopyReader(io.TextIOBase):
+    '''
+    File of COPY lines generated while the server reads them, so
+    Postgres loads one chunk while the next one is generated
+    '''
+
+    def __init__(self, rows):
+        self.lines = map(copy_line, rows)
+        self.buffer = ''
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunks = [self.buffer]
+        length = len(self.buffer)
+        while size < 0 or length < size:
+            lines = list(itertools.islice(self.lines, 1000))
+            if not lines:
+                break
+            self.count += len(lines)
+            chunk = ''.join(lines)
+            chunks.append(chunk)
+            length += len(chunk)
+        data = ''.join(chunks)
+        if size < 0:
+            self.buffer = ''
+            return data
+        self.buffer = data[size:]
+        return data[:size]
+
+
+class Writer:
+    '''
+    Insert rows with COPY or batched bulk_create, counting them
+    '''
+
+    def __init__(self, use_copy=False, skip_checks=False, batch_size=10000):
+        self.use_copy = use_copy
+        self.skip_checks = skip_checks
+        self.batch_size = batch_size
+        self.rows = {}
+
+    def begin(self):
+        '''
+        Called in the transaction before the first write
+        '''
+        if self.skip_checks:
+            # the generated rows are consistent by construction, the
+            # deferred foreign key checks would double the load time
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL session_replication_role = replica')
+
+    def write(self, model, columns, rows):
+        '''
+        Insert an iterable of rows, a single COPY streams all of them
+        '''
+        if self.use_copy:
+            reader = CopyReader(rows)
+            quote = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY {quote(model._meta.db_table)} '
+                    f'({", ".join(map(quote, columns))}) FROM STDIN',
+                    reader, 1 << 16)
+            count = reader.count
+        else:
+            count = 0
+            rows = iter(rows)
+            while True:
+                batch = [model(**dict(zip(columns, row))) for row in
+                         itertools.islice(rows, self.batch_size)]
+                if not batch:
+                    break
+                model.objects.bulk_create(batch)
+                count += len(batch)
+        label = model._meta.db_table
+        self.rows[label] = self.rows.get(label, 0) + count
+
+
+class Generator:
+    '''
+    Deterministic generator of users, destinations, tags and features
+    '''
+
+    def __init__(self, users=1000, destinations=10000, tags_per_user=10,
+                 features_per_user=10, tags_per_destination=3,
+                 features_per_destination=3, tag_skew=1.1, owner_skew=0.0,
+                 rating_mean=3.8, rating_spread=0.7, prefix='seed', seed=0,
+                 batch_size=10000):
+        self.users = users
+        self.destinations = destinations
+        self.tags_per_user = tags_per_user
+        self.features_per_user = features_per_user
+        self.tags_per_destination = tags_per_destination
+        self.features_per_destination = features_per_destination
+        self.tag_skew = tag_skew
+        self.owner_skew = owner_skew
+        self.rating_mean = rating_mean
+        self.rating_spread = rating_spread
+        self.prefix = prefix
+        self.seed = seed
+        self.batch_size = batch_size
+
+    def first_ids(self):
+        '''
+        The first free primary key of every generated model
+        '''
+        return {model: (model.objects.aggregate(last=Max('id'))['last']
+                        or 0) + 1
+                for model in (get_user_model(), Destination, Tag, Feature)}
+
+    def batches(self, rows):
+        iterator = iter(rows)
+        while True:
+            batch = list(itertools.islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def user_rows(self, first_id):
+        password = make_password(PASSWORD)
+        for index in range(self.users):
+            yield (first_id + index, password,
+                   f'{self.prefix}-{index}@example.com', f'User {index}',
+                   True, False, False)
+
+    def named_rows(self, first_user_id, first_id, per_user, names, now):
+        for user_index in range(self.users):
+            for rank in range(per_user):
+                yield (first_id + user_index * per_user + rank,
+                       first_user_id + user_index, name_of(names, rank), now)
+
+    def pick(self, rng, mean, per_user, weights):
+        '''
+        Ranks of the tags or features of one destination
+        '''
+        if not per_user or mean <= 0:
+            return ()
+        count = min(per_user, max(1, round(rng.gauss(mean, mean / 3))))
+        ranks = set()
+        while len(ranks) < count:
+            ranks.update(rng.choices(range(per_user), cum_weights=weights,
+                                     k=count - len(ranks)))
+        return sorted(ranks)
+
+    def destination_rows(self, rng, first_ids, links, now):
+        '''
+        Destinations, with their tag and feature links added to links
+        '''
+        user_model = get_user_model()
+        owner_weights = zipf_weights(self.users, self.owner_skew) \
+            if self.owner_skew > 0 else None
+        tag_weights = zipf_weights(self.tags_per_user, self.tag_skew)
+        feature_weights = zipf_weights(self.features_per_user, self.tag_skew)
+        tags_through = Destination.tags.through
+        features_through = Destination.features.through
+
+        for index in range(self.destinations):
+            destination_id = first_ids[Destination] + index
+            if owner_weights:
+                owner = bisect_left(owner_weights,
+                                    rng.random() * owner_weights[-1])
+            else:
+                owner = index % self.users
+            country, cities = rng.choice(COUNTRIES)
+            rating = min(max(rng.gauss(self.rating_mean, self.rating_spread),
+                             0.0), 5.0)
+            # the denormalized names, see api/denorm.py
+            cached = {Tag: [], Feature: []}
+            for model, mean, per_user, weights, names in (
+                    (Tag, self.tags_per_destination, self.tags_per_user,
+                     tag_weights, TAG_NAMES),
+                    (Feature, self.features_per_destination,
+                     self.features_per_user, feature_weights,
+                     FEATURE_NAMES)):
+                through = tags_through if model is Tag else features_through
+                for rank in self.pick(rng, mean, per_user, weights):
+                    target_id = first_ids[model] + owner * per_user + rank
+                    links[through].append((destination_id, target_id))
+                    cached[model].append([target_id, name_of(names, rank)])
+            yield (destination_id, first_ids[user_model] + owner,
+                   f'Destination {index}',
+                   f'Synthetic destination {index} in {country}',
+                   country, rng.choice(cities), f'{rating:.1f}', None,
+                   cached[Tag], cached[Feature], now)
+
+    @transaction.atomic
+    def run(self, writer, progress=None):
+        '''
+        Insert the dataset, returns the number of rows of every table
+        '''
+        rng = random.Random(self.seed)
+        user_model = get_user_model()
+        first_ids = self.first_ids()
+        now = timezone.now()
+        start = time.perf_counter()
+        writer.begin()
+
+        def report(label):
+            if progress:
+                rows = sum(writer.rows.values())
+                progress(label, rows, time.perf_counter() - start)
+
+        writer.write(user_model, USER_COLUMNS,
+                     self.user_rows(first_ids[user_model]))
+        report('users')
+        for model, per_user, names in (
+                (Tag, self.tags_per_user, TAG_NAMES),
+                (Feature, self.features_per_user, FEATURE_NAMES)):
+            writer.write(model, NAMED_COLUMNS, self.named_rows(
+                first_ids[user_model], first_ids[model], per_user, names,
+                now))
+            report(model._meta.verbose_name_plural)
+
+        # destinations are generated in batches, as their links
+        # are kept in memory until the batch is written
+        links = {Destination.tags.through: [],
+                 Destination.features.through: []}
+        for batch in self.batches(
+                self.destination_rows(rng, first_ids, links, now)):
+            writer.write(Destination, DESTINATION_COLUMNS, batch)
+            # write the links of the batch once its destinations exist
+            for through, rows in links.items():
+                columns = tuple(field.attname for field in
+                                through._meta.concrete_fields[1:])
+                writer.write(through, columns, rows)
+                rows.clear()
+            report('destinations')
+
+        # the statistics of the users, the rows bypassed their signals
+        stats.rebuild(range(first_ids[user_model],
+                            first_ids[user_model] + self.users))
+        report('statistics')
+
+        if connection.vendor == 'postgresql':
+            # move the sequences past the pre-assigned ids
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                        no_style(), list(first_ids)):
+                    cursor.execute(sql)
+        return writer.rows
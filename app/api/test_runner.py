@@ -0,0 +1,43 @@
+'''
+Test runner failing tests whose requests run N+1 queries
+'''
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class NPlusOneTestRunner(DiscoverRunner):
+    '''
+    Run the tests with the N+1 detector raising, see api/nplusone.py
+
+    A request repeating a statement more than NPLUSONE_THRESHOLD times
+    raises NPlusOneError, which the test client re-raises in the test.
+    Throttling is off, the tests enabling it clear the cache.
+    '''
+
+    def __init__(self, nplusone=True, nplusone_threshold=None, **kwargs):
+        super().__init__(**kwargs)
+        self.nplusone = nplusone
+        self.nplusone_threshold = nplusone_threshold
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--no-nplusone', action='store_false', dest='nplusone',
+            help='Do not fail tests on N+1 queries.')
+        parser.add_argument(
+            '--nplusone-threshold', type=int,
+            help='How often a request may run the same statement.')
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        options = {'NPLUSONE_ENABLED': self.nplusone, 'NPLUSONE_RAISE': True,
+                   'THROTTLE_ENABLED': False}
+        if self.nplusone_threshold is not None:
+            options['NPLUSONE_THRESHOLD'] = self.nplusone_threshold
+        self._nplusone_settings = override_settings(**options)
+        self._nplusone_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._nplusone_settings.disable()
+        super().teardown_test_environment(**kwargs)
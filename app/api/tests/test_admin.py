@@ -1,6 +1,11 @@
-from django.test import TestCase, Client
+from unittest import mock, skipUnless
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from api import admin, export
+from api.models import Destination, Feature, Tag
 
 
 class AdminSiteTests(TestCase):
@@ -52,3 +57,192 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+
+class LargeTableAdminTests(TestCase):
+    '''
+    Test the admin of destinations, tags and features
+    '''
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@example.com",
+            password="admin123",
+        )
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com",
+            password="user123",
+        )
+        self.tag = Tag.objects.create(user=self.user, name="Beach")
+        for number in range(3):
+            Destination.objects.create(
+                user=self.user, name=f"Destination {number}",
+                country="France", city="Paris", rating=4.0)
+
+    def test_destinations_listed(self):
+        '''
+        Test the users of a page are fetched with the destinations
+        '''
+        url = reverse("admin:api_destination_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+
+        self.assertContains(res, "Destination 2")
+        self.assertContains(res, self.user.email)
+        # only the user of the session is queried by itself
+        user_queries = [query["sql"] for query in queries
+                        if query["sql"].startswith('SELECT "api_user"')]
+        self.assertEqual(len(user_queries), 1)
+
+    def test_destination_search(self):
+        '''
+        Test searching destinations by name prefix or by user email
+        '''
+        url = reverse("admin:api_destination_changelist")
+        other = get_user_model().objects.create_user(
+            email="other@example.com", password="user123")
+        Destination.objects.create(
+            user=other, name="Other", country="France", city="Paris",
+            rating=4.0)
+
+        res = self.client.get(url, {"q": "Destination"})
+        self.assertEqual(res.context["cl"].result_count, 3)
+        res = self.client.get(url, {"q": "tination"})
+        self.assertEqual(res.context["cl"].result_count, 0)
+        res = self.client.get(url, {"q": other.email})
+        self.assertEqual(res.context["cl"].result_count, 1)
+
+    def test_destination_change_page(self):
+        '''
+        Test the tags are not rendered as a select of all tags
+        '''
+        destination = Destination.objects.first()
+        url = reverse("admin:api_destination_change", args=[destination.id])
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotContains(res, "Beach")
+        self.assertContains(res, "admin-autocomplete")
+
+    def test_tag_autocomplete(self):
+        '''
+        Test the tags of the destination form are searched by prefix
+        '''
+        res = self.client.get(reverse("admin:autocomplete"), {
+            "app_label": "api", "model_name": "destination",
+            "field_name": "tags", "term": "Bea"})
+
+        self.assertEqual([item["text"] for item in res.json()["results"]],
+                         ["Beach"])
+
+    def test_exact_count_without_estimate(self):
+        '''
+        Test small or unestimated querysets are counted exactly
+        '''
+        paginator = admin.EstimatedCountPaginator(
+            Destination.objects.order_by("id"), 2)
+
+        with mock.patch("api.admin.estimated_count", return_value=None):
+            self.assertEqual(paginator.count, 3)
+
+    @skipUnless(connection.vendor == "postgresql", "planner estimate")
+    def test_estimated_count(self):
+        '''
+        Test large querysets are counted with the planner estimate
+        '''
+        paginator = admin.EstimatedCountPaginator(
+            Destination.objects.order_by("id"), 2)
+
+        with mock.patch("api.admin.EXACT_COUNT_LIMIT", 0), \
+                mock.patch("api.admin.estimated_count",
+                           wraps=admin.estimated_count) as estimate:
+            self.assertIsInstance(paginator.count, int)
+        estimate.assert_called_once()
+
+
+class ExportTests(TestCase):
+    '''
+    Test the CSV export actions of the admin
+    '''
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@example.com",
+            password="admin123",
+        )
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user(
+            email="user@example.com",
+            password="user123",
+        )
+        beach = Tag.objects.create(user=self.user, name="Beach")
+        surf = Tag.objects.create(user=self.user, name="Surf")
+        wifi = Feature.objects.create(user=self.user, name="Wifi")
+        self.destinations = []
+        for number in range(3):
+            destination = Destination.objects.create(
+                user=self.user, name=f"Destination {number}",
+                description="Sea, sun", country="France", city="Paris",
+                rating=4.0)
+            destination.tags.add(beach, surf)
+            destination.features.add(wifi)
+            self.destinations.append(destination)
+
+    def export(self, model_name, ids, query="", **data):
+        res = self.client.post(
+            reverse(f"admin:api_{model_name}_changelist") + query,
+            {"action": "export_csv", "_selected_action": ids, **data})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        return b"".join(res.streaming_content).decode().splitlines()
+
+    def test_export_selected(self):
+        '''
+        Test the selected destinations are exported with their names
+        '''
+        first = self.destinations[0]
+
+        lines = self.export("destination", [first.id])
+
+        self.assertEqual(lines, [
+            "id,name,description,country,city,rating,user,tags,features",
+            f'{first.id},Destination 0,"Sea, sun",France,Paris,4.0,'
+            f'user@example.com,"Beach, Surf",Wifi',
+        ])
+
+    def test_export_filtered_changelist(self):
+        '''
+        Test "select all" exports every row of the searched changelist
+        '''
+        Tag.objects.create(user=self.admin_user, name="Mountain")
+
+        lines = self.export("tag", [Tag.objects.first().id],
+                            query="?q=Mount", select_across="1",
+                            index="0")
+
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].endswith(",Mountain,admin@example.com"))
+
+    @override_settings(DESTINATION_CACHED_NAMES=False)
+    def test_export_prefetches_links(self):
+        '''
+        Test the links are fetched per chunk without cached names
+        '''
+        ids = [destination.id for destination in self.destinations]
+        queryset = admin.admin.site._registry[Destination] \
+            .get_export_queryset(
+                Destination.objects.filter(id__in=ids)
+                .select_related("user").order_by("id"))
+
+        # the destinations, then the tags and features of each chunk
+        with self.assertNumQueries(5):
+            lines = list(export.rows(
+                queryset, admin.DestinationAdmin.csv_columns,
+                chunk_size=2))
+
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].rstrip().endswith('"Beach, Surf",Wifi'))
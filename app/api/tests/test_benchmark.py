@@ -0,0 +1,45 @@
+from django.test import SimpleTestCase
+from api.benchmark import compare, drive, percentile
+
+
+class BenchmarkTests(SimpleTestCase):
+    """
+    Test the HTTP load driver used by the benchmark commands
+    """
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertIsNone(percentile([], 50))
+
+    def test_drive_counts_requests_and_errors(self):
+        """
+        Test every request is sent exactly once across the threads
+        """
+        seen = []
+
+        def make_request(i):
+            seen.append(i)
+            return i % 10 != 0
+
+        result = drive(make_request, total=50, concurrency=4)
+        summary = result.summary()
+
+        self.assertEqual(sorted(seen), list(range(50)))
+        self.assertEqual(summary['requests'], 50)
+        self.assertEqual(summary['errors'], 5)
+        self.assertGreater(summary['rps'], 0)
+
+    def test_compare_with_baseline(self):
+        """
+        Test changes are relative to the baseline, in percent
+        """
+        results = {'tag-list': {'rps': 150.0, 'p95_ms': 8.0},
+                   'token': {'rps': 10.0, 'p95_ms': 100.0}}
+        baseline = {'tag-list': {'rps': 100.0, 'p95_ms': 10.0}}
+
+        self.assertEqual(compare(results, baseline),
+                         {'tag-list': {'rps': 50.0, 'p95_ms': -20.0}})
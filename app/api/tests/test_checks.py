@@ -0,0 +1,44 @@
+from django.test import SimpleTestCase, override_settings
+from api import checks
+
+
+LOCMEM = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+REDIS = {'default': {
+    'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    'LOCATION': 'redis://redis:6379/0'}}
+
+
+class ChecksTests(SimpleTestCase):
+    """Test the system checks of the settings"""
+
+    @override_settings(DATABASE_REPLICAS=['replica1'], CACHES=LOCMEM)
+    def test_replicas_with_local_cache(self):
+        """Test replicas are refused with a cache of one process"""
+        errors = checks.check_replica_cache(None)
+
+        self.assertEqual([error.id for error in errors], ['api.E001'])
+
+    @override_settings(DATABASE_REPLICAS=['replica1'], CACHES=REDIS)
+    def test_replicas_with_shared_cache(self):
+        self.assertEqual(checks.check_replica_cache(None), [])
+
+    @override_settings(DATABASE_REPLICAS=[], CACHES=LOCMEM)
+    def test_no_replicas(self):
+        self.assertEqual(checks.check_replica_cache(None), [])
+
+    @override_settings(THROTTLE_ENABLED=True, DEBUG=False, CACHES=LOCMEM)
+    def test_throttling_with_local_cache(self):
+        """Test each worker would allow the whole rate on its own"""
+        errors = checks.check_throttle_cache(None)
+
+        self.assertEqual([error.id for error in errors], ['api.E002'])
+
+    @override_settings(THROTTLE_ENABLED=True, DEBUG=False, CACHES=REDIS)
+    def test_throttling_with_shared_cache(self):
+        self.assertEqual(checks.check_throttle_cache(None), [])
+
+    @override_settings(THROTTLE_ENABLED=True, DEBUG=True, CACHES=LOCMEM)
+    def test_throttling_local_cache_in_debug(self):
+        """Test the single process of the development server is fine"""
+        self.assertEqual(checks.check_throttle_cache(None), [])
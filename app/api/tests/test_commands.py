@@ -1,35 +1,131 @@
-from unittest.mock import patch
+import tempfile
+from io import StringIO
+from unittest.mock import call, patch
 from psycopg2 import OperationalError as Psycopg2OpError
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+from api.management.commands import import_time
 
 
-@patch('api.management.commands.wait_for_db.Command.check')
+@patch('api.management.commands.wait_for_db.Command.probe')
 class CommandTests(SimpleTestCase):
     """
     Test class for the 'wait_for_db' command.
     """
 
-    def test_wait_for_db_ready(self, patched_check):
+    def test_wait_for_db_ready(self, patched_probe):
         """
         Test case for when the database is immediately available.
         """
 
-        patched_check.return_value = True
-        call_command('wait_for_db')
-        patched_check.assert_called_once_with(databases=['default'])
+        patched_probe.return_value = None
+        call_command('wait_for_db', stdout=StringIO())
+        patched_probe.assert_called_once_with('default', 3)
 
     @patch('time.sleep')
-    def test_wait_for_db_delay(self, patched_sleep, patched_check):
+    def test_wait_for_db_delay(self, patched_sleep, patched_probe):
         """
-        Test case for when the database is not immediately available.
+        Test case for when the database is not immediately available,
+        retried with exponential backoff.
         """
 
-        patched_check.side_effect = [Psycopg2OpError] * 2 \
-            + [OperationalError] * 2 + [True]
-        call_command('wait_for_db')
-        # Assert that the check was called
-        # six times before a successful connection
-        self.assertEqual(patched_check.call_count, 5)
-        patched_check.assert_called_with(databases=['default'])
+        patched_probe.side_effect = [Psycopg2OpError] * 2 \
+            + [OperationalError] * 2 + [None]
+        call_command('wait_for_db', stdout=StringIO())
+        # Assert that the probe was called
+        # five times before a successful connection
+        self.assertEqual(patched_probe.call_count, 5)
+        patched_probe.assert_called_with('default', 3)
+        self.assertEqual(patched_sleep.call_args_list,
+                         [call(0.1), call(0.2), call(0.4), call(0.8)])
+
+    @patch('time.sleep')
+    def test_wait_for_db_max_delay(self, patched_sleep, patched_probe):
+        patched_probe.side_effect = [OperationalError] * 4 + [None]
+        call_command('wait_for_db', max_delay=0.3, stdout=StringIO())
+
+        self.assertEqual(patched_sleep.call_args_list,
+                         [call(0.1), call(0.2), call(0.3), call(0.3)])
+
+    @patch('time.sleep')
+    def test_wait_for_db_deadline(self, patched_sleep, patched_probe):
+        """
+        Test the command fails once the timeout has passed.
+        """
+
+        patched_probe.side_effect = OperationalError
+        with self.assertRaises(CommandError):
+            call_command('wait_for_db', timeout=0, stdout=StringIO())
+        patched_sleep.assert_not_called()
+
+
+class StartupCommandTests(TestCase):
+    """
+    Test class for the 'startup' command.
+    """
+
+    def setUp(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        settings_override = override_settings(STATIC_ROOT=static_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def startup(self):
+        out = StringIO()
+        call_command('startup', stdout=out)
+        return out.getvalue()
+
+    def test_startup(self):
+        """
+        Test every phase is reported, nothing is pending in tests.
+        """
+        output = self.startup()
+
+        self.assertIn('Database is ready!', output)
+        self.assertIn('collectstatic:', output)
+        self.assertIn('(collected)', output)
+        self.assertIn('migrate:', output)
+        self.assertIn('(nothing to apply, skipped)', output)
+        self.assertIn('Startup took', output)
+
+    def test_unchanged_static_files_are_not_collected(self):
+        self.startup()
+        with patch('api.management.commands.startup.call_command') \
+                as patched_call_command:
+            output = self.startup()
+
+        self.assertIn('(unchanged, skipped)', output)
+        called = [args[0] for args, _ in
+                  patched_call_command.call_args_list]
+        self.assertNotIn('collectstatic', called)
+
+
+class ImportTimeTests(SimpleTestCase):
+
+    def test_parse(self):
+        """Test parsing a -X importtime report"""
+        report = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     _abc\n'
+            'import time:       300 |        420 |   abc\n'
+            'Traceback (most recent call last):\n')
+
+        self.assertEqual(import_time.parse(report),
+                         [('_abc', 120, 120, 2), ('abc', 300, 420, 1)])
+
+    def test_report(self):
+        """Test the command imports the module in a fresh interpreter"""
+        out = StringIO()
+        call_command('import_time', module='api.health', top=3,
+                     stdout=out)
+
+        self.assertIn('modules imported in', out.getvalue())
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+
+    def test_import_fails(self):
+        with self.assertRaisesRegex(CommandError, 'ModuleNotFoundError'):
+            call_command('import_time', module='api.missing',
+                         stdout=StringIO())
@@ -0,0 +1,129 @@
+from unittest import skipUnless
+from unittest.mock import patch
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase
+from api.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    '''
+    Stand-in for a DB-API connection
+    '''
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    '''
+    Test the per-worker connection pool
+    '''
+
+    def setUp(self):
+        self.checked = []
+        self.pool = ConnectionPool(
+            max_size=2, timeout=0.05, health_check_after=0,
+            check=self.checked.append
+        )
+
+    def test_connection_reused(self):
+        '''
+        Test a returned connection is handed out again
+        '''
+        conn = self.pool.getconn(FakeConnection)
+        self.pool.putconn(conn)
+
+        self.assertIs(self.pool.getconn(FakeConnection), conn)
+        self.assertEqual(self.checked, [conn])
+        stats = self.pool.stats()
+        self.assertEqual(stats['connects'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_pool_bounded(self):
+        '''
+        Test checkout times out when all connections are in use
+        '''
+        self.pool.getconn(FakeConnection)
+        self.pool.getconn(FakeConnection)
+
+        with self.assertRaises(PoolTimeout):
+            self.pool.getconn(FakeConnection)
+        stats = self.pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['saturation'], 1.0)
+        self.assertGreaterEqual(stats['wait_seconds_max'], 0)
+
+    def test_failed_health_check_discards_connection(self):
+        '''
+        Test a connection failing the checkout check is replaced
+        '''
+        def check(conn):
+            raise OSError('server closed the connection')
+
+        self.pool.check = check
+        conn = self.pool.getconn(FakeConnection)
+        self.pool.putconn(conn)
+
+        new_conn = self.pool.getconn(FakeConnection)
+        self.assertIsNot(new_conn, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(self.pool.stats()['health_check_failures'], 1)
+
+    def test_closed_connection_not_returned(self):
+        conn = self.pool.getconn(FakeConnection)
+        conn.close()
+        self.pool.putconn(conn)
+
+        self.assertEqual(self.pool.stats()['size'], 0)
+        self.assertIsNot(self.pool.getconn(FakeConnection), conn)
+
+    def test_failed_connect_frees_slot(self):
+        def connect():
+            raise OSError('could not connect')
+
+        for _ in range(3):
+            with self.assertRaises(OSError):
+                self.pool.getconn(connect)
+        self.assertEqual(self.pool.stats()['size'], 0)
+
+    def test_fork_forgets_parent_connections(self):
+        '''
+        Test a forked worker opens its own connections
+        '''
+        conn = self.pool.getconn(FakeConnection)
+        self.pool.putconn(conn)
+
+        with patch('api.db.pool.os.getpid', return_value=-1):
+            new_conn = self.pool.getconn(FakeConnection)
+
+        self.assertIsNot(new_conn, conn)
+        # the parent's socket must not be closed by the child
+        self.assertFalse(conn.closed)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'pooled postgresql backend')
+class PooledBackendTests(TestCase):
+    '''
+    Test the pooled postgresql backend
+    '''
+
+    def test_connection_reused_after_close(self):
+        '''
+        Test closing a connection at the end of a request keeps it open
+        '''
+        # a separate wrapper, the one of the test case is inside
+        # the test transaction and discards its connection on close
+        wrapper = connections.create_connection('default')
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        raw_connection = wrapper.connection
+        connects = wrapper._pool.stats()['connects']
+        wrapper.close()
+
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw_connection)
+        self.assertEqual(wrapper._pool.stats()['connects'], connects)
@@ -0,0 +1,121 @@
+from unittest import skipUnless
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from api.db.router import ReplicaRouter, use_replica, pin_to_primary
+from api.models import Destination
+
+
+DESTINATION_URL = reverse('destination:destination-list')
+# a separate replica database, as in app/test_replica_settings.py
+HAS_REPLICA_DATABASE = 'replica1' in settings.DATABASES and \
+    settings.DATABASES['replica1'].get('TEST', {}).get('MIRROR') is None
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=5)
+class ReplicaRouterTests(SimpleTestCase):
+    '''
+    Test routing decisions of the replica router
+    '''
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        cache.clear()
+
+    def test_reads_use_primary_by_default(self):
+        self.assertIsNone(self.router.db_for_read(Destination))
+        self.assertEqual(self.router.db_for_write(Destination), 'default')
+
+    def test_reads_inside_use_replica(self):
+        with use_replica(user_id=1) as alias:
+            self.assertEqual(alias, 'replica1')
+            self.assertEqual(self.router.db_for_read(Destination), alias)
+            self.assertEqual(self.router.db_for_write(Destination),
+                             'default')
+        self.assertIsNone(self.router.db_for_read(Destination))
+
+    def test_pinned_user_reads_primary(self):
+        '''
+        Test a user who just wrote keeps reading from the primary
+        '''
+        pin_to_primary(1)
+
+        with use_replica(user_id=1) as alias:
+            self.assertIsNone(alias)
+            self.assertIsNone(self.router.db_for_read(Destination))
+        with use_replica(user_id=2) as alias:
+            self.assertEqual(alias, 'replica1')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        with use_replica(user_id=1) as alias:
+            self.assertIsNone(alias)
+
+
+def create_destination(user, using='default', **params):
+    """Helper function to create a destination in one database"""
+    destination_values = {
+        'name': 'Test Destination',
+        'country': 'Test country',
+        'city': 'Test city',
+        'rating': 4.5,
+    }
+    destination_values.update(params)
+    return Destination.objects.using(using).create(
+        user=user, **destination_values)
+
+
+@skipUnless(HAS_REPLICA_DATABASE,
+            'run with --settings=app.test_replica_settings')
+class ReplicaApiTests(TestCase):
+    '''
+    Test the destination API against a primary and a replica database
+    '''
+    databases = {'default', 'replica1'} if HAS_REPLICA_DATABASE \
+        else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass'
+        )
+        # the replica only receives the rows written to it directly,
+        # so its rows tell which database answered a request
+        self.user.save(using='replica1')
+        create_destination(self.user, using='replica1', name='Replica')
+        self.client.force_authenticate(self.user)
+
+    def test_get_reads_from_replica(self):
+        create_destination(self.user, name='Primary')
+
+        res = self.client.get(DESTINATION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in res.data], ['Replica'])
+
+    def test_reads_stick_to_primary_after_write(self):
+        '''
+        Test a user sees their own write while the replica lags behind
+        '''
+        payload = {
+            'name': 'Primary',
+            'country': 'Test country',
+            'city': 'Test city',
+            'rating': 4.5,
+        }
+        res = self.client.post(DESTINATION_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.get(DESTINATION_URL)
+        self.assertEqual([item['name'] for item in res.data], ['Primary'])
+
+        # once the sticky window has passed reads go to the replica again
+        cache.clear()
+        res = self.client.get(DESTINATION_URL)
+        self.assertEqual([item['name'] for item in res.data], ['Replica'])
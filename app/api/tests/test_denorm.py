@@ -0,0 +1,143 @@
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from api.models import Destination, Feature, Tag
+from api.synthetic import Generator, Writer
+
+
+DESTINATIONS_URL = reverse('destination:destination-list')
+
+
+def cached(destination):
+    destination.refresh_from_db()
+    return destination.cached_tags, destination.cached_features
+
+
+class DenormalizedNamesTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.destination = Destination.objects.create(
+            user=self.user, name='Test destination', country='Test country',
+            city='Test city', rating=4.0)
+        self.beach = Tag.objects.create(user=self.user, name='Beach')
+        self.city = Tag.objects.create(user=self.user, name='City')
+        self.wifi = Feature.objects.create(user=self.user, name='Wifi')
+
+    def test_links_changed(self):
+        """Test the names follow adding, removing and clearing links"""
+        self.destination.tags.add(self.city, self.beach)
+        self.destination.features.add(self.wifi)
+        self.assertEqual(self.destination.cached_tags,
+                         [[self.beach.id, 'Beach'], [self.city.id, 'City']])
+        self.assertEqual(cached(self.destination), (
+            [[self.beach.id, 'Beach'], [self.city.id, 'City']],
+            [[self.wifi.id, 'Wifi']]))
+
+        self.destination.tags.remove(self.beach)
+        self.assertEqual(cached(self.destination)[0],
+                         [[self.city.id, 'City']])
+        self.destination.features.clear()
+        self.assertEqual(cached(self.destination)[1], [])
+
+    def test_reverse_links_changed(self):
+        other = Destination.objects.create(
+            user=self.user, name='Other', country='Test country',
+            city='Test city', rating=3.0)
+        self.beach.destination_set.add(self.destination, other)
+        self.assertEqual(cached(other)[0], [[self.beach.id, 'Beach']])
+
+        self.beach.destination_set.clear()
+        self.assertEqual(cached(self.destination)[0], [])
+        self.assertEqual(cached(other)[0], [])
+
+    def test_serializer_writes(self):
+        """Test creating and updating through the API writes the names"""
+        res = self.client.post(DESTINATIONS_URL, {
+            'name': 'New', 'country': 'Test country', 'city': 'Test city',
+            'rating': 4.5, 'tags': [{'name': 'Beach'}, {'name': 'Lake'}],
+            'features': [{'name': 'Wifi'}]}, format='json')
+        destination = Destination.objects.get(id=res.data['id'])
+        lake = Tag.objects.get(name='Lake')
+        self.assertEqual(cached(destination), (
+            [[self.beach.id, 'Beach'], [lake.id, 'Lake']],
+            [[self.wifi.id, 'Wifi']]))
+
+        self.client.patch(
+            reverse('destination:destination-detail', args=[destination.id]),
+            {'tags': [{'name': 'City'}], 'features': []}, format='json')
+        self.assertEqual(cached(destination),
+                         ([[self.city.id, 'City']], []))
+
+    def test_rename_and_delete(self):
+        """Test renaming or deleting a tag through the API updates them"""
+        self.destination.tags.add(self.beach, self.city)
+
+        self.client.patch(reverse('destination:tag-detail',
+                                  args=[self.beach.id]), {'name': 'Shore'})
+        self.assertEqual(cached(self.destination)[0],
+                         [[self.beach.id, 'Shore'], [self.city.id, 'City']])
+
+        self.client.delete(reverse('destination:tag-detail',
+                                   args=[self.city.id]))
+        self.assertEqual(cached(self.destination)[0],
+                         [[self.beach.id, 'Shore']])
+
+    def test_list_without_link_tables(self):
+        """Test the list reads the tags from the destination rows"""
+        self.destination.tags.add(self.beach)
+        self.destination.features.add(self.wifi)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(DESTINATIONS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['tags'],
+                         [{'id': self.beach.id, 'name': 'Beach'}])
+        self.assertEqual(res.data[0]['features'],
+                         [{'id': self.wifi.id, 'name': 'Wifi'}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('api_destination_tags', queries[0]['sql'])
+
+    @override_settings(DESTINATION_CACHED_NAMES=False)
+    def test_list_from_link_tables(self):
+        self.destination.tags.add(self.beach)
+        Destination.objects.update(cached_tags=[])
+
+        res = self.client.get(DESTINATIONS_URL)
+
+        self.assertEqual(res.data[0]['tags'],
+                         [{'id': self.beach.id, 'name': 'Beach'}])
+
+    def test_check_repairs_drift(self):
+        self.destination.tags.add(self.beach)
+        # a rename outside the tag API leaves the old name behind
+        Tag.objects.filter(id=self.beach.id).update(name='Shore')
+
+        with self.assertRaises(CommandError):
+            call_command('check_denormalized', dry_run=True,
+                         stdout=StringIO())
+        out = StringIO()
+        call_command('check_denormalized', stdout=out)
+
+        self.assertIn('1 drifted', out.getvalue())
+        self.assertEqual(cached(self.destination)[0],
+                         [[self.beach.id, 'Shore']])
+        call_command('check_denormalized', dry_run=True, stdout=StringIO())
+
+    def test_synthetic_data_consistent(self):
+        """Test the seeded destinations come with their names"""
+        Generator(users=2, destinations=20, tags_per_user=5,
+                  features_per_user=5, prefix='denorm').run(Writer())
+
+        call_command('check_denormalized', dry_run=True, stdout=StringIO())
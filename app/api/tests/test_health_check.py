@@ -1,10 +1,16 @@
-from django.test import TestCase
+import tempfile
+from unittest.mock import Mock, patch
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from api import health
 
 
 HEALTH_CHECK_URL = reverse('health-check')
+LIVENESS_URL = reverse('health-live')
+READINESS_URL = reverse('health-ready')
 
 
 class HealthCheckTests(TestCase):
@@ -18,3 +24,77 @@ class HealthCheckTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, {'status': 'ok'})
+
+
+@override_settings(READINESS_CACHE_SECONDS=60)
+class ReadinessTests(TestCase):
+    """Test the liveness and the cached readiness checks"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        health.reset()
+        self.addCleanup(health.reset)
+
+    def test_liveness(self):
+        with self.assertNumQueries(0):
+            res = self.client.get(LIVENESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_ready(self):
+        res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_result_is_cached(self):
+        """
+        Test probes within the cache interval do not run the checks
+        """
+        self.client.get(READINESS_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(READINESS_CACHE_SECONDS=0)
+    def test_migrations_checked_until_applied(self):
+        self.client.get(READINESS_URL)
+        with patch('api.health.MigrationExecutor') as executor:
+            res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        executor.assert_not_called()
+
+    def test_database_unavailable(self):
+        with patch.dict(health.CHECKS, database=Mock(
+                side_effect=DatabaseError('connection refused'))):
+            res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        errors = res.json()['errors']
+        self.assertEqual(errors['database'], 'connection refused')
+        self.assertIn('migrations', errors)
+        self.assertNotIn('media', errors)
+
+    def test_unapplied_migrations(self):
+        with patch('api.health.MigrationExecutor') as executor:
+            executor.return_value.migration_plan.return_value = [Mock()]
+            res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(list(res.json()['errors']), ['migrations'])
+
+    def test_media_not_writable(self):
+        with override_settings(MEDIA_ROOT='/nonexistent/media'):
+            res = self.client.get(READINESS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(list(res.json()['errors']), ['media'])
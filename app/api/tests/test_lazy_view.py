@@ -0,0 +1,35 @@
+from unittest.mock import patch
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import reverse
+from django.views import View
+from rest_framework import status
+from api.views import lazy_view
+
+
+class TargetView(View):
+
+    def get(self, request):
+        return HttpResponse('target')
+
+
+class LazyViewTests(SimpleTestCase):
+
+    def test_docs(self):
+        """Test the lazily imported docs view serves Swagger UI"""
+        res = self.client.get(reverse('docs'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(reverse('schema').encode(), res.content)
+
+    @patch('api.views.import_string', return_value=TargetView)
+    def test_imported_on_first_request(self, patched_import):
+        """Test the view is imported once, on its first request"""
+        view = lazy_view('api.tests.test_lazy_view.TargetView')
+        patched_import.assert_not_called()
+
+        request = RequestFactory().get('/')
+        self.assertEqual(view(request).content, b'target')
+        self.assertEqual(view(request).content, b'target')
+        patched_import.assert_called_once_with(
+            'api.tests.test_lazy_view.TargetView')
@@ -0,0 +1,56 @@
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from api.loadtest import seed
+from api.synthetic import PASSWORD
+from api.models import Destination, Tag, Feature
+
+
+class LoadTestSeedTests(TestCase):
+    """
+    Test the dataset seeded by the loadtest command
+    """
+
+    def test_seed_only(self):
+        """
+        Test the command seeds users with their tokens and fan-out
+        """
+        out = StringIO()
+        call_command('loadtest', '--seed-only', '--users', '3',
+                     '--destinations', '4', '--tags', '5', '--features', '2',
+                     stdout=out)
+
+        users = get_user_model().objects.filter(
+            email__startswith='loadtest-')
+        self.assertEqual(users.count(), 3)
+        self.assertFalse(users.filter(auth_token__isnull=True).exists())
+        self.assertEqual(Destination.objects.count(), 12)
+        self.assertEqual(Tag.objects.count(), 15)
+        self.assertEqual(Feature.objects.count(), 6)
+        for destination in Destination.objects.all():
+            self.assertTrue(destination.tags.exists())
+            self.assertFalse(
+                destination.tags.exclude(user=destination.user).exists())
+        self.assertTrue(users.first().check_password(PASSWORD))
+        self.assertIn('Seeded 3 users', out.getvalue())
+
+    def test_seed_replaces_previous_dataset(self):
+        """
+        Test seeding twice keeps one dataset with the same fan-out
+        """
+        seed(users=2, destinations=5, seed=7)
+        first = sorted(Destination.tags.through.objects.values_list(
+            'destination__name', 'destination__user__email', 'tag__name'))
+        tokens = seed(users=2, destinations=5, seed=7)
+        second = sorted(Destination.tags.through.objects.values_list(
+            'destination__name', 'destination__user__email', 'tag__name'))
+
+        self.assertEqual(len(tokens), 2)
+        self.assertEqual(Destination.objects.count(), 10)
+        self.assertEqual(first, second)
+
+    def test_unknown_scenario(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest', '--scenarios', 'token,missing')
@@ -0,0 +1,117 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from api.metrics import registry
+
+
+METRICS_URL = reverse('metrics')
+DESTINATION_URL = reverse('destination:destination-list')
+
+
+class MetricsTests(TestCase):
+    """Test the request metrics endpoint"""
+
+    def setUp(self):
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.metrics_dir.cleanup)
+        settings_override = override_settings(
+            METRICS_DIR=self.metrics_dir.name, METRICS_TOKEN='',
+            DEBUG=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        registry.reset()
+        self.client = APIClient()
+
+    def test_request_metrics_by_route(self):
+        """Test requests are counted per route with their DB queries"""
+        user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user)
+        self.client.get(DESTINATION_URL)
+        self.client.get(DESTINATION_URL)
+
+        res = self.client.get(METRICS_URL)
+        body = res.content.decode()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            'http_requests_total{route="destination:destination-list",'
+            'method="GET",status="200"} 2', body)
+        self.assertIn(
+            'http_request_duration_seconds_count'
+            '{route="destination:destination-list"} 2', body)
+        self.assertIn(
+            'http_request_duration_seconds_bucket'
+            '{route="destination:destination-list",le="+Inf"} 2', body)
+        self.assertIn(
+            'http_response_size_bytes_count'
+            '{route="destination:destination-list"} 2', body)
+        self.assertIn(
+            'db_queries_total{route="destination:destination-list"}', body)
+
+    def test_metrics_summed_across_workers(self):
+        """Test the files written by other workers are aggregated"""
+        self.client.get(DESTINATION_URL)
+        other_worker = {
+            'counters': [[
+                'http_requests_total',
+                [['route', 'destination:destination-list'],
+                 ['method', 'GET'], ['status', '401']],
+                3
+            ]],
+            'histograms': [],
+            'pool': {},
+        }
+        path = os.path.join(self.metrics_dir.name, 'metrics-1.json')
+        with open(path, 'w') as metrics_file:
+            json.dump(other_worker, metrics_file)
+
+        body = self.client.get(METRICS_URL).content.decode()
+
+        self.assertIn(
+            'http_requests_total{route="destination:destination-list",'
+            'method="GET",status="401"} 4', body)
+
+    def test_pool_gauges_of_exited_workers_skipped(self):
+        """Test the pool of a dead worker is not counted as open"""
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        stats = {'max_size': 4, 'size': 3, 'idle': 1, 'in_use': 2,
+                 'waiting': 1, 'checkouts': 7, 'connects': 3, 'timeouts': 0,
+                 'health_check_failures': 0, 'wait_seconds_total': 0.5}
+        path = os.path.join(self.metrics_dir.name,
+                            f'metrics-{process.pid}.json')
+        with open(path, 'w') as metrics_file:
+            json.dump({'counters': [], 'histograms': [],
+                       'pool': {'stale': stats}}, metrics_file)
+
+        body = self.client.get(METRICS_URL).content.decode()
+
+        self.assertNotIn('db_pool_in_use{alias="stale"}', body)
+        self.assertNotIn('db_pool_size{alias="stale"}', body)
+        self.assertIn('db_pool_checkouts_total{alias="stale"} 7', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token_required(self):
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(DEBUG=False)
+    def test_metrics_not_public(self):
+        """Test the metrics need a token outside of DEBUG"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
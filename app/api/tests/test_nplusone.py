@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import SimpleTestCase, TestCase, override_settings
+from api import nplusone
+from api.middleware import NPlusOneMiddleware
+from api.models import Destination
+
+
+class FingerprintTests(SimpleTestCase):
+    """Test statements are normalised without their values"""
+
+    def test_literals_and_placeholders(self):
+        self.assertEqual(
+            nplusone.fingerprint(
+                "SELECT * FROM t WHERE a = 'x''y' AND b = 12 AND c = %s"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c = ?')
+
+    def test_in_lists_of_any_length(self):
+        self.assertEqual(
+            nplusone.fingerprint('SELECT * FROM t WHERE id IN (%s, %s)'),
+            nplusone.fingerprint('SELECT * FROM t  WHERE id IN (1, 2, 3)'))
+
+
+class NPlusOneDetectionTests(TestCase):
+    """Test repeated statements are detected"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass')
+        for index in range(5):
+            Destination.objects.create(
+                user=user, name=f'Destination {index}', country='Peru',
+                city='Lima', rating=4.5)
+
+    def load_users(self):
+        for destination in Destination.objects.all():
+            destination.user.email
+
+    def test_loop_over_relation_is_reported(self):
+        """
+        Test the report has the count and the stack of the loop
+        """
+        with nplusone.track_queries(threshold=3) as tracker:
+            self.load_users()
+
+        repeated = tracker.repeated()
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][1], 5)
+        with override_settings(NPLUSONE_RAISE=True):
+            with self.assertRaises(nplusone.NPlusOneError) as context:
+                nplusone.check(tracker, 'test')
+        self.assertIn('5x SELECT', str(context.exception))
+        self.assertIn('in load_users', str(context.exception))
+
+    def test_logged_in_debug_mode(self):
+        with nplusone.track_queries(threshold=3) as tracker:
+            self.load_users()
+
+        with override_settings(NPLUSONE_RAISE=False), \
+                self.assertLogs('api.nplusone', 'WARNING'):
+            nplusone.check(tracker, 'test')
+
+    def test_select_related_is_not_reported(self):
+        with nplusone.track_queries(threshold=3) as tracker:
+            for destination in Destination.objects.select_related('user'):
+                destination.user.email
+
+        self.assertEqual(tracker.repeated(), [])
+
+    @override_settings(NPLUSONE_ENABLED=False)
+    def test_middleware_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            NPlusOneMiddleware(lambda request: None)
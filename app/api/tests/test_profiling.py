@@ -0,0 +1,97 @@
+import os
+import pstats
+import tempfile
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from api import profiling
+
+
+DESTINATION_URL = reverse('destination:destination-list')
+
+
+def artifact_url(request_id, kind):
+    return reverse('profile-artifact', args=[request_id, kind])
+
+
+class ProfilingTests(TestCase):
+    """Test on-demand profiling of requests"""
+
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        settings_override = override_settings(
+            PROFILE_DIR=self.profile_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_user(
+            email='staff@example.com',
+            password='testpass',
+            is_staff=True
+        )
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass'
+        )
+
+    def authenticate(self, user):
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_profile_staff_request(self):
+        """Test a flagged staff request stores its profile artifacts"""
+        self.authenticate(self.staff)
+
+        res = self.client.get(DESTINATION_URL, HTTP_X_PROFILE='1',
+                              HTTP_X_REQUEST_ID='list-request-1')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Profile-Id'], 'list-request-1')
+        for kind in profiling.ARTIFACTS:
+            path = profiling.artifact_path('list-request-1', kind)
+            self.assertTrue(os.path.exists(path))
+        stats = pstats.Stats(
+            profiling.artifact_path('list-request-1', 'pstats'))
+        self.assertGreater(stats.total_calls, 0)
+
+        res = self.client.get(artifact_url('list-request-1', 'sql'))
+        body = b''.join(res.streaming_content)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b'api_destination', body)
+
+    def test_profile_query_flag(self):
+        self.authenticate(self.staff)
+
+        res = self.client.get(DESTINATION_URL, {'profile': 1})
+
+        self.assertIn('X-Profile-Id', res)
+
+    def test_query_flag_exact(self):
+        """Test other parameters containing profile=1 are ignored"""
+        self.authenticate(self.staff)
+
+        for query in ('profile=10', 'xprofile=1', 'name=profile=1'):
+            res = self.client.get(f'{DESTINATION_URL}?{query}')
+
+            self.assertNotIn('X-Profile-Id', res)
+
+    def test_flag_ignored_for_non_staff(self):
+        """Test regular users cannot profile their requests"""
+        self.authenticate(self.user)
+
+        res = self.client.get(DESTINATION_URL, HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertEqual(os.listdir(self.profile_dir.name), [])
+
+    def test_artifacts_staff_only(self):
+        self.authenticate(self.user)
+
+        res = self.client.get(artifact_url('list-request-1', 'sql'))
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
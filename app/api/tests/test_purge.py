@@ -0,0 +1,127 @@
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from api import purge
+from api.models import Destination, Feature, Tag, UserDeletion, UserStat
+
+
+CREATE_USER_URL = reverse('user:create')
+UPDATE_USER_URL = reverse('user:update')
+TOKEN_URL = reverse('user:token')
+
+
+class PurgeTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass')
+        self.other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass')
+        for user in (self.user, self.other):
+            tags = [Tag.objects.create(user=user, name=f'Tag {number}')
+                    for number in range(3)]
+            feature = Feature.objects.create(user=user, name='Wifi')
+            for number in range(5):
+                destination = Destination.objects.create(
+                    user=user, name=f'Destination {number}',
+                    country='France', city='Paris', rating=4.0)
+                destination.tags.add(*tags)
+                destination.features.add(feature)
+
+    def test_request_deactivates(self):
+        """Test the user is deactivated at once, the data is kept"""
+        Token.objects.create(user=self.user)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        res = client.delete(UPDATE_USER_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertEqual(Destination.objects.filter(user=self.user).count(),
+                         5)
+        deletion = UserDeletion.objects.get()
+        self.assertEqual((deletion.user_id, deletion.finished_at),
+                         (self.user.id, None))
+
+        res = APIClient().post(TOKEN_URL, {'email': 'test@example.com',
+                                           'password': 'testpass'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sign_up_again(self):
+        """Test the email is free once the deletion is requested"""
+        deletion = purge.request(self.user)
+
+        res = APIClient().post(CREATE_USER_URL, {
+            'email': 'test@example.com', 'password': 'newpass123',
+            'name': 'Test'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(deletion.email, 'test@example.com')
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.email.endswith('@deleted.invalid'))
+        # the user of the deletion stays the old one
+        self.assertEqual(purge.request(self.user), deletion)
+        self.assertNotEqual(
+            get_user_model().objects.get(email='test@example.com').id,
+            self.user.id)
+
+    def test_purge_in_batches(self):
+        """Test the data is deleted in batches with the progress saved"""
+        deletion = purge.request(self.user)
+        reports = []
+
+        # a batch of rows of one model per transaction
+        purge.purge(deletion, batch_size=2,
+                    report=lambda deletion: reports.append(
+                        dict(deletion.progress)))
+
+        self.assertFalse(get_user_model().objects.filter(
+            id=self.user.id).exists())
+        for model in (Destination, Tag, Feature, UserStat):
+            self.assertFalse(model.objects.filter(
+                user_id=self.user.id).exists())
+            self.assertTrue(model.objects.filter(user=self.other).exists())
+        self.assertEqual(
+            Destination.tags.through.objects.count(), 15)
+        deletion.refresh_from_db()
+        self.assertIsNotNone(deletion.finished_at)
+        self.assertEqual(deletion.progress['destination'], 5)
+        self.assertEqual(deletion.progress['tag'], 3)
+        self.assertEqual(reports[0], {'destination': 2})
+        self.assertEqual(reports[-1], deletion.progress)
+
+    def test_purge_resumes(self):
+        """Test a purge interrupted after a batch resumes"""
+        deletion = purge.request(self.user)
+
+        def interrupt(deletion):
+            raise KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            purge.purge(deletion, batch_size=2, report=interrupt)
+        self.assertEqual(
+            Destination.objects.filter(user=self.user).count(), 3)
+
+        purge.purge(UserDeletion.objects.get(), batch_size=2)
+        self.assertEqual(UserDeletion.objects.get().progress['destination'],
+                         5)
+        self.assertFalse(Destination.objects.filter(
+            user_id=self.user.id).exists())
+
+    def test_command(self):
+        """Test the command purges the pending deletions"""
+        purge.request(self.user)
+        out = StringIO()
+
+        call_command('purge_users', stdout=out)
+
+        self.assertIn('Purged test@example.com', out.getvalue())
+        self.assertFalse(purge.pending().exists())
+        self.assertEqual(get_user_model().objects.get(), self.other)
@@ -0,0 +1,84 @@
+import gzip
+import json
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from api import schema
+
+
+SCHEMA_URL = reverse('schema')
+
+
+class StoredSchemaTests(SimpleTestCase):
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'the schema is generated against Postgres')
+    def test_stored_schema_up_to_date(self):
+        """
+        Test the stored schema matches the code,
+        run python manage.py update_schema when it does not
+        """
+        call_command('update_schema', check=True, stdout=StringIO())
+
+
+class SchemaViewTests(SimpleTestCase):
+
+    def setUp(self):
+        schema.reset()
+        self.addCleanup(schema.reset)
+
+    def test_yaml(self):
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/vnd.oai.openapi')
+        self.assertEqual(res.content, schema.stored())
+        self.assertTrue(res['ETag'].endswith('-yaml"'))
+
+    def test_json(self):
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+        accepted = self.client.get(SCHEMA_URL,
+                                   HTTP_ACCEPT='application/json')
+
+        self.assertEqual(res['Content-Type'],
+                         'application/vnd.oai.openapi+json')
+        self.assertIn('/api/destination/destinations/',
+                      json.loads(res.content)['paths'])
+        self.assertEqual(accepted.content, res.content)
+
+    def test_gzip(self):
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), schema.stored())
+        self.assertTrue(res['ETag'].endswith('-yaml-gzip"'))
+
+    def test_not_modified(self):
+        etag = self.client.get(SCHEMA_URL)['ETag']
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['ETag'], etag)
+
+    @patch('api.schema.generate', wraps=schema.generate)
+    def test_loaded_once(self, patched_generate):
+        """Test the stored schema is read once and not generated"""
+        with patch('api.schema.stored', wraps=schema.stored) as stored:
+            self.client.get(SCHEMA_URL)
+            self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        stored.assert_called_once()
+        patched_generate.assert_not_called()
+
+    @override_settings(SCHEMA_FILE='/nonexistent/schema.yml')
+    def test_generated_without_stored_schema(self):
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.content.startswith(b'openapi: 3'))
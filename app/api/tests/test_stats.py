@@ -0,0 +1,164 @@
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from api import stats
+from api.models import Destination, Feature, Tag, UserStat
+from api.synthetic import Generator, Writer
+
+
+STATS_URL = reverse('destination:stats')
+DESTINATIONS_URL = reverse('destination:destination-list')
+
+
+def stored(user):
+    return {(row.dimension, row.key): (row.destination_count, row.rating_sum)
+            for row in UserStat.objects.filter(user=user)
+            if row.destination_count}
+
+
+def rebuilt(user):
+    stats.rebuild([user.id])
+    return stored(user)
+
+
+class StatsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@example.com', 'testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.beach = Tag.objects.create(user=self.user, name='Beach')
+        self.wifi = Feature.objects.create(user=self.user, name='Wifi')
+
+    def create_destination(self, country='France', rating=4.0):
+        return Destination.objects.create(
+            user=self.user, name='Test destination', country=country,
+            city='Test city', rating=rating)
+
+    def assert_consistent(self):
+        """The incremental rows equal the rows rebuilt from scratch"""
+        incremental = stored(self.user)
+        self.assertEqual(incremental, rebuilt(self.user))
+        return incremental
+
+    def test_create_update_delete(self):
+        paris = self.create_destination('France', 4.0)
+        self.create_destination('Japan', 3.0)
+        self.assertEqual(self.assert_consistent()[('total', '')],
+                         (2, Decimal('7.0')))
+
+        paris.country = 'Italy'
+        paris.rating = Decimal('5.0')
+        paris.save()
+        rows = self.assert_consistent()
+        self.assertNotIn(('country', 'France'), rows)
+        self.assertEqual(rows[('country', 'Italy')], (1, Decimal('5.0')))
+
+        paris.delete()
+        self.assertEqual(self.assert_consistent()[('total', '')],
+                         (1, Decimal('3.0')))
+
+    def test_links(self):
+        destination = self.create_destination(rating=4.0)
+        destination.tags.add(self.beach)
+        destination.tags.add(self.beach)
+        destination.features.add(self.wifi)
+        rows = self.assert_consistent()
+        self.assertEqual(rows[('tag', str(self.beach.id))],
+                         (1, Decimal('4.0')))
+
+        # the links count with the new rating
+        destination.rating = Decimal('2.0')
+        destination.save()
+        self.assert_consistent()
+
+        destination.tags.remove(self.beach, self.beach.id + 1)
+        destination.features.clear()
+        rows = self.assert_consistent()
+        self.assertNotIn(('tag', str(self.beach.id)), rows)
+        self.assertNotIn(('feature', str(self.wifi.id)), rows)
+
+    def test_reverse_links(self):
+        first = self.create_destination(rating=4.0)
+        second = self.create_destination(rating=2.0)
+        self.beach.destination_set.add(first, second)
+        self.assertEqual(self.assert_consistent()[
+            ('tag', str(self.beach.id))], (2, Decimal('6.0')))
+
+        self.beach.destination_set.clear()
+        self.assert_consistent()
+
+    def test_delete_linked(self):
+        """Test deleting destinations and tags removes their links"""
+        destination = self.create_destination()
+        destination.tags.add(self.beach)
+        destination.features.add(self.wifi)
+
+        destination.delete()
+        self.assert_consistent()
+        self.create_destination().tags.add(self.beach)
+        self.beach.delete()
+        self.assert_consistent()
+
+    def test_api_writes(self):
+        res = self.client.post(DESTINATIONS_URL, {
+            'name': 'New', 'country': 'Peru', 'city': 'Lima',
+            'rating': 4.5, 'tags': [{'name': 'Beach'}, {'name': 'Lake'}],
+            'features': [{'name': 'Wifi'}]}, format='json')
+        self.assert_consistent()
+
+        self.client.patch(
+            reverse('destination:destination-detail', args=[res.data['id']]),
+            {'rating': 3.5, 'tags': [{'name': 'City'}]}, format='json')
+        self.assert_consistent()
+
+    def test_endpoint(self):
+        for country, rating in (('France', 4.0), ('France', 3.0),
+                                ('Japan', 5.0)):
+            self.create_destination(country, rating).tags.add(self.beach)
+
+        # the statistics and the tag names, there are no features
+        with self.assertNumQueries(2):
+            res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['destination_count'], 3)
+        self.assertEqual(res.data['average_rating'], '4.00')
+        self.assertEqual(res.data['countries'], [
+            {'country': 'France', 'destination_count': 2,
+             'average_rating': '3.50'},
+            {'country': 'Japan', 'destination_count': 1,
+             'average_rating': '5.00'},
+        ])
+        self.assertEqual(res.data['tags'], [
+            {'id': self.beach.id, 'name': 'Beach', 'destination_count': 3,
+             'average_rating': '4.00'}])
+        self.assertEqual(res.data['features'], [])
+
+    def test_endpoint_without_destinations(self):
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['destination_count'], 0)
+        self.assertIsNone(res.data['average_rating'])
+
+    def test_rebuild_command(self):
+        """Test rebuilding the statistics of seeded users"""
+        Generator(users=3, destinations=30, tags_per_user=4,
+                  features_per_user=4, prefix='stats').run(Writer())
+        users = get_user_model().objects.filter(email__startswith='stats')
+        seeded = {user.id: stored(user) for user in users}
+        self.assertEqual(sum(rows[('total', '')][0]
+                             for rows in seeded.values()), 30)
+        UserStat.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_stats', batch_size=2, stdout=out)
+
+        self.assertIn('statistics rows', out.getvalue())
+        self.assertEqual({user.id: stored(user) for user in users}, seeded)
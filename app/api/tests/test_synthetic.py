@@ -0,0 +1,113 @@
+from io import StringIO
+from unittest import skipUnless
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count, Max, Min
+from django.test import TestCase
+from api.models import Destination, Tag, Feature
+from api.synthetic import Generator, Writer, copy_line
+
+
+def dataset(prefix):
+    '''
+    The generated rows of a prefix, without their ids
+    '''
+    destinations = Destination.objects.filter(
+        user__email__startswith=f'{prefix}-')
+    return (
+        sorted(destinations.values_list(
+            'user__name', 'name', 'country', 'city', 'rating')),
+        sorted(Destination.tags.through.objects.filter(
+            destination__in=destinations).values_list(
+            'destination__name', 'tag__name')),
+    )
+
+
+class SeedDataTests(TestCase):
+    """Test the synthetic dataset generator"""
+
+    def test_seed_data(self):
+        """
+        Test the command generates the requested rows with their links
+        """
+        out = StringIO()
+        call_command('seed_data', '--users', '4', '--destinations', '40',
+                     '--tags-per-user', '6', '--features-per-user', '3',
+                     '--tags-per-destination', '2', stdout=out)
+
+        self.assertEqual(get_user_model().objects.count(), 4)
+        self.assertEqual(Destination.objects.count(), 40)
+        self.assertEqual(Tag.objects.count(), 24)
+        self.assertEqual(Feature.objects.count(), 12)
+        # destinations are spread evenly and only link their user's tags
+        self.assertEqual(set(Destination.objects.values('user').annotate(
+            count=Count('id')).values_list('count', flat=True)), {10})
+        for destination in Destination.objects.prefetch_related('tags'):
+            self.assertTrue(destination.tags.all())
+            for tag in destination.tags.all():
+                self.assertEqual(tag.user_id, destination.user_id)
+        ratings = Destination.objects.aggregate(low=Min('rating'),
+                                                high=Max('rating'))
+        self.assertGreaterEqual(ratings['low'], 0)
+        self.assertLessEqual(ratings['high'], 5)
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_deterministic_from_seed(self):
+        Generator(users=3, destinations=30, prefix='a', seed=5).run(Writer())
+        Generator(users=3, destinations=30, prefix='b', seed=5).run(Writer())
+        Generator(users=3, destinations=30, prefix='c', seed=6).run(Writer())
+
+        self.assertEqual(dataset('a'), dataset('b'))
+        self.assertNotEqual(dataset('a'), dataset('c'))
+
+    def test_zipf_tag_popularity(self):
+        """
+        Test the first tags of the users are the most used ones
+        """
+        Generator(users=2, destinations=400, tags_per_user=10,
+                  tags_per_destination=2, tag_skew=1.5).run(Writer())
+
+        counts = dict(Tag.objects.values('name').annotate(
+            count=Count('destination')).values_list('name', 'count'))
+        self.assertGreater(counts['Beach'], counts['Relax'] * 3)
+
+    def test_owner_skew(self):
+        Generator(users=20, destinations=400, owner_skew=1.5).run(Writer())
+
+        counts = sorted(Destination.objects.values('user').annotate(
+            count=Count('id')).values_list('count', flat=True))
+        self.assertGreater(counts[-1], 400 / 20 * 3)
+
+    def test_ids_continue_after_existing_rows(self):
+        Generator(users=2, destinations=4, prefix='a').run(Writer())
+        Generator(users=2, destinations=4, prefix='b').run(Writer())
+        user = get_user_model().objects.create_user(
+            email='new@example.com', password='testpass')
+
+        self.assertEqual(get_user_model().objects.count(), 5)
+        self.assertEqual(user.id, get_user_model().objects.aggregate(
+            last=Max('id'))['last'])
+
+    def test_copy_line(self):
+        self.assertEqual(copy_line((1, None, True, 'a\tb\\c', '4.5')),
+                         '1\t\\N\tt\ta\\tb\\\\c\t4.5\n')
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY needs Postgres')
+    def test_copy(self):
+        """
+        Test COPY writes the same dataset as bulk_create
+        """
+        Generator(users=3, destinations=30, prefix='a').run(Writer())
+        Generator(users=3, destinations=30, prefix='b').run(
+            Writer(use_copy=True))
+
+        self.assertEqual(dataset('a'), dataset('b'))
+        # the sequences were moved past the copied ids
+        Tag.objects.create(user=get_user_model().objects.first(), name='New')
+
+    @skipUnless(connection.vendor != 'postgresql', 'COPY works on Postgres')
+    def test_copy_needs_postgres(self):
+        with self.assertRaises(CommandError):
+            call_command('seed_data', '--copy')
@@ -0,0 +1,126 @@
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+
+CREATE_USER_URL = reverse('user:create')
+TOKEN_URL = reverse('user:token')
+DESTINATIONS_URL = reverse('destination:destination-list')
+BATCH_URL = reverse('destination:destination-batch')
+
+RATES = {'auth': '3/min', 'write': '2/s'}
+
+
+@override_settings(THROTTLE_ENABLED=True,
+                   REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': RATES})
+class ThrottlingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.now = 1_000_000.0
+        patcher = patch('api.throttling.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def token(self, **kwargs):
+        return self.client.post(
+            TOKEN_URL, {'email': 'a@example.com', 'password': 'wrong'},
+            **kwargs)
+
+    def test_burst_then_throttled(self):
+        """Test a full bucket allows a burst, then sends Retry-After"""
+        codes = [self.token().status_code for _ in range(4)]
+
+        self.assertEqual(codes, [status.HTTP_400_BAD_REQUEST] * 3
+                         + [status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(self.token()['Retry-After'], '20')
+
+    def test_refill(self):
+        """Test one token comes back per period / burst"""
+        for _ in range(3):
+            self.token()
+        self.now += 19
+        self.assertEqual(self.token()['Retry-After'], '1')
+
+        self.now += 1
+        self.assertEqual(self.token().status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.token().status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_rejected_requests_not_counted(self):
+        for _ in range(10):
+            self.token()
+        self.now += 20
+
+        self.assertEqual(self.token().status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_idle_bucket_full(self):
+        """Test an idle client does not save up more than a burst"""
+        self.token()
+        self.now += 3600
+        codes = [self.token().status_code for _ in range(4)]
+
+        self.assertEqual(codes[-1], status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertNotIn(status.HTTP_429_TOO_MANY_REQUESTS, codes[:3])
+
+    def test_per_ip(self):
+        for _ in range(3):
+            self.token()
+
+        res = self.token(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_auth_scope_shared(self):
+        """Test sign up and login take tokens from the same bucket"""
+        for _ in range(3):
+            self.token()
+
+        res = self.client.post(CREATE_USER_URL, {
+            'email': 'new@example.com', 'password': 'testpass',
+            'name': 'New'})
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_writes_throttled_per_user(self):
+        """Test destination writes are throttled per user, reads are not"""
+        users = [get_user_model().objects.create_user(
+            f'user{number}@example.com', 'testpass') for number in (1, 2)]
+        self.client.force_authenticate(users[0])
+        payload = {'name': 'Test destination', 'country': 'Test country',
+                   'city': 'Test city', 'rating': 3.5}
+
+        codes = [self.client.post(DESTINATIONS_URL, payload).status_code
+                 for _ in range(3)]
+        self.assertEqual(codes, [status.HTTP_201_CREATED] * 2
+                         + [status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(self.client.get(DESTINATIONS_URL).status_code,
+                         status.HTTP_200_OK)
+
+        self.client.force_authenticate(users[1])
+        self.assertEqual(
+            self.client.post(DESTINATIONS_URL, payload).status_code,
+            status.HTTP_201_CREATED)
+
+    def test_batch_post_not_throttled(self):
+        """Test a POST of the batch retrieve counts as a read"""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass')
+        self.client.force_authenticate(user)
+
+        codes = {self.client.post(BATCH_URL, {'ids': [1]},
+                                  format='json').status_code
+                 for _ in range(3)}
+        self.assertEqual(codes, {status.HTTP_200_OK})
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        codes = {self.token().status_code for _ in range(5)}
+
+        self.assertEqual(codes, {status.HTTP_400_BAD_REQUEST})
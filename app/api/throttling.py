@@ -0,0 +1,131 @@
+'''
+Token bucket throttling with the state in the shared cache
+
+A bucket of a scope holds up to N tokens for the rate "N/period" of
+the scope in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], every request
+takes one and the bucket refills at N tokens per period. So a client
+may send N requests at once, then one every period / N.
+
+The bucket is stored as its theoretical arrival time (GCRA): the time
+at which it would be full again, in milliseconds. Taking a token is a
+single atomic cache.incr by the refill interval of one token, so
+workers sharing the cache never race on a read-modify-write and a
+decision costs one round trip. Only the first request of an idle
+client resets the time, and a rejected request gives its token back.
+A process-local cache would give each worker its own buckets, the
+system checks of api/checks.py refuse it outside of DEBUG.
+'''
+import math
+import time
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+# keys of idle clients expire, a bucket is full again long before
+MIN_KEY_TIMEOUT = 3600
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    '''
+    Throttle the requests of a view with a throttle_scope, like
+    ScopedRateThrottle, by the key of get_ident
+    '''
+    cache_format = 'throttle_%(scope)s_%(ident)s'
+    scope_attr = 'throttle_scope'
+
+    def __init__(self):
+        # the scope and the rate are those of the view, see allow_request
+        self.wait_seconds = None
+
+    def get_rate(self):
+        # the rates of the settings now, not when DRF was imported
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope,
+                                    'ident': self.get_ident(request)}
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.wait_seconds = self.take(self.key)
+        return not self.wait_seconds
+
+    def take(self, key):
+        '''
+        Take a token of the bucket, returns the seconds to wait for
+        the next one when the bucket is empty, otherwise 0
+        '''
+        interval = self.duration * 1000 // self.num_requests
+        capacity = interval * self.num_requests
+        timeout = max(self.duration * 2, MIN_KEY_TIMEOUT)
+        now = int(time.time() * 1000)
+        try:
+            arrival = self.cache.incr(key, interval)
+        except ValueError:
+            # no bucket yet or it expired, a full bucket
+            if self.cache.add(key, now + interval, timeout):
+                return 0
+            arrival = self.cache.incr(key, interval)
+
+        if arrival - interval < now:
+            # the bucket refilled while the client was idle
+            self.cache.set(key, now + interval, timeout)
+            return 0
+        if arrival - now > capacity:
+            self.cache.decr(key, interval)
+            return (arrival - now - capacity) / 1000
+        return 0
+
+    def wait(self):
+        # Retry-After is a whole number of seconds, rounded down by DRF
+        return math.ceil(self.wait_seconds) if self.wait_seconds else None
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    '''
+    One bucket per client IP address, for anonymous endpoints
+    '''
+    cache_format = 'throttle_%(scope)s_ip_%(ident)s'
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    '''
+    One bucket per authenticated user, per IP address for anonymous
+    requests
+    '''
+    cache_format = 'throttle_%(scope)s_user_%(ident)s'
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return f'ip_{super().get_ident(request)}'
+
+
+class WriteThrottleMixin:
+    '''
+    Viewset mixin throttling the requests changing data per user in the
+    "write" scope, reads are not throttled
+    '''
+    throttle_scope = 'write'
+    # actions only reading, whatever their method
+    read_actions = ()
+
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        if self.request.method in SAFE_METHODS \
+                or getattr(self, 'action', None) in self.read_actions:
+            return throttles
+        return [*throttles, UserTokenBucketThrottle()]
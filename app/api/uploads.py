@@ -0,0 +1,55 @@
+'''
+Expiry of the resumable image uploads
+
+A client may abandon an upload at any time, leaving its session and
+partial file behind. A session is valid RESUMABLE_UPLOAD_EXPIRY_HOURS
+after it started: the views no longer find it afterwards, and the
+prune_uploads command deletes it with its partial file.
+'''
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from api.models import ImageUpload
+
+
+def expiry():
+    '''
+    The start of the oldest upload sessions still valid
+    '''
+    return timezone.now() - timedelta(
+        hours=settings.RESUMABLE_UPLOAD_EXPIRY_HOURS)
+
+
+def remove(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def prune():
+    '''
+    Delete the expired upload sessions with their partial files, and
+    the partial files left without session, returns the number of
+    sessions deleted
+    '''
+    cutoff = expiry()
+    expired = list(ImageUpload.objects.filter(created_at__lt=cutoff))
+    ImageUpload.objects.filter(
+        id__in=[upload.id for upload in expired]).delete()
+    # files are removed once the rows are gone
+    remove(upload.temp_path for upload in expired)
+
+    # a partial file written before the cutoff has no valid session,
+    # e.g. after its destination was deleted while the file was open
+    directory = settings.RESUMABLE_UPLOAD_DIR
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        names = []
+    remove(path for path in (os.path.join(directory, name)
+                             for name in names if name.endswith('.part'))
+           if os.path.getmtime(path) < cutoff.timestamp())
+    return len(expired)
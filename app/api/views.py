@@ -1,7 +1,121 @@
+import os
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags
+from django.utils.module_loading import import_string
+from django.views import View
+from rest_framework.authentication import SessionAuthentication, \
+    TokenAuthentication
+from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from api import health, metrics, profiling, schema
+
+
+def lazy_view(view_path, **initkwargs):
+    """
+    View importing its class on its first request, for rarely used
+    views whose modules are not otherwise imported
+    """
+    view = None
+
+    def lazy(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(view_path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+    return lazy
 
 
 class HealthCheckView(APIView):
     def get(self, request, *args, **kwargs):
         return Response({'status': 'ok'})
+
+
+class LivenessView(View):
+    """The process serves requests, nothing else is checked"""
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({'status': 'ok'})
+
+
+class ReadinessView(View):
+    """
+    The worker can serve the API: the database is reachable,
+    migrations are applied and the media volume is writable
+    """
+
+    def get(self, request, *args, **kwargs):
+        errors = health.readiness()
+        if errors:
+            return JsonResponse({'status': 'unavailable', 'errors': errors},
+                                status=503)
+        return JsonResponse({'status': 'ok'})
+
+
+class SchemaView(View):
+    """
+    The precomputed OpenAPI schema, in YAML unless JSON is asked for
+    with ?format=json or the Accept header
+    """
+
+    def get(self, request, *args, **kwargs):
+        name = request.GET.get('format')
+        if name not in schema.CONTENT_TYPES:
+            name = 'json' if 'json' in request.headers.get('Accept', '') \
+                else 'yaml'
+        document = schema.documents()[name]
+        gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+        etag = document.gzipped_etag if gzipped else document.etag
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(
+                document.gzipped if gzipped else document.body,
+                content_type=document.content_type)
+            if gzipped:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        response['Vary'] = 'Accept, Accept-Encoding'
+        return response
+
+
+class MetricsView(View):
+    """Metrics of all workers in the Prometheus text format"""
+
+    def get(self, request, *args, **kwargs):
+        token = settings.METRICS_TOKEN
+        # public only while developing, not through the proxy
+        if not token and not settings.DEBUG:
+            raise Http404
+        if token and not constant_time_compare(
+                request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+        return HttpResponse(
+            metrics.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class ProfileArtifactView(APIView):
+    """Download an artifact of a profiled request, staff users only"""
+    authentication_classes = (TokenAuthentication, SessionAuthentication)
+    permission_classes = (IsAdminUser,)
+    # internal tooling, not part of the public API schema
+    schema = None
+
+    def get(self, request, request_id, kind, *args, **kwargs):
+        if kind not in profiling.ARTIFACTS or \
+                not profiling.REQUEST_ID_RE.match(request_id):
+            raise Http404
+        path = profiling.artifact_path(request_id, kind)
+        if not os.path.exists(path):
+            raise Http404
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=os.path.basename(path)
+        )
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_asgi_application()
+
+# the event streams of the changes of each user are served without
+# Django's request handling, see destination/async_events.py
+from destination.async_events import route  # noqa: E402
+
+application = route(application)
@@ -49,11 +49,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so the metrics include the time of all other middleware
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.NPlusOneMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,15 +88,92 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # postgresql backend that reuses connections from a pool
+        # per worker process, see api/db/pool.py
+        'ENGINE': 'api.db.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # connections go back to the pool at the end of each request
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            # DB_POOL_MAX_SIZE=0 disables pooling
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            # seconds to wait for a free connection
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+            'MAX_IDLE': float(os.environ.get('DB_POOL_MAX_IDLE', 600)),
+            # idle seconds after which a SELECT 1 runs on checkout
+            'HEALTH_CHECK_AFTER': float(
+                os.environ.get('DB_POOL_HEALTH_CHECK_AFTER', 5)),
+        },
+    }
+}
+
+# Optional read replicas, comma separated hosts with the same
+# credentials as the primary. GET requests of the destination API
+# are routed to them, see api/db/router.py
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    DATABASE_REPLICAS.append(f'replica{index + 1}')
+    DATABASES[f'replica{index + 1}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['api.db.router.ReplicaRouter']
+
+# Seconds a user keeps reading from the primary after a write,
+# longer than the expected replication lag
+REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The replica pins and the throttling buckets need a cache shared by all
+# workers in production, e.g. the redis service of the deploy compose
+# file with CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# and CACHE_LOCATION=redis://redis:6379/0, see api/checks.py
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
 
+# Request metrics, every worker writes its counters to a file in
+# METRICS_DIR and /metrics sums the files of all workers
+METRICS_DIR = os.environ.get('METRICS_DIR', '/tmp/metrics')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+# when set, /metrics requires an "Authorization: Bearer <token>" header,
+# unset it is only served with DEBUG on
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Artifacts of requests profiled with "X-Profile: 1" by staff users
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/profiles')
+# seconds between two stack samples for the flamegraph
+PROFILE_SAMPLE_INTERVAL = 0.001
+
+# Seconds a worker reuses the result of its readiness checks
+READINESS_CACHE_SECONDS = float(
+    os.environ.get('READINESS_CACHE_SECONDS', 5))
+
+# N+1 query detection, logged by a middleware in debug mode and
+# raised by the test runner
+NPLUSONE_ENABLED = bool(int(os.environ.get('NPLUSONE_ENABLED', DEBUG)))
+NPLUSONE_RAISE = False
+# how often a request may run the same statement
+NPLUSONE_THRESHOLD = int(os.environ.get('NPLUSONE_THRESHOLD', 3))
+TEST_RUNNER = 'api.test_runner.NPlusOneTestRunner'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -135,6 +216,16 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/app/static/media'
 STATIC_ROOT = '/app/static/static'
 
+# Partial files of resumable image uploads, kept outside of the
+# static volume so nginx never serves incomplete uploads
+RESUMABLE_UPLOAD_DIR = os.environ.get('RESUMABLE_UPLOAD_DIR', '/tmp/uploads')
+# Matches client_max_body_size of the proxy
+RESUMABLE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+# Hours an upload session stays valid after it started, the
+# prune_uploads command deletes the expired ones with their files
+RESUMABLE_UPLOAD_EXPIRY_HOURS = int(
+    os.environ.get('RESUMABLE_UPLOAD_EXPIRY_HOURS', 24))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -142,6 +233,50 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'api.User'
 
-REST_FRAMEWORK = {'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema'}
+REST_FRAMEWORK = {
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # token bucket rates of the throttle scopes, see api/throttling.py,
+    # "<burst>/<period>" allows burst requests at once, then one every
+    # period / burst; an empty rate turns the scope off
+    'DEFAULT_THROTTLE_RATES': {
+        # login and sign up, each hashes a password, per IP address
+        'auth': os.environ.get('THROTTLE_AUTH_RATE', '10/min') or None,
+        # changes of destinations, tags and features, per user
+        'write': os.environ.get('THROTTLE_WRITE_RATE', '120/min') or None,
+    },
+}
+
+# Serve the tags and features of destination lists from the names
+# denormalized on the destination rows, see api/denorm.py
+DESTINATION_CACHED_NAMES = bool(
+    int(os.environ.get('DESTINATION_CACHED_NAMES', 1)))
+# Most destinations fetched by one request of the batch endpoint
+DESTINATION_BATCH_MAX_IDS = int(
+    os.environ.get('DESTINATION_BATCH_MAX_IDS', 100))
+# Most destinations, tags or features changed by one bulk request,
+# which runs in one transaction
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 10000))
+# Incremental sync, see api/sync.py: most changes per page, seconds
+# the changes are held back, besides those of the transactions still
+# open, and days the deletions are kept for clients to sync
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', 5))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', 30))
+# Event streams of the changes of each user, see api/events.py: the
+# changes are sent with NOTIFY on Postgres, a stream buffers up to
+# EVENTS_QUEUE_SIZE events and sends a comment every
+# EVENTS_KEEPALIVE_SECONDS so proxies keep idle streams open
+EVENTS_ENABLED = bool(int(os.environ.get('EVENTS_ENABLED', 1)))
+EVENTS_NOTIFY = bool(int(os.environ.get('EVENTS_NOTIFY', 1)))
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+EVENTS_KEEPALIVE_SECONDS = float(
+    os.environ.get('EVENTS_KEEPALIVE_SECONDS', 15))
+
+# Throttling needs a cache shared by all workers, see CACHES, the
+# system checks refuse a process-local one unless DEBUG is on
+THROTTLE_ENABLED = bool(int(os.environ.get('THROTTLE_ENABLED', 1)))
 
 SPECTACULAR_SETTINGS = {'COMPONENT_SPLIT_REQUEST': True}
+
+# OpenAPI schema served at /api/schema/, written by update_schema
+SCHEMA_FILE = BASE_DIR / 'schema.yml'
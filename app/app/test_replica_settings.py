@@ -0,0 +1,24 @@
+"""
+Settings for the read replica router tests, two SQLite databases
+stand in for the primary and a replica:
+
+python manage.py test api.tests.test_db_router \
+    --settings=app.test_replica_settings
+"""
+from app.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'primary.sqlite3',  # noqa: F405
+    },
+    'replica1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica1.sqlite3',  # noqa: F405
+    },
+}
+
+DATABASE_REPLICAS = ['replica1']
+DATABASE_ROUTERS = ['api.db.router.ReplicaRouter']
+# the tests run in a single process
+SILENCED_SYSTEM_CHECKS = ['api.E001']
@@ -15,22 +15,35 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from django.conf import settings
 from django.conf.urls.static import static
-from api.views import HealthCheckView
+from api.views import HealthCheckView, LivenessView, MetricsView, \
+    ProfileArtifactView, ReadinessView, SchemaView, lazy_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', SchemaView.as_view(), name='schema'),
+    # drf_spectacular is loaded at startup anyway, as an installed app,
+    # the schema class of DRF and by extend_schema in the views, only its
+    # views, generators and renderers modules wait for the first request
     path(
         'api/docs/',
-        SpectacularSwaggerView.as_view(url_name='schema'),
+        lazy_view('drf_spectacular.views.SpectacularSwaggerView',
+                  url_name='schema'),
         name='docs'
     ),
     path('api/user/', include('user.urls')),
     path('api/destination/', include('destination.urls')),
+    path('api/async/destination/', include('destination.async_urls')),
     path('api/health-check/', HealthCheckView.as_view(), name='health-check'),
+    path('api/health/live/', LivenessView.as_view(), name='health-live'),
+    path('api/health/ready/', ReadinessView.as_view(), name='health-ready'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path(
+        'api/profiles/<str:request_id>/<str:kind>/',
+        ProfileArtifactView.as_view(),
+        name='profile-artifact'
+    ),
 ]
 
 if settings.DEBUG:
@@ -3,14 +3,32 @@ WSGI config for app project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
 
+uWSGI imports this module in the master process and forks the workers
+afterwards, so everything loaded here is shared between the workers.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 """
 
+import gc
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+
+from api import schema
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# import the URLconf with every view and serializer now, once in the
+# master, instead of on the first request of every worker
+get_resolver().url_patterns
+
+# and render the stored OpenAPI schema in every format once as well
+schema.documents()
+
+# keep the objects loaded so far out of the garbage collector, which
+# would otherwise write to their pages in every worker and unshare them
+gc.freeze()
@@ -0,0 +1,140 @@
+'''
+Server-Sent Events of the changes of destinations, tags and features
+
+A plain ASGI application served next to Django by app/asgi.py, as a
+Django view would hold a thread and a database connection for as long
+as the stream is open. It authenticates the token once, subscribes to
+the broker of api/events.py and writes the events of the user as they
+come:
+
+    event: destinations.updated
+    data: {"kind": "destinations", "action": "updated", "ids": [42]}
+
+Events carry ids only, the clients read the items themselves, e.g. with
+the changes endpoint. A comment is sent every EVENTS_KEEPALIVE_SECONDS.
+After an overflow event the stream ends, the client resyncs before
+reconnecting.
+'''
+import asyncio
+import json
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from rest_framework.authtoken.models import Token
+from api import events
+
+
+PATH = '/api/async/destination/events/'
+# milliseconds the browser waits before reconnecting
+RETRY_MS = 5000
+HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    # stop nginx from buffering the stream
+    (b'x-accel-buffering', b'no'),
+]
+
+
+def token_user(key):
+    """Return the active user of the token, or None"""
+    try:
+        token = Token.objects.select_related('user').get(key=key)
+    except Token.DoesNotExist:
+        return None
+    finally:
+        # nothing closes connections outside of Django's requests,
+        # except in a test case, which holds its transaction
+        if not connection.in_atomic_block:
+            connection.close()
+    return token.user if token.user.is_active else None
+
+
+async def authenticate(scope):
+    """
+    Return the user of the token in the Authorization header, or in
+    the token query parameter, as EventSource cannot send headers
+    """
+    headers = dict(scope['headers'])
+    auth = headers.get(b'authorization', b'').decode('latin1').split()
+    if len(auth) == 2 and auth[0].lower() == 'token':
+        key = auth[1]
+    else:
+        query = parse_qs(scope['query_string'].decode('latin1'))
+        key = query.get('token', [None])[0]
+    if not key:
+        return None
+    return await sync_to_async(token_user)(key)
+
+
+def message(event):
+    """The event in the format of Server-Sent Events"""
+    data = {'kind': event['kind'], 'action': event['action'],
+            'ids': event['ids']}
+    return f'event: {event["kind"]}.{event["action"]}\n' \
+           f'data: {json.dumps(data)}\n\n'
+
+
+async def send_json(send, status, data, headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            *headers]})
+    await send({'type': 'http.response.body',
+                'body': json.dumps(data).encode()})
+
+
+async def wait_for_disconnect(receive, subscription):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    subscription.close()
+
+
+async def stream(scope, receive, send):
+    """The event stream of the authenticated user"""
+    if scope['method'] != 'GET':
+        await send_json(send, 405, {'detail': f'Method "{scope["method"]}" '
+                                              f'not allowed.'},
+                        [(b'allow', b'GET')])
+        return
+    user = await authenticate(scope)
+    if user is None:
+        await send_json(
+            send, 401,
+            {'detail': 'Authentication credentials were not provided.'},
+            [(b'www-authenticate', b'Token')])
+        return
+
+    subscription = await events.broker.subscribe(user.id)
+    watcher = asyncio.ensure_future(wait_for_disconnect(receive,
+                                                        subscription))
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': HEADERS})
+        await send({'type': 'http.response.body',
+                    'body': f'retry: {RETRY_MS}\n\n'.encode(),
+                    'more_body': True})
+        while True:
+            batch = await subscription.next(
+                settings.EVENTS_KEEPALIVE_SECONDS)
+            if subscription.closed:
+                return
+            body = ''.join(map(message, batch)) or ': keepalive\n\n'
+            if subscription.overflowed:
+                body += 'event: overflow\ndata: {}\n\n'
+            await send({'type': 'http.response.body', 'body': body.encode(),
+                        'more_body': not subscription.overflowed})
+            if subscription.overflowed:
+                return
+    finally:
+        watcher.cancel()
+        events.broker.unsubscribe(subscription)
+
+
+def route(application):
+    """The Django application, serving the event streams itself"""
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == PATH:
+            await stream(scope, receive, send)
+        else:
+            await application(scope, receive, send)
+    return router
@@ -0,0 +1,28 @@
+from django.urls import path
+from destination import async_views
+
+
+app_name = 'destination-async'
+
+'''
+async read-only counterparts of the destination router urls,
+meant to be served by the ASGI server (scripts/run-asgi.sh)
+'''
+urlpatterns = [
+    path(
+        'destinations/',
+        async_views.DestinationListView.as_view(),
+        name='destination-list'
+    ),
+    path(
+        'destinations/<int:pk>/',
+        async_views.DestinationDetailView.as_view(),
+        name='destination-detail'
+    ),
+    path('tags/', async_views.TagListView.as_view(), name='tag-list'),
+    path(
+        'features/',
+        async_views.FeatureListView.as_view(),
+        name='feature-list'
+    ),
+]
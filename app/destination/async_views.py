@@ -0,0 +1,128 @@
+'''
+Async read path for destinations, tags and features
+
+The views reuse the querysets and serializers of the DRF viewsets,
+but authenticate and query the database with Django's async ORM,
+so a slow query does not hold a whole worker under an ASGI server.
+'''
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from destination import views
+
+
+async def authenticate(request):
+    """Return the user of the token in the Authorization header"""
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2 or auth[0].lower() != 'token':
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(key=auth[1])
+    except Token.DoesNotExist:
+        return None
+    if not token.user.is_active:
+        return None
+    return token.user
+
+
+def render(data, status=200):
+    """Render data with the same JSON renderer as the DRF views"""
+    return HttpResponse(
+        JSONRenderer().render(data),
+        content_type='application/json',
+        status=status
+    )
+
+
+class AsyncReadView(View):
+    """Base view serving the list or retrieve action of a viewset"""
+    viewset_class = None
+    # list or retrieve
+    action = None
+    http_method_names = ['get']
+
+    def get_viewset(self, request, user):
+        """Instantiate the viewset to reuse its queryset and serializer"""
+        drf_request = Request(request)
+        drf_request.user = user
+        return self.viewset_class(
+            request=drf_request,
+            action=self.action,
+            format_kwarg=None,
+            kwargs=self.kwargs,
+        )
+
+    async def get(self, request, pk=None):
+        user = await authenticate(request)
+        if user is None:
+            response = render(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=401
+            )
+            response['WWW-Authenticate'] = 'Token'
+            return response
+
+        viewset = self.get_viewset(request, user)
+        queryset = viewset.get_queryset()
+        serializer_class = viewset.get_serializer_class()
+        context = viewset.get_serializer_context()
+
+        if self.action == 'retrieve':
+            try:
+                instance = await queryset.aget(pk=pk)
+            except ObjectDoesNotExist:
+                return render({'detail': 'Not found.'}, status=404)
+            return render(serializer_class(instance, context=context).data)
+
+        paginator = viewset.paginator
+        if paginator is not None and \
+                paginator.get_limit(viewset.request) is not None:
+            page = await self.paginate(paginator, queryset, viewset.request)
+            return render(paginator.get_paginated_response(
+                serializer_class(page, many=True, context=context).data
+            ).data)
+
+        # related objects are prefetched while iterating,
+        # so serializing the list does not touch the database
+        instances = [instance async for instance in queryset]
+        return render(
+            serializer_class(instances, many=True, context=context).data
+        )
+
+    async def paginate(self, paginator, queryset, request):
+        """
+        The page of the limit and offset paginator of the viewset,
+        as its paginate_queryset() would return, read with the async ORM
+        """
+        paginator.request = request
+        paginator.limit = paginator.get_limit(request)
+        paginator.offset = paginator.get_offset(request)
+        paginator.count = await queryset.acount()
+        if paginator.count == 0 or paginator.offset > paginator.count:
+            return []
+        end = paginator.offset + paginator.limit
+        return [instance async for instance in
+                queryset[paginator.offset:end]]
+
+
+class DestinationListView(AsyncReadView):
+    viewset_class = views.DestinationViewSet
+    action = 'list'
+
+
+class DestinationDetailView(AsyncReadView):
+    viewset_class = views.DestinationViewSet
+    action = 'retrieve'
+
+
+class TagListView(AsyncReadView):
+    viewset_class = views.TagViewSet
+    action = 'list'
+
+
+class FeatureListView(AsyncReadView):
+    viewset_class = views.FeatureViewSet
+    action = 'list'
@@ -1,5 +1,33 @@
+from django.conf import settings
 from rest_framework import serializers
-from api.models import Destination, Tag, Feature
+from drf_spectacular.utils import extend_schema_field, \
+    extend_schema_serializer
+from api import denorm, events, sync
+from api.models import Destination, Tag, Feature, ImageUpload
+
+
+def get_or_create_named(model, user, items):
+    """
+    Tags or features of the user with the names of items,
+    creating the missing ones in a single query
+    """
+    names = list(dict.fromkeys(item['name'] for item in items))
+    if not names:
+        return []
+    existing = {obj.name: obj for obj in
+                model.objects.filter(user=user, name__in=names)}
+    missing = [model(user=user, name=name)
+               for name in names if name not in existing]
+    if missing:
+        model.objects.bulk_create(missing)
+        # only some backends return the primary keys from bulk_create
+        created = list(model.objects.filter(
+            user=user, name__in=[obj.name for obj in missing]))
+        existing.update((obj.name, obj) for obj in created)
+        # bulk_create sends no post_save
+        events.publish(user.id, sync.kind_of(model), events.CREATED,
+                       [obj.id for obj in created])
+    return [existing[name] for name in names]
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -11,6 +39,14 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class TagCountSerializer(TagSerializer):
+    """Serializer for tags with the number of their destinations"""
+    destination_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('destination_count',)
+
+
 class FeatureSerializer(serializers.ModelSerializer):
     """Serializer for feature objects"""
 
@@ -20,6 +56,31 @@ class FeatureSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class FeatureCountSerializer(FeatureSerializer):
+    """Serializer for features with the number of their destinations"""
+    destination_count = serializers.IntegerField(read_only=True)
+
+    class Meta(FeatureSerializer.Meta):
+        fields = FeatureSerializer.Meta.fields + ('destination_count',)
+
+
+class CachedNamesField(serializers.ReadOnlyField):
+    """Denormalized [id, name] pairs, as tag or feature objects"""
+
+    def to_representation(self, value):
+        return [{'id': obj_id, 'name': name} for obj_id, name in value]
+
+
+@extend_schema_field(TagSerializer(many=True))
+class CachedTagsField(CachedNamesField):
+    pass
+
+
+@extend_schema_field(FeatureSerializer(many=True))
+class CachedFeaturesField(CachedNamesField):
+    pass
+
+
 class DestinationSerializer(serializers.ModelSerializer):
     """Serializer for destination objects"""
 
@@ -49,25 +110,21 @@ class DestinationSerializer(serializers.ModelSerializer):
         because cannot create a destination with
         direct assignment to a many-to-many field
         '''
-        tags = validated_data.pop('tags', [])
-        features = validated_data.pop('features', [])
-        destination = Destination.objects.create(**validated_data)
-
-        for tag in tags:
-            # get_or_create will create a new tag if it doesn't exist
-            tag_obj, created = Tag.objects.get_or_create(
-                # assign the tag to the authenticated user
-                user=auth_user,
-                name=tag['name']
-                )
-            destination.tags.add(tag_obj)
-
-        for feature in features:
-            feature_obj, created = Feature.objects.get_or_create(
-                user=auth_user,
-                name=feature['name']
-                )
-            destination.features.add(feature_obj)
+        # get_or_create the tags and features of the user,
+        # with one query per model instead of one per name
+        tags = get_or_create_named(
+            Tag, auth_user, validated_data.pop('tags', []))
+        features = get_or_create_named(
+            Feature, auth_user, validated_data.pop('features', []))
+        # the denormalized names are inserted with the destination
+        destination = Destination.objects.create(
+            **validated_data,
+            cached_tags=denorm.entries(tags),
+            cached_features=denorm.entries(features),
+        )
+        with denorm.suspended():
+            destination.tags.add(*tags)
+            destination.features.add(*features)
 
         return destination
 
@@ -80,24 +137,21 @@ class DestinationSerializer(serializers.ModelSerializer):
 
         # if tags is not None
         # means there are new tags provided in the validated_data
+        # the denormalized names are saved with the other fields
         if tags is not None:
-            # remove old tags
-            instance.tags.clear()
-            for tag in tags:
-                tag_obj, created = Tag.objects.get_or_create(
-                    user=self.context['request'].user,
-                    name=tag['name']
-                )
-                instance.tags.add(tag_obj)
+            tags = get_or_create_named(
+                Tag, self.context['request'].user, tags)
+            instance.cached_tags = denorm.entries(tags)
+            # replace old tags
+            with denorm.suspended():
+                instance.tags.set(tags)
 
         if features is not None:
-            instance.features.clear()
-            for feature in features:
-                feature_obj, created = Feature.objects.get_or_create(
-                    user=self.context['request'].user,
-                    name=feature['name']
-                )
-                instance.features.add(feature_obj)
+            features = get_or_create_named(
+                Feature, self.context['request'].user, features)
+            instance.cached_features = denorm.entries(features)
+            with denorm.suspended():
+                instance.features.set(features)
 
         # update the other fields
         for key, value in validated_data.items():
@@ -108,12 +162,166 @@ class DestinationSerializer(serializers.ModelSerializer):
         return instance
 
 
+# the same schema component as DestinationSerializer, which it replaces
+@extend_schema_serializer(component_name='Destination')
+class DestinationListSerializer(DestinationSerializer):
+    """
+    Serializer for destination lists, reading the tags and features
+    from the denormalized names of the destination rows
+    """
+    tags = CachedTagsField(source='cached_tags')
+    features = CachedFeaturesField(source='cached_features')
+
+
 class DestinationDetailSerializer(DestinationSerializer):
     """Serializer for destination detail objects"""
     class Meta(DestinationSerializer.Meta):
         fields = DestinationSerializer.Meta.fields + ('description', 'image')
 
 
+# its own schema component, not the Destination of its parent
+@extend_schema_serializer(component_name='DestinationSync')
+class DestinationSyncSerializer(DestinationListSerializer):
+    """
+    Serializer for the changed destinations of a sync, with the tags
+    and features of the denormalized names, whose changes set the
+    updated_at the sync is based on
+    """
+    class Meta(DestinationListSerializer.Meta):
+        fields = DestinationDetailSerializer.Meta.fields
+
+
+class DeletedSerializer(serializers.Serializer):
+    """Serializer for the ids of the items deleted since a sync"""
+    destinations = serializers.ListField(child=serializers.IntegerField())
+    tags = serializers.ListField(child=serializers.IntegerField())
+    features = serializers.ListField(child=serializers.IntegerField())
+
+
+class ChangesSerializer(serializers.Serializer):
+    """Serializer for a page of the changes since a sync"""
+    destinations = DestinationSyncSerializer(many=True)
+    tags = TagSerializer(many=True)
+    features = FeatureSerializer(many=True)
+    deleted = DeletedSerializer()
+    cursor = serializers.CharField()
+    has_more = serializers.BooleanField()
+
+
+class DestinationIdsSerializer(serializers.Serializer):
+    """Serializer for the ids of a batch of destinations"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, value):
+        """Drop duplicates and limit the size of the batch"""
+        ids = list(dict.fromkeys(value))
+        if len(ids) > settings.DESTINATION_BATCH_MAX_IDS:
+            raise serializers.ValidationError(
+                f'At most {settings.DESTINATION_BATCH_MAX_IDS} ids '
+                f'can be requested at once.')
+        return ids
+
+
+class DestinationBatchSerializer(serializers.Serializer):
+    """Serializer for a batch of destinations and the ids not found"""
+    results = DestinationDetailSerializer(many=True)
+    missing = serializers.ListField(child=serializers.IntegerField())
+
+
+class BulkSelectionSerializer(serializers.Serializer):
+    """Serializer for the ids of the items changed by a bulk request"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False,
+        allow_empty=False)
+
+    def validate_ids(self, value):
+        """Drop duplicates and limit the size of the selection"""
+        ids = list(dict.fromkeys(value))
+        if len(ids) > settings.BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'At most {settings.BULK_MAX_ITEMS} items can be changed '
+                f'at once.')
+        return ids
+
+    def validate(self, attrs):
+        if self.partial and not set(attrs) - {'ids'}:
+            raise serializers.ValidationError('No values to set.')
+        return attrs
+
+
+class DestinationBulkUpdateSerializer(BulkSelectionSerializer,
+                                      serializers.ModelSerializer):
+    """Serializer for the values set on many destinations at once"""
+
+    class Meta:
+        model = Destination
+        fields = ('ids', 'country', 'city', 'rating', 'description')
+
+
+class TagBulkUpdateSerializer(BulkSelectionSerializer,
+                              serializers.ModelSerializer):
+    """Serializer for the name set on many tags at once"""
+
+    class Meta:
+        model = Tag
+        fields = ('ids', 'name')
+
+
+class FeatureBulkUpdateSerializer(BulkSelectionSerializer,
+                                  serializers.ModelSerializer):
+    """Serializer for the name set on many features at once"""
+
+    class Meta:
+        model = Feature
+        fields = ('ids', 'name')
+
+
+class MergeSerializer(serializers.Serializer):
+    """Serializer for the tags or features merged into another one"""
+    sources = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_sources(self, value):
+        """Drop duplicates and limit the number of sources"""
+        ids = list(dict.fromkeys(value))
+        if len(ids) > settings.BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'At most {settings.BULK_MAX_ITEMS} items can be merged '
+                f'at once.')
+        return ids
+
+
+class BulkResultSerializer(serializers.Serializer):
+    """Serializer for the number of items changed by a bulk request"""
+    count = serializers.IntegerField()
+
+
+class CountryStatSerializer(serializers.Serializer):
+    """Serializer for the statistics of a country"""
+    country = serializers.CharField()
+    destination_count = serializers.IntegerField()
+    average_rating = serializers.DecimalField(max_digits=3, decimal_places=2)
+
+
+class NamedStatSerializer(serializers.Serializer):
+    """Serializer for the statistics of a tag or feature"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    destination_count = serializers.IntegerField()
+    average_rating = serializers.DecimalField(max_digits=3, decimal_places=2)
+
+
+class DestinationStatsSerializer(serializers.Serializer):
+    """Serializer for the destination statistics of a user"""
+    destination_count = serializers.IntegerField()
+    average_rating = serializers.DecimalField(
+        max_digits=3, decimal_places=2, allow_null=True)
+    countries = CountryStatSerializer(many=True)
+    tags = NamedStatSerializer(many=True)
+    features = NamedStatSerializer(many=True)
+
+
 class DestinationImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to destinations"""
 
@@ -126,3 +334,21 @@ class DestinationImageSerializer(serializers.ModelSerializer):
                 'required': True
             }
         }
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Serializer for resumable image upload sessions"""
+
+    class Meta:
+        model = ImageUpload
+        fields = ('id', 'file_name', 'size', 'offset')
+        read_only_fields = ('id', 'offset')
+
+    def validate_size(self, value):
+        """Reject uploads the proxy would refuse in a single request"""
+        if value < 1 or value > settings.RESUMABLE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Size must be between 1 and '
+                f'{settings.RESUMABLE_UPLOAD_MAX_SIZE} bytes'
+            )
+        return value
@@ -0,0 +1,150 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, AsyncClient
+from django.urls import reverse
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from api.models import Destination, Tag, Feature
+from destination.serializers import DestinationSerializer, \
+    DestinationDetailSerializer, TagSerializer, FeatureSerializer
+
+
+DESTINATION_URL = reverse('destination-async:destination-list')
+TAG_URL = reverse('destination-async:tag-list')
+FEATURE_URL = reverse('destination-async:feature-list')
+
+
+def detail_url(destination_id):
+    """generate async destination detail url"""
+    return reverse('destination-async:destination-detail',
+                   args=[destination_id])
+
+
+def create_destination(user, **params):
+    """Helper function to create destination"""
+    destination_values = {
+        'name': 'Test Destination',
+        'description': 'Test description',
+        'country': 'Test country',
+        'city': 'Test city',
+        'rating': 4.5,
+    }
+    destination_values.update(params)
+
+    return Destination.objects.create(user=user, **destination_values)
+
+
+class PublicAsyncApiTests(TestCase):
+    """Test the publicly available async API"""
+
+    async def test_login_required(self):
+        # Test that a token is required for retrieving destinations
+        res = await AsyncClient().get(DESTINATION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_invalid_token(self):
+        res = await AsyncClient().get(
+            DESTINATION_URL, headers={'Authorization': 'Token invalid'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateAsyncApiTests(TestCase):
+    """Test the async read path for an authenticated user"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass'
+        )
+        token = Token.objects.create(user=self.user)
+        self.headers = {'Authorization': f'Token {token.key}'}
+        other_user = get_user_model().objects.create_user(
+            email='test2@example.com',
+            password='testpass'
+        )
+        create_destination(user=other_user)
+        Tag.objects.create(user=other_user, name='Other tag')
+
+    async def get(self, url, data=None):
+        """Send an authenticated GET request"""
+        return await AsyncClient().get(url, data, headers=self.headers)
+
+    async def test_list_destinations(self):
+        '''Test the async list matches the sync list serializer'''
+        destination = await sync_to_async(create_destination)(self.user)
+        tag = await Tag.objects.acreate(user=self.user, name='Beach')
+        await destination.tags.aadd(tag)
+        await sync_to_async(create_destination)(self.user, name='Other')
+
+        res = await self.get(DESTINATION_URL)
+        destinations = Destination.objects.filter(user=self.user) \
+            .prefetch_related('tags', 'features').order_by('-id')
+        serializer = DestinationSerializer(
+            [destination async for destination in destinations], many=True)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), serializer.data)
+
+    async def test_filter_destinations_by_tags(self):
+        destination = await sync_to_async(create_destination)(self.user)
+        tag = await Tag.objects.acreate(user=self.user, name='Beach')
+        await destination.tags.aadd(tag)
+        await sync_to_async(create_destination)(self.user, name='Other')
+
+        res = await self.get(DESTINATION_URL, {'tags': str(tag.id)})
+
+        self.assertEqual([item['id'] for item in res.json()],
+                         [destination.id])
+
+    async def test_destination_detail(self):
+        destination = await sync_to_async(create_destination)(self.user)
+
+        res = await self.get(detail_url(destination.id))
+        destination = await Destination.objects \
+            .prefetch_related('tags', 'features').aget(id=destination.id)
+        serializer = DestinationDetailSerializer(destination)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), serializer.data)
+
+    async def test_destination_detail_other_user(self):
+        '''Test destinations of other users are not found'''
+        other = await Destination.objects.exclude(user=self.user).afirst()
+
+        res = await self.get(detail_url(other.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_list_tags_and_features(self):
+        await Tag.objects.acreate(user=self.user, name='Beach')
+        await Feature.objects.acreate(user=self.user, name='Wifi')
+
+        tag_res = await self.get(TAG_URL)
+        feature_res = await self.get(FEATURE_URL)
+        tags = Tag.objects.filter(user=self.user).order_by('-name')
+        features = Feature.objects.filter(user=self.user).order_by('-name')
+
+        self.assertEqual(
+            tag_res.json(),
+            TagSerializer([tag async for tag in tags], many=True).data)
+        self.assertEqual(
+            feature_res.json(),
+            FeatureSerializer(
+                [feature async for feature in features], many=True).data)
+
+    async def test_tags_paginated(self):
+        """Test the tag list is paginated when a limit is given"""
+        for number in range(5):
+            await Tag.objects.acreate(user=self.user, name=f'Tag{number}')
+
+        res = await self.get(TAG_URL, {'limit': 2, 'offset': 2})
+        tags = Tag.objects.filter(user=self.user).order_by('-name')[2:4]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['count'], 5)
+        self.assertEqual(
+            res.json()['results'],
+            TagSerializer([tag async for tag in tags], many=True).data)
+        self.assertIn('offset=4', res.json()['next'])
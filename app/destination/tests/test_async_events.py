@@ -0,0 +1,234 @@
+import asyncio
+from unittest import skipUnless
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from api import bulk, events
+from api.models import Destination, Feature, Tag
+from destination.async_events import PATH, stream
+
+
+def create_destination(user, **params):
+    """Helper function to create destination"""
+    defaults = {'name': 'Test destination', 'country': 'Japan',
+                'city': 'Tokyo', 'rating': 5}
+    defaults.update(params)
+    return Destination.objects.create(user=user, **defaults)
+
+
+class StreamClient:
+    """Call the stream application like an ASGI server"""
+
+    def __init__(self, headers=(), query_string=b''):
+        self.scope = {'type': 'http', 'method': 'GET', 'path': PATH,
+                      'headers': list(headers),
+                      'query_string': query_string}
+        self.requested = False
+        self.disconnected = asyncio.Event()
+        self.messages = asyncio.Queue()
+        self.task = asyncio.ensure_future(
+            stream(self.scope, self.receive, self.send))
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        await self.messages.put(message)
+
+    async def next(self):
+        """Return the next message sent"""
+        return await asyncio.wait_for(self.messages.get(), 5)
+
+    async def start(self):
+        """Return the status and the first body of the response"""
+        start = await self.next()
+        body = await self.next()
+        return start['status'], body['body'].decode()
+
+    async def disconnect(self):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 5)
+
+
+@override_settings(EVENTS_NOTIFY=False, EVENTS_KEEPALIVE_SECONDS=5)
+class EventStreamTests(TestCase):
+    """Test the event stream of the changes of a user"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com', password='testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.headers = [(b'authorization',
+                         f'Token {self.token.key}'.encode())]
+
+    def committed(self, func, *args, **kwargs):
+        """Run func and the callbacks of its commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            return func(*args, **kwargs)
+
+    async def test_login_required(self):
+        client = StreamClient()
+
+        status, body = await client.start()
+
+        self.assertEqual(status, 401)
+        self.assertIn('credentials', body)
+
+    async def test_token_query_parameter(self):
+        """Test that EventSource can authenticate with the URL"""
+        client = StreamClient(
+            query_string=f'token={self.token.key}'.encode())
+
+        status, body = await client.start()
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, 'retry: 5000\n\n')
+        await client.disconnect()
+
+    async def test_events_of_the_user(self):
+        """Test that changes of the user are pushed, no others"""
+        client = StreamClient(self.headers)
+        await client.start()
+        other = await get_user_model().objects.acreate(
+            email='other@example.com')
+        await sync_to_async(self.committed)(create_destination, other)
+
+        destination = await sync_to_async(self.committed)(
+            create_destination, self.user)
+        message = await client.next()
+
+        self.assertEqual(
+            message['body'].decode(),
+            'event: destinations.created\n'
+            'data: {"kind": "destinations", "action": "created", '
+            f'"ids": [{destination.id}]}}\n\n')
+        self.assertTrue(message['more_body'])
+        await client.disconnect()
+
+    async def test_update_and_delete_events(self):
+        client = StreamClient(self.headers)
+        await client.start()
+        tag = await sync_to_async(self.committed)(
+            Tag.objects.create, user=self.user, name='Beach')
+        await client.next()
+
+        tag.name = 'Sea'
+        await sync_to_async(self.committed)(tag.save)
+        updated = (await client.next())['body'].decode()
+        await sync_to_async(self.committed)(tag.delete)
+        deleted = (await client.next())['body'].decode()
+
+        self.assertTrue(updated.startswith('event: tags.updated\n'))
+        self.assertTrue(deleted.startswith('event: tags.deleted\n'))
+        await client.disconnect()
+
+    async def test_bulk_events(self):
+        """Test that set-based deletes publish their ids at once"""
+        ids = [(await sync_to_async(create_destination)(self.user)).id
+               for _ in range(3)]
+        client = StreamClient(self.headers)
+        await client.start()
+
+        await sync_to_async(self.committed)(
+            bulk.delete_destinations, self.user, ids)
+        body = (await client.next())['body'].decode()
+
+        self.assertIn('event: destinations.deleted\n', body)
+        self.assertIn(f'"ids": {ids}', body)
+        await client.disconnect()
+
+    async def test_named_tags_and_features_created(self):
+        """Test that tags and features created by name are pushed"""
+        api = APIClient()
+        api.force_authenticate(self.user)
+        client = StreamClient(self.headers)
+        await client.start()
+
+        await sync_to_async(self.committed)(
+            api.post, reverse('destination:destination-list'),
+            {'name': 'Test destination', 'country': 'Japan',
+             'city': 'Tokyo', 'rating': 5, 'tags': [{'name': 'Beach'}],
+             'features': [{'name': 'Pool'}]}, format='json')
+        body = ''
+        while 'features.created' not in body \
+                or 'tags.created' not in body:
+            body += (await client.next())['body'].decode()
+        tag = await Tag.objects.aget(user=self.user, name='Beach')
+        feature = await Feature.objects.aget(user=self.user, name='Pool')
+
+        self.assertIn('event: tags.created\ndata: {"kind": "tags", '
+                      f'"action": "created", "ids": [{tag.id}]}}', body)
+        self.assertIn(f'"kind": "features", "action": "created", '
+                      f'"ids": [{feature.id}]', body)
+        await client.disconnect()
+
+    @override_settings(EVENTS_KEEPALIVE_SECONDS=0.01)
+    async def test_keepalive(self):
+        client = StreamClient(self.headers)
+        await client.start()
+
+        message = await client.next()
+
+        self.assertEqual(message['body'], b': keepalive\n\n')
+        await client.disconnect()
+
+    async def test_disconnect_unsubscribes(self):
+        client = StreamClient(self.headers)
+        await client.start()
+        self.assertIn(self.user.id, events.broker.subscriptions)
+
+        await client.disconnect()
+
+        self.assertNotIn(self.user.id, events.broker.subscriptions)
+
+    @override_settings(EVENTS_QUEUE_SIZE=1)
+    async def test_overflow_ends_stream(self):
+        """Test that a client too slow is told to resync"""
+        client = StreamClient(self.headers)
+        await client.start()
+
+        for destination_id in (1, 2, 3):
+            events.broker.dispatch(
+                {'user_id': self.user.id, 'kind': 'destinations',
+                 'action': 'updated', 'ids': [destination_id]})
+        message = await client.next()
+        await asyncio.wait_for(client.task, 5)
+
+        self.assertIn('"ids": [1]', message['body'].decode())
+        self.assertTrue(message['body'].decode().endswith(
+            'event: overflow\ndata: {}\n\n'))
+        self.assertFalse(message['more_body'])
+        self.assertNotIn(self.user.id, events.broker.subscriptions)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'NOTIFY needs Postgres')
+@override_settings(EVENTS_NOTIFY=True)
+class NotifyTests(TransactionTestCase):
+    """Test that committed changes reach the streams with NOTIFY"""
+
+    def setUp(self):
+        # the listener must not keep the test database open
+        self.addCleanup(events.broker.stop)
+
+    async def test_notify(self):
+        user = await get_user_model().objects.acreate(
+            email='test@example.com')
+        token = await Token.objects.acreate(user=user)
+        client = StreamClient(
+            [(b'authorization', f'Token {token.key}'.encode())])
+        await client.start()
+        self.assertIsNotNone(events.broker.listener.conn)
+
+        destination = await sync_to_async(create_destination)(user)
+        message = await client.next()
+
+        self.assertIn(f'"ids": [{destination.id}]', message['body'].decode())
+        await client.disconnect()
@@ -1,17 +1,28 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
-from api.models import Destination, Tag, Feature
+from api import bulk
+from api.models import Destination, Tag, Feature, ImageUpload, UserStat
 from destination.serializers import DestinationSerializer, \
     DestinationDetailSerializer
 import tempfile
 import os
+import io
 from PIL import Image
 
 
 DESTINATION_URL = reverse('destination:destination-list')
+BATCH_URL = reverse('destination:destination-batch')
+BULK_URL = reverse('destination:destination-bulk-update')
 
 
 def detail_url(destination_id):
@@ -25,6 +36,24 @@ def image_url(destination_id):
                    args=[destination_id])
 
 
+def uploads_url(destination_id):
+    """generate resumable upload session url"""
+    return reverse('destination:destination-uploads',
+                   args=[destination_id])
+
+
+def upload_session_url(destination_id, upload_id):
+    """generate url of a resumable upload session"""
+    return reverse('destination:destination-upload-session',
+                   args=[destination_id, upload_id])
+
+
+def upload_finalize_url(destination_id, upload_id):
+    """generate url to finalize a resumable upload"""
+    return reverse('destination:destination-upload-finalize',
+                   args=[destination_id, upload_id])
+
+
 def create_destination(user, **params):
     """Helper function to create destination"""
     destination_values = {
@@ -189,8 +218,27 @@ class PrivateDestinationApiTests(TestCase):
         self.assertEqual(destinations.count(), 1)
         destination = destinations[0]
         self.assertEqual(destination.tags.count(), 2)
-        self.assertEqual(destination.tags.all()[0].name, 'Tag 1')
-        self.assertEqual(destination.tags.all()[1].name, 'Tag 2')
+        self.assertEqual(destination.tags.order_by('id')[0].name, 'Tag 1')
+        self.assertEqual(destination.tags.order_by('id')[1].name, 'Tag 2')
+
+    def test_create_destination_many_tags(self):
+        '''Test the queries do not grow with the number of tags'''
+        def create(count):
+            payload = {
+                'name': 'Test Destination',
+                'country': 'Test country',
+                'city': 'Test city',
+                'rating': 4.5,
+                'tags': [{'name': f'Tag {count} {i}'} for i in range(count)]
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(DESTINATION_URL, payload,
+                                       format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(create(2), create(10))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 12)
 
     def test_create_destination_no_duplicate_tag(self):
         '''Test creating a destination with existing tags'''
@@ -216,8 +264,8 @@ class PrivateDestinationApiTests(TestCase):
         self.assertEqual(destination.tags.count(), 2)
 
         # check the tag name is the same as the tag created above
-        self.assertEqual(destination.tags.all()[0].name, tag.name)
-        self.assertEqual(destination.tags.all()[1].name, 'Tag 2')
+        self.assertEqual(destination.tags.order_by('id')[0].name, tag.name)
+        self.assertEqual(destination.tags.order_by('id')[1].name, 'Tag 2')
 
     def test_update_destination_tag(self):
         ''''Test updating a destination with tags'''
@@ -284,8 +332,10 @@ class PrivateDestinationApiTests(TestCase):
         self.assertEqual(destinations.count(), 1)
         destination = destinations[0]
         self.assertEqual(destination.features.count(), 2)
-        self.assertEqual(destination.features.all()[0].name, 'Feature 1')
-        self.assertEqual(destination.features.all()[1].name, 'Feature 2')
+        self.assertEqual(
+            destination.features.order_by('id')[0].name, 'Feature 1')
+        self.assertEqual(
+            destination.features.order_by('id')[1].name, 'Feature 2')
 
     def test_create_destination_no_duplicate_feature(self):
         '''Test creating a destination with existing features'''
@@ -313,8 +363,10 @@ class PrivateDestinationApiTests(TestCase):
         self.assertEqual(destination.features.count(), 2)
 
         # check the feature name is the same as the feature created above
-        self.assertEqual(destination.features.all()[0].name, feature.name)
-        self.assertEqual(destination.features.all()[1].name, 'Feature 2')
+        self.assertEqual(
+            destination.features.order_by('id')[0].name, feature.name)
+        self.assertEqual(
+            destination.features.order_by('id')[1].name, 'Feature 2')
 
     def test_update_destination_feature(self):
         '''Test updating a destination with features'''
@@ -425,6 +477,236 @@ class PrivateDestinationApiTests(TestCase):
         self.assertNotIn(serializer3.data, res.data)
 
 
+class BatchRetrieveTests(TestCase):
+    '''Test retrieving many destinations by id in one request'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.destinations = [
+            create_destination(user=self.user, name=f'Destination {i}')
+            for i in range(3)
+        ]
+        tag = Tag.objects.create(user=self.user, name='Tag')
+        feature = Feature.objects.create(user=self.user, name='Feature')
+        for destination in self.destinations:
+            destination.tags.add(tag)
+            destination.features.add(feature)
+
+    def test_batch_by_query_param(self):
+        '''Test the destinations are returned in the order of the ids'''
+        first, second, third = self.destinations
+        ids = f'{third.id},{first.id},{second.id}'
+
+        # one query for the destinations, one for each prefetch
+        with self.assertNumQueries(3):
+            res = self.client.get(BATCH_URL, {'ids': ids})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            DestinationDetailSerializer([third, first, second], many=True,
+                                        context={'request': res.wsgi_request}
+                                        ).data)
+        self.assertEqual(res.data['missing'], [])
+
+    def test_batch_by_post_body(self):
+        '''Test the ids can be sent as a POST body'''
+        first = self.destinations[0]
+
+        res = self.client.post(BATCH_URL, {'ids': [first.id]},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data['results']],
+                         [first.id])
+        self.assertEqual(res.data['results'][0]['description'],
+                         first.description)
+
+    def test_batch_reports_missing(self):
+        '''Test unknown ids and ids of other users are reported missing'''
+        user2 = get_user_model().objects.create_user(
+            'test2@example.com',
+            'testpass'
+        )
+        other = create_destination(user=user2)
+        first = self.destinations[0]
+        unknown = other.id + 1000
+
+        res = self.client.get(
+            BATCH_URL, {'ids': f'{first.id},{other.id},{unknown},{first.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data['results']],
+                         [first.id])
+        self.assertEqual(res.data['missing'], [other.id, unknown])
+
+    @override_settings(DESTINATION_BATCH_MAX_IDS=2)
+    def test_batch_too_many_ids(self):
+        '''Test requesting more ids than the limit fails'''
+        ids = ','.join(str(destination.id)
+                       for destination in self.destinations)
+
+        res = self.client.get(BATCH_URL, {'ids': ids})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ids', res.data)
+
+    def test_batch_invalid_ids(self):
+        '''Test missing or malformed ids are rejected'''
+        for params in ({}, {'ids': 'abc'}, {'ids': '1,,2'}, {'ids': '0'}):
+            res = self.client.get(BATCH_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkDestinationTests(TestCase):
+    '''Test updating and deleting many destinations in one request'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = sample_user()
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Tag')
+        self.destinations = [
+            create_destination(user=self.user, name=f'Destination {i}',
+                               rating=3.0)
+            for i in range(3)
+        ]
+        self.destinations[0].tags.add(self.tag)
+        self.other = create_destination(
+            user=get_user_model().objects.create_user(
+                'test2@example.com', 'testpass'))
+
+    def total(self):
+        row = UserStat.objects.get(user=self.user, dimension=UserStat.TOTAL)
+        return row.destination_count, row.rating_sum
+
+    def test_bulk_update_by_ids(self):
+        '''Test setting values on the destinations of the ids'''
+        first, second, third = self.destinations
+        payload = {'ids': [first.id, second.id, self.other.id],
+                   'country': 'Italy', 'rating': '5.0'}
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'count': 2})
+        self.assertEqual(
+            list(Destination.objects.filter(country='Italy')
+                 .order_by('id')), [first, second])
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.country, 'Test country')
+        self.assertEqual(self.total(), (3, Decimal('13.0')))
+        self.assertEqual(
+            UserStat.objects.get(user=self.user, dimension=UserStat.TAG,
+                                 key=str(self.tag.id)).rating_sum,
+            Decimal('5.0'))
+
+    def test_bulk_update_by_filter(self):
+        '''Test the filters of the list select the destinations'''
+        res = self.client.patch(f'{BULK_URL}?tags={self.tag.id}',
+                                {'city': 'Rome'}, format='json')
+
+        self.assertEqual(res.data, {'count': 1})
+        self.assertEqual(
+            list(Destination.objects.filter(city='Rome')),
+            [self.destinations[0]])
+
+    def test_bulk_update_invalid(self):
+        '''Test a bulk update needs values, and valid ones'''
+        ids = [self.destinations[0].id]
+        for payload in ({'ids': ids}, {'ids': ids, 'rating': 'high'},
+                        {'ids': [], 'city': 'Rome'}):
+            res = self.client.patch(BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_delete(self):
+        '''Test deleting destinations with their links'''
+        first, second, third = self.destinations
+
+        res = self.client.delete(
+            BULK_URL, {'ids': [first.id, second.id, self.other.id]},
+            format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'count': 2})
+        self.assertEqual(
+            set(Destination.objects.all()), {third, self.other})
+        self.assertFalse(self.tag.destination_set.exists())
+        self.assertEqual(self.total(), (1, Decimal('3.0')))
+        self.assertFalse(UserStat.objects.filter(
+            user=self.user, dimension=UserStat.TAG,
+            destination_count__gt=0).exists())
+
+    def test_bulk_delete_other_user(self):
+        '''Test the ids of another user leave their links and uploads'''
+        other_tag = Tag.objects.create(user=self.other.user, name='Other')
+        self.other.tags.add(other_tag)
+        upload = ImageUpload.objects.create(
+            user=self.other.user, destination=self.other,
+            file_name='image.jpg', size=10)
+
+        count = bulk.delete_destinations(self.user, [self.other.id])
+
+        self.assertEqual(count, 0)
+        self.assertEqual(list(self.other.tags.all()), [other_tag])
+        self.assertTrue(ImageUpload.objects.filter(id=upload.id).exists())
+
+    def test_bulk_delete_files(self):
+        '''Test the partial uploads are removed once the rows are gone'''
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        with override_settings(RESUMABLE_UPLOAD_DIR=upload_dir.name):
+            upload = ImageUpload.objects.create(
+                user=self.user, destination=self.destinations[0],
+                file_name='image.jpg', size=10)
+            temp_path = upload.temp_path
+            open(temp_path, 'wb').close()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                bulk.delete_destinations(self.user,
+                                         [self.destinations[0].id])
+
+        self.assertFalse(ImageUpload.objects.filter(id=upload.id).exists())
+        self.assertFalse(os.path.exists(temp_path))
+
+    def test_bulk_delete_by_both_filters(self):
+        '''Test the tags and features filters select their intersection'''
+        first, second, third = self.destinations
+        feature = Feature.objects.create(user=self.user, name='Feature')
+        first.features.add(feature)
+        second.features.add(feature)
+
+        res = self.client.delete(
+            f'{BULK_URL}?tags={self.tag.id}&features={feature.id}')
+
+        self.assertEqual(res.data, {'count': 1})
+        self.assertEqual(
+            set(Destination.objects.all()), {second, third, self.other})
+
+    def test_bulk_requires_selection(self):
+        '''Test a bulk request without ids nor filters changes nothing'''
+        res = self.client.delete(BULK_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Destination.objects.count(), 4)
+
+    @override_settings(BULK_MAX_ITEMS=1)
+    def test_bulk_too_many(self):
+        '''Test selecting more items than the limit fails'''
+        ids = [destination.id for destination in self.destinations]
+
+        res = self.client.delete(BULK_URL, {'ids': ids}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.delete(f'{BULK_URL}?tags={self.tag.id}')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.patch(f'{BULK_URL}?features=1,2',
+                                {'city': 'Rome'}, format='json')
+        self.assertEqual(res.data, {'count': 0})
+
+
 class ImageTests(TestCase):
     '''Test uploading an image to a destination'''
 
@@ -470,3 +752,167 @@ class ImageTests(TestCase):
             # upload the text file to the destination
             res = self.client.post(url, {'image': ntf}, format='multipart')
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ResumableImageUploadTests(TestCase):
+    '''Test uploading an image to a destination in chunks'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass',
+        )
+        self.client.force_authenticate(self.user)
+        self.destination = create_destination(user=self.user)
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+        self.image_bytes = buffer.getvalue()
+
+    def tearDown(self):
+        self.destination.image.delete()
+
+    def start_upload(self):
+        """Open an upload session for the test image"""
+        payload = {'file_name': 'image.jpg', 'size': len(self.image_bytes)}
+        res = self.client.post(uploads_url(self.destination.id), payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']
+
+    def put_chunk(self, upload_id, start, end):
+        """Send the bytes start..end (inclusive) of the test image"""
+        size = len(self.image_bytes)
+        return self.client.put(
+            upload_session_url(self.destination.id, upload_id),
+            self.image_bytes[start:end + 1],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{size}'
+        )
+
+    def test_chunked_upload(self):
+        '''Test uploading an image in two chunks and finalizing it'''
+        upload_id = self.start_upload()
+        middle = len(self.image_bytes) // 2
+        last = len(self.image_bytes) - 1
+
+        res = self.put_chunk(upload_id, 0, middle - 1)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], middle)
+        self.assertEqual(res['Range'], f'bytes=0-{middle - 1}')
+        res = self.put_chunk(upload_id, middle, last)
+        self.assertEqual(res.data['offset'], len(self.image_bytes))
+
+        res = self.client.post(
+            upload_finalize_url(self.destination.id, upload_id))
+        self.destination.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('image', res.data)
+        self.assertTrue(os.path.exists(self.destination.image.path))
+        with open(self.destination.image.path, 'rb') as image_file:
+            self.assertEqual(image_file.read(), self.image_bytes)
+        self.assertFalse(ImageUpload.objects.filter(id=upload_id).exists())
+
+    def test_resume_after_dropped_chunk(self):
+        '''Test a retry only needs the bytes after the stored offset'''
+        upload_id = self.start_upload()
+        last = len(self.image_bytes) - 1
+        self.put_chunk(upload_id, 0, 99)
+
+        # a chunk after a gap is rejected with the offset to resume from
+        res = self.put_chunk(upload_id, 200, last)
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['offset'], 100)
+
+        res = self.client.get(upload_session_url(self.destination.id,
+                                                 upload_id))
+        self.assertEqual(res.data['offset'], 100)
+        # resending an overlapping chunk only appends the missing bytes
+        res = self.put_chunk(upload_id, 50, last)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], len(self.image_bytes))
+
+        upload = ImageUpload.objects.get(id=upload_id)
+        with open(upload.temp_path, 'rb') as part:
+            self.assertEqual(part.read(), self.image_bytes)
+        self.client.post(upload_finalize_url(self.destination.id, upload_id))
+
+    def test_finalize_incomplete_upload(self):
+        '''Test an upload with missing bytes cannot be finalized'''
+        upload_id = self.start_upload()
+        self.put_chunk(upload_id, 0, 9)
+
+        res = self.client.post(
+            upload_finalize_url(self.destination.id, upload_id))
+        self.destination.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(self.destination.image)
+        self.client.delete(upload_session_url(self.destination.id,
+                                              upload_id))
+
+    def test_finalize_invalid_image(self):
+        '''Test a completed upload that is not an image is rejected'''
+        self.image_bytes = b'This is an invalid image file.'
+        upload_id = self.start_upload()
+        self.put_chunk(upload_id, 0, len(self.image_bytes) - 1)
+
+        res = self.client.post(
+            upload_finalize_url(self.destination.id, upload_id))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ImageUpload.objects.filter(id=upload_id).exists())
+
+    def test_invalid_content_range(self):
+        '''Test a chunk that does not match its Content-Range'''
+        upload_id = self.start_upload()
+        res = self.client.put(
+            upload_session_url(self.destination.id, upload_id),
+            self.image_bytes[:10],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE='bytes 0-19/20'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.delete(upload_session_url(self.destination.id,
+                                              upload_id))
+
+    def test_upload_too_large(self):
+        '''Test an upload larger than the proxy limit is refused'''
+        payload = {'file_name': 'image.jpg', 'size': 100 * 1024 * 1024}
+        res = self.client.post(uploads_url(self.destination.id), payload)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_upload_not_found(self):
+        '''Test a session older than the expiry can no longer be resumed'''
+        upload_id = self.start_upload()
+        ImageUpload.objects.filter(id=upload_id).update(
+            created_at=timezone.now() - timedelta(hours=25))
+
+        res = self.client.get(
+            upload_session_url(self.destination.id, upload_id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.put_chunk(upload_id, 0, 99)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_prune_uploads(self):
+        '''Test the command deletes the expired sessions and files only'''
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        with override_settings(RESUMABLE_UPLOAD_DIR=upload_dir.name):
+            expired = ImageUpload.objects.get(id=self.start_upload())
+            recent = ImageUpload.objects.get(id=self.start_upload())
+            expired_path, recent_path = expired.temp_path, recent.temp_path
+        ImageUpload.objects.filter(id=expired.id).update(
+            created_at=timezone.now() - timedelta(hours=25))
+        # a partial file left behind by a session deleted earlier
+        orphan = os.path.join(upload_dir.name, 'orphan.part')
+        open(orphan, 'wb').close()
+        old = (timezone.now() - timedelta(hours=25)).timestamp()
+        os.utime(orphan, (old, old))
+
+        with override_settings(RESUMABLE_UPLOAD_DIR=upload_dir.name):
+            out = StringIO()
+            call_command('prune_uploads', stdout=out)
+
+        self.assertIn('Deleted 1 upload sessions', out.getvalue())
+        self.assertEqual(list(ImageUpload.objects.all()), [recent])
+        self.assertFalse(os.path.exists(expired_path))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(recent_path))
@@ -8,6 +8,7 @@ from destination.serializers import FeatureSerializer
 
 
 FEATURES_URL = reverse('destination:feature-list')
+FEATURES_BULK_URL = reverse('destination:feature-bulk-update')
 
 
 def detail_url(feature_id):
@@ -15,6 +16,11 @@ def detail_url(feature_id):
     return reverse('destination:feature-detail', args=[feature_id])
 
 
+def merge_url(feature_id):
+    """Return the URL merging other features into a feature"""
+    return reverse('destination:feature-merge', args=[feature_id])
+
+
 class PublicFeatureApiTests(TestCase):
     """Test the publicly available features API"""
 
@@ -139,3 +145,66 @@ class PrivateFeatureApiTests(TestCase):
         res = self.client.get(FEATURES_URL, {'is_feature_destination': 1})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data), 1)
+
+    def test_with_counts(self):
+        """Test returning the number of destinations of each feature"""
+        feature1 = Feature.objects.create(user=self.user, name='Test feature1')
+        feature2 = Feature.objects.create(user=self.user, name='Test feature2')
+        destination = Destination.objects.create(
+            user=self.user,
+            name='Test destination',
+            country='Test country',
+            city='Test city',
+            rating=4.5,
+        )
+        destination.features.add(feature1)
+
+        res = self.client.get(FEATURES_URL, {'ordering': 'destination_count'})
+
+        self.assertEqual(res.data, [
+            {'id': feature2.id, 'name': 'Test feature2',
+             'destination_count': 0},
+            {'id': feature1.id, 'name': 'Test feature1',
+             'destination_count': 1},
+        ])
+
+    def test_bulk_delete(self):
+        """Test deleting many features updates the names of destinations"""
+        feature1 = Feature.objects.create(user=self.user, name='Test feature1')
+        feature2 = Feature.objects.create(user=self.user, name='Test feature2')
+        destination = Destination.objects.create(
+            user=self.user,
+            name='Test destination',
+            country='Test country',
+            city='Test city',
+            rating=4.5,
+        )
+        destination.features.add(feature1, feature2)
+
+        res = self.client.delete(f'{FEATURES_BULK_URL}?ids={feature1.id}')
+
+        self.assertEqual(res.data, {'count': 1})
+        destination.refresh_from_db()
+        self.assertEqual(destination.cached_features,
+                         [[feature2.id, 'Test feature2']])
+
+    def test_merge(self):
+        """Test merging features into another one"""
+        wifi = Feature.objects.create(user=self.user, name='Wifi')
+        lower = Feature.objects.create(user=self.user, name='wifi')
+        destination = Destination.objects.create(
+            user=self.user,
+            name='Test destination',
+            country='Test country',
+            city='Test city',
+            rating=4.5,
+        )
+        destination.features.add(lower)
+
+        res = self.client.post(merge_url(wifi.id), {'sources': [lower.id]},
+                               format='json')
+
+        self.assertEqual(res.data['destination_count'], 1)
+        self.assertEqual(list(Feature.objects.all()), [wifi])
+        destination.refresh_from_db()
+        self.assertEqual(destination.cached_features, [[wifi.id, 'Wifi']])
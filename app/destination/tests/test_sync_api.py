@@ -0,0 +1,263 @@
+from datetime import timedelta
+from unittest import skipUnless
+import psycopg2
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from io import StringIO
+from rest_framework import status
+from rest_framework.test import APIClient
+from api import sync
+from api.models import Destination, Feature, Tag, Tombstone
+
+
+CHANGES_URL = reverse('destination:changes')
+
+
+def create_destination(user, **params):
+    """Create and return a destination"""
+    defaults = {'name': 'Test destination', 'country': 'Japan',
+                'city': 'Tokyo', 'rating': 5}
+    defaults.update(params)
+    return Destination.objects.create(user=user, **defaults)
+
+
+class PublicSyncApiTests(TestCase):
+    """Test the publicly available sync API"""
+
+    def test_login_required(self):
+        res = APIClient().get(CHANGES_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class PrivateSyncApiTests(TestCase):
+    """Test the incremental sync of the authorized user"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com', password='testpass')
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None, **params):
+        if since:
+            params['since'] = since
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_initial_sync(self):
+        """Test that a sync without cursor sends every item of the user"""
+        tag = Tag.objects.create(user=self.user, name='Beach')
+        feature = Feature.objects.create(user=self.user, name='Pool')
+        destination = create_destination(self.user)
+        destination.tags.add(tag)
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass')
+        create_destination(other)
+        Tag.objects.create(user=other, name='Other')
+
+        data = self.sync()
+
+        self.assertEqual([item['id'] for item in data['destinations']],
+                         [destination.id])
+        self.assertEqual(data['destinations'][0]['tags'],
+                         [{'id': tag.id, 'name': 'Beach'}])
+        self.assertEqual(data['tags'], [{'id': tag.id, 'name': 'Beach'}])
+        self.assertEqual(data['features'],
+                         [{'id': feature.id, 'name': 'Pool'}])
+        self.assertEqual(data['deleted'],
+                         {'destinations': [], 'tags': [], 'features': []})
+        self.assertFalse(data['has_more'])
+
+    def test_changes_since_cursor(self):
+        """Test that only the items changed after the cursor are sent"""
+        first = create_destination(self.user, name='First')
+        second = create_destination(self.user, name='Second')
+        cursor = self.sync()['cursor']
+
+        second.rating = 3
+        second.save()
+        tag = Tag.objects.create(user=self.user, name='Beach')
+        data = self.sync(cursor)
+
+        self.assertEqual([item['id'] for item in data['destinations']],
+                         [second.id])
+        self.assertEqual([item['id'] for item in data['tags']], [tag.id])
+        self.assertNotIn(first.id,
+                         [item['id'] for item in data['destinations']])
+        # nothing changed since
+        data = self.sync(data['cursor'])
+        self.assertEqual(data['destinations'], [])
+        self.assertEqual(data['tags'], [])
+
+    def test_deletions_leave_tombstones(self):
+        """Test that deleted items are sent as deleted ids"""
+        destination = create_destination(self.user)
+        tag = Tag.objects.create(user=self.user, name='Beach')
+        feature = Feature.objects.create(user=self.user, name='Pool')
+        cursor = self.sync()['cursor']
+
+        self.client.delete(reverse('destination:destination-detail',
+                                   args=[destination.id]))
+        self.client.delete(reverse('destination:tag-detail', args=[tag.id]))
+        self.client.delete(reverse('destination:feature-detail',
+                                   args=[feature.id]))
+        data = self.sync(cursor)
+
+        self.assertEqual(data['deleted'], {'destinations': [destination.id],
+                                           'tags': [tag.id],
+                                           'features': [feature.id]})
+        self.assertEqual(data['destinations'], [])
+
+    def test_bulk_changes(self):
+        """Test that bulk updates, deletes and merges are synced"""
+        updated = create_destination(self.user, name='Updated')
+        deleted = create_destination(self.user, name='Deleted')
+        target = Tag.objects.create(user=self.user, name='Target')
+        source = Tag.objects.create(user=self.user, name='Source')
+        unchanged = create_destination(self.user, name='Unchanged')
+        unchanged.tags.add(target)
+        deleted.tags.add(source)
+        updated.tags.add(source)
+        cursor = self.sync()['cursor']
+
+        self.client.patch(reverse('destination:destination-bulk-update'),
+                          {'ids': [updated.id], 'rating': 1},
+                          format='json')
+        self.client.delete(reverse('destination:destination-bulk-update'),
+                           {'ids': [deleted.id]}, format='json')
+        self.client.post(reverse('destination:tag-merge', args=[target.id]),
+                         {'sources': [source.id]}, format='json')
+        data = self.sync(cursor)
+
+        self.assertEqual([item['id'] for item in data['destinations']],
+                         [updated.id])
+        self.assertEqual(float(data['destinations'][0]['rating']), 1)
+        self.assertEqual(data['destinations'][0]['tags'],
+                         [{'id': target.id, 'name': 'Target'}])
+        self.assertEqual(data['deleted']['destinations'], [deleted.id])
+        self.assertEqual(data['deleted']['tags'], [source.id])
+
+    def test_rename_sends_linked_destinations(self):
+        """Test that renaming a tag sends its destinations again"""
+        tag = Tag.objects.create(user=self.user, name='Beach')
+        linked = create_destination(self.user, name='Linked')
+        linked.tags.add(tag)
+        create_destination(self.user, name='Other')
+        cursor = self.sync()['cursor']
+
+        self.client.patch(reverse('destination:tag-detail', args=[tag.id]),
+                          {'name': 'Sea'})
+        data = self.sync(cursor)
+
+        self.assertEqual([item['id'] for item in data['tags']], [tag.id])
+        self.assertEqual([item['id'] for item in data['destinations']],
+                         [linked.id])
+        self.assertEqual(data['destinations'][0]['tags'],
+                         [{'id': tag.id, 'name': 'Sea'}])
+
+    def test_pages(self):
+        """Test that the pages of a sync send every change once"""
+        ids = [create_destination(self.user, name=f'D{index}').id
+               for index in range(5)]
+        tag = Tag.objects.create(user=self.user, name='Beach')
+
+        synced, cursor, pages = [], None, 0
+        while True:
+            # and the horizon, from Postgres
+            with self.assertNumQueries(len(sync.KINDS) + (
+                    connection.vendor == 'postgresql')):
+                data = self.sync(cursor, limit=2)
+            synced += [item['id'] for item in data['destinations']]
+            synced += [('tag', item['id']) for item in data['tags']]
+            cursor, pages = data['cursor'], pages + 1
+            if not data['has_more']:
+                break
+        self.assertEqual(synced, ids + [('tag', tag.id)])
+        self.assertEqual(pages, 3)
+
+    def test_pages_same_time(self):
+        """Test paging through changes written at the same time"""
+        ids = [create_destination(self.user, name=f'D{index}').id
+               for index in range(3)]
+        cursor = self.sync()['cursor']
+        self.client.patch(reverse('destination:destination-bulk-update'),
+                          {'ids': ids, 'rating': 2}, format='json')
+
+        synced = []
+        for _ in ids:
+            data = self.sync(cursor, limit=1)
+            synced += [item['id'] for item in data['destinations']]
+            cursor = data['cursor']
+        self.assertFalse(self.sync(cursor)['destinations'])
+        self.assertEqual(synced, ids)
+
+    @override_settings(SYNC_SETTLE_SECONDS=60)
+    def test_recent_changes_held_back(self):
+        """Test that changes still settling are not sent yet"""
+        create_destination(self.user)
+
+        data = self.sync()
+
+        self.assertEqual(data['destinations'], [])
+        self.assertFalse(data['has_more'])
+
+    def test_invalid_cursor(self):
+        res = self.client.get(CHANGES_URL, {'since': 'abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_cursor(self):
+        """Test that a cursor older than the tombstones is refused"""
+        old = timezone.now() - timedelta(days=365)
+        cursor = sync.format_cursor(sync.Cursor(sync.microseconds(old), 0, 0))
+
+        res = self.client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+    def test_prune_tombstones(self):
+        """Test that the command deletes the old tombstones only"""
+        Tombstone.objects.create(
+            user_id=self.user.id, kind='tags', object_id=1,
+            deleted_at=timezone.now() - timedelta(days=365))
+        recent = Tombstone.objects.create(
+            user_id=self.user.id, kind='tags', object_id=2)
+
+        call_command('prune_tombstones', stdout=StringIO())
+
+        self.assertEqual(list(Tombstone.objects.all()), [recent])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'pg_stat_activity of Postgres')
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class OpenTransactionSyncTests(TransactionTestCase):
+    """Test that the sync waits for the transactions still open"""
+
+    def test_long_transaction_not_skipped(self):
+        """Test a change committed late is still sent after the cursor"""
+        user = get_user_model().objects.create_user(
+            email='test@example.com', password='testpass')
+        destination = create_destination(user)
+        cursor = sync.changes(user)['cursor']
+        # another connection writes the destination, then commits later
+        writer = psycopg2.connect(**connection.get_connection_params())
+        self.addCleanup(writer.close)
+        with writer.cursor() as writer_cursor:
+            writer_cursor.execute(
+                'UPDATE api_destination SET rating = 1, '
+                'updated_at = CLOCK_TIMESTAMP() WHERE id = %s',
+                [destination.id])
+
+        data = sync.changes(user, sync.parse_cursor(cursor))
+        writer.commit()
+        later = sync.changes(user, sync.parse_cursor(data['cursor']))
+
+        self.assertEqual(data['destinations'], [])
+        self.assertEqual([obj.id for obj in later['destinations']],
+                         [destination.id])
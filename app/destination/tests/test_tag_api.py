@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
-from api.models import Tag, Destination
+from django.test.utils import CaptureQueriesContext
+from api.models import Tag, Destination, UserStat
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -8,6 +10,7 @@ from destination.serializers import TagSerializer
 
 
 TAG_URL = reverse('destination:tag-list')
+TAG_BULK_URL = reverse('destination:tag-bulk-update')
 
 
 def detail_url(tag_id):
@@ -15,6 +18,11 @@ def detail_url(tag_id):
     return reverse('destination:tag-detail', args=[tag_id])
 
 
+def merge_url(tag_id):
+    """Given a tag id, return the url merging other tags into it"""
+    return reverse('destination:tag-merge', args=[tag_id])
+
+
 class PublicTagApiTests(TestCase):
     """Test the publicly available tag API"""
 
@@ -141,3 +149,178 @@ class PrivateTagApiTests(TestCase):
         res = self.client.get(TAG_URL, {'is_tag_destination': 1})
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data), 1)
+
+    def create_destination(self, name, tags):
+        destination = Destination.objects.create(
+            user=self.user,
+            name=name,
+            country='Test country',
+            city='Test city',
+            rating=4.0,
+            )
+        destination.tags.add(*tags)
+        return destination
+
+    def test_filter_uses_exists(self):
+        """Test the assigned filter is a semijoin without DISTINCT"""
+        tag = Tag.objects.create(user=self.user, name='Test tag')
+        self.create_destination('Test destination', [tag])
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(TAG_URL, {'is_tag_destination': 1})
+
+        self.assertEqual(len(res.data), 1)
+        sql = queries[-1]['sql'].upper()
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_with_counts(self):
+        """Test returning and sorting by the number of destinations"""
+        tag1 = Tag.objects.create(user=self.user, name='Test tag1')
+        tag2 = Tag.objects.create(user=self.user, name='Test tag2')
+        tag3 = Tag.objects.create(user=self.user, name='Test tag3')
+        self.create_destination('Test destination1', [tag1, tag2])
+        self.create_destination('Test destination2', [tag2])
+
+        res = self.client.get(TAG_URL, {'with_counts': 1})
+        self.assertEqual(res.data, [
+            {'id': tag3.id, 'name': 'Test tag3', 'destination_count': 0},
+            {'id': tag2.id, 'name': 'Test tag2', 'destination_count': 2},
+            {'id': tag1.id, 'name': 'Test tag1', 'destination_count': 1},
+        ])
+
+        res = self.client.get(TAG_URL, {
+            'ordering': '-destination_count', 'is_tag_destination': 1})
+        self.assertEqual([tag['id'] for tag in res.data], [tag2.id, tag1.id])
+        self.assertEqual(res.data[0]['destination_count'], 2)
+
+    def test_pagination(self):
+        """Test the list is paginated when a limit is given"""
+        tags = [Tag.objects.create(user=self.user, name=f'Test tag{number}')
+                for number in range(5)]
+
+        res = self.client.get(
+            TAG_URL, {'ordering': 'name', 'limit': 2, 'offset': 2})
+
+        self.assertEqual(res.data['count'], 5)
+        self.assertEqual([tag['id'] for tag in res.data['results']],
+                         [tags[2].id, tags[3].id])
+        self.assertIsNotNone(res.data['next'])
+
+    def test_bulk_rename(self):
+        """Test renaming many tags updates the names of destinations"""
+        tag1 = Tag.objects.create(user=self.user, name='beach')
+        tag2 = Tag.objects.create(user=self.user, name='Beach')
+        tag3 = Tag.objects.create(user=self.user, name='Mountain')
+        destination = self.create_destination('Test destination',
+                                              [tag1, tag2, tag3])
+
+        res = self.client.patch(TAG_BULK_URL, {
+            'ids': [tag1.id, tag2.id], 'name': 'Beaches'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'count': 2})
+        self.assertEqual(
+            sorted(Tag.objects.values_list('name', flat=True)),
+            ['Beaches', 'Beaches', 'Mountain'])
+        destination.refresh_from_db()
+        self.assertEqual(destination.cached_tags, [
+            [tag1.id, 'Beaches'], [tag2.id, 'Beaches'],
+            [tag3.id, 'Mountain']])
+
+    def test_bulk_delete(self):
+        """Test deleting many tags in one request"""
+        user2 = get_user_model().objects.create_user(
+            email='test2@example.com',
+            password='testpass'
+            )
+        tag1 = Tag.objects.create(user=self.user, name='Test tag1')
+        tag2 = Tag.objects.create(user=self.user, name='Test tag2')
+        tag3 = Tag.objects.create(user=self.user, name='Test tag3')
+        other = Tag.objects.create(user=user2, name='Test tag')
+        destination = self.create_destination('Test destination',
+                                              [tag1, tag3])
+
+        res = self.client.delete(TAG_BULK_URL, {
+            'ids': [tag1.id, tag2.id, other.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'count': 2})
+        self.assertEqual(set(Tag.objects.all()), {tag3, other})
+        self.assertEqual(list(destination.tags.all()), [tag3])
+        destination.refresh_from_db()
+        self.assertEqual(destination.cached_tags, [[tag3.id, 'Test tag3']])
+        self.assertEqual(
+            set(UserStat.objects.filter(dimension=UserStat.TAG)
+                .values_list('key', flat=True)),
+            {str(tag3.id)})
+
+    def test_bulk_delete_by_filter(self):
+        """Test the filters of the list select the tags to delete"""
+        tag1 = Tag.objects.create(user=self.user, name='Test tag1')
+        tag2 = Tag.objects.create(user=self.user, name='Test tag2')
+        self.create_destination('Test destination', [tag1])
+
+        res = self.client.delete(f'{TAG_BULK_URL}?is_tag_destination=1')
+
+        self.assertEqual(res.data, {'count': 1})
+        self.assertEqual(list(Tag.objects.all()), [tag2])
+
+    def test_bulk_requires_selection(self):
+        """Test a bulk request without ids nor filters changes nothing"""
+        Tag.objects.create(user=self.user, name='Test tag')
+
+        for params in ('', '?is_tag_destination=0'):
+            res = self.client.delete(TAG_BULK_URL + params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_merge(self):
+        """Test merging tags links their destinations to the target"""
+        beach = Tag.objects.create(user=self.user, name='Beach')
+        lower = Tag.objects.create(user=self.user, name='beach')
+        plural = Tag.objects.create(user=self.user, name='beaches')
+        other = Tag.objects.create(user=self.user, name='Mountain')
+        destination1 = self.create_destination('Test destination1',
+                                               [beach, lower])
+        destination2 = self.create_destination('Test destination2',
+                                               [plural, other])
+        destination3 = self.create_destination('Test destination3', [lower])
+
+        res = self.client.post(merge_url(beach.id),
+                               {'sources': [lower.id, plural.id]},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'id': beach.id, 'name': 'Beach',
+                                    'destination_count': 3})
+        self.assertEqual(set(Tag.objects.all()), {beach, other})
+        for destination in (destination1, destination2, destination3):
+            destination.refresh_from_db()
+        self.assertEqual(destination1.cached_tags, [[beach.id, 'Beach']])
+        self.assertEqual(destination2.cached_tags,
+                         [[beach.id, 'Beach'], [other.id, 'Mountain']])
+        self.assertEqual(list(destination3.tags.all()), [beach])
+        self.assertEqual(
+            dict(UserStat.objects.filter(dimension=UserStat.TAG)
+                 .values_list('key', 'destination_count')),
+            {str(beach.id): 3, str(other.id): 1})
+
+    def test_merge_invalid_sources(self):
+        """Test merging unknown tags or a tag into itself fails"""
+        user2 = get_user_model().objects.create_user(
+            email='test2@example.com',
+            password='testpass'
+            )
+        tag = Tag.objects.create(user=self.user, name='Test tag')
+        other = Tag.objects.create(user=user2, name='Test tag')
+
+        for sources in ([other.id], [tag.id], []):
+            res = self.client.post(merge_url(tag.id), {'sources': sources},
+                                   format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.count(), 2)
+
+        res = self.client.post(merge_url(other.id), {'sources': [tag.id]},
+                               format='json')
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -16,5 +16,7 @@ router.register('destinations', views.DestinationViewSet)
 router.register('tags', views.TagViewSet)
 router.register('features', views.FeatureViewSet)
 urlpatterns = [
+    path('stats/', views.DestinationStatsView.as_view(), name='stats'),
+    path('changes/', views.DestinationChangesView.as_view(), name='changes'),
     path('', include(router.urls))
 ]
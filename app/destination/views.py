@@ -1,14 +1,115 @@
+import os
+import re
+from decimal import Decimal
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
 from rest_framework import viewsets, mixins, status
 from rest_framework.authentication import TokenAuthentication
+from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from api.models import Destination, Tag, Feature
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
+from api.models import Destination, Tag, Feature, ImageUpload, UserStat
+from api import bulk, denorm, events, sync, uploads
+from api.db.router import ReplicaReadMixin
+from api.throttling import WriteThrottleMixin
 from destination import serializers
 from drf_spectacular.utils import OpenApiParameter, \
     OpenApiTypes, extend_schema, extend_schema_view
 
 
+# Content-Range header of a chunk, e.g. "bytes 0-1048575/4194304"
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+# orderings of the tag and feature lists
+ATTR_ORDERINGS = ('name', '-name', 'destination_count', '-destination_count')
+UPLOAD_ID_PARAMETER = OpenApiParameter(
+    name='upload_id',
+    type=OpenApiTypes.UUID,
+    location=OpenApiParameter.PATH,
+)
+
+
+class BulkMixin:
+    """
+    Viewset mixin updating or deleting many items of the user in one
+    request at bulk/, selected by their ids and the filters of the list,
+    with set-based statements instead of one request per item; the
+    viewset changes them in perform_bulk_update(ids, values) and
+    perform_bulk_destroy(ids)
+    """
+    # query parameters of the list also selecting the items
+    bulk_filter_params = ()
+
+    def has_bulk_filters(self):
+        """Whether the query parameters narrow down the items"""
+        return any(self.request.query_params.get(param)
+                   for param in self.bulk_filter_params)
+
+    def bulk_ids(self, ids):
+        """Return the ids of the items selected by the request"""
+        # without ids nor filters every item would be selected
+        if ids is None and not self.has_bulk_filters():
+            raise ValidationError(
+                {'ids': ['Select the items by ids or by the filters '
+                         'of the list.']})
+        queryset = self.get_queryset()
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        ids = list(queryset.values_list('id', flat=True)
+                   [:settings.BULK_MAX_ITEMS + 1])
+        if len(ids) > settings.BULK_MAX_ITEMS:
+            raise ValidationError(
+                {'detail': f'The filters select more than '
+                           f'{settings.BULK_MAX_ITEMS} items.'})
+        return ids
+
+    @extend_schema(responses=serializers.BulkResultSerializer)
+    @action(methods=['PATCH'], detail=False, url_path='bulk')
+    def bulk_update(self, request):
+        """
+        Set the same values on the items of the ids, or on the items
+        the filters of the list select
+        """
+        serializer = self.get_serializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        values = dict(serializer.validated_data)
+        ids = self.bulk_ids(values.pop('ids', None))
+        count = self.perform_bulk_update(ids, values)
+        return Response({'count': count})
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='ids',
+                type=OpenApiTypes.STR,
+                description='Comma seperated IDs, \
+                    or a body {"ids": [...]}',
+            ),
+        ],
+        responses={200: serializers.BulkResultSerializer},
+    )
+    @bulk_update.mapping.delete
+    def bulk_destroy(self, request):
+        """
+        Delete the items of the ids, or the items the filters of the
+        list select
+        """
+        data = request.data
+        # not every client sends a body with DELETE
+        if not data and request.query_params.get('ids'):
+            data = {'ids': request.query_params['ids'].split(',')}
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        ids = self.bulk_ids(serializer.validated_data.get('ids'))
+        count = self.perform_bulk_destroy(ids)
+        return Response({'count': count})
+
+
 # extend auto-generated schema by drf-spectacular
 @extend_schema_view(
     list=extend_schema(
@@ -29,13 +130,18 @@ from drf_spectacular.utils import OpenApiParameter, \
         ]
     ),
 )
-class DestinationViewSet(viewsets.ModelViewSet):
+class DestinationViewSet(ReplicaReadMixin, WriteThrottleMixin, BulkMixin,
+                         viewsets.ModelViewSet):
     """Manage destinations in the database"""
     serializer_class = serializers.DestinationDetailSerializer
-    # query the database for all destinations
-    queryset = Destination.objects.all()
+    # query the database for all destinations,
+    # fetching the tags and features of a page in one query each
+    queryset = Destination.objects.prefetch_related('tags', 'features')
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    # a POST to batch/ only reads, for lists of ids too long for a URL
+    read_actions = ('batch',)
+    bulk_filter_params = ('tags', 'features')
 
     def id_to_ints(self, qs):
         """Convert comma seperated id from to integer"""
@@ -58,10 +164,15 @@ class DestinationViewSet(viewsets.ModelViewSet):
             where the ID of their related 'tag' objects
             is in a provided list of IDs
             '''
-            queryset = self.queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(tags__id__in=tag_ids)
         if features:
             feature_ids = self.id_to_ints(features)
-            queryset = self.queryset.filter(features__id__in=feature_ids)
+            # narrows the destinations of the tags down, if any
+            queryset = queryset.filter(features__id__in=feature_ids)
+
+        if self.action == 'list' and settings.DESTINATION_CACHED_NAMES:
+            # the names are read from the destination rows
+            queryset = queryset.prefetch_related(None)
 
         return (queryset.filter(user=self.request.user)
                         .order_by('-id')
@@ -70,15 +181,74 @@ class DestinationViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         if self.action == 'list':
+            if settings.DESTINATION_CACHED_NAMES:
+                return serializers.DestinationListSerializer
             return serializers.DestinationSerializer
-        elif self.action == 'upload_image':
+        elif self.action == 'batch':
+            return serializers.DestinationIdsSerializer
+        elif self.action == 'bulk_update':
+            return serializers.DestinationBulkUpdateSerializer
+        elif self.action == 'bulk_destroy':
+            return serializers.BulkSelectionSerializer
+        elif self.action in ('upload_image', 'upload_finalize'):
             return serializers.DestinationImageSerializer
+        elif self.action in ('uploads', 'upload_session', 'upload_chunk',
+                             'upload_abort'):
+            return serializers.ImageUploadSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
         """Create a new destination"""
         serializer.save(user=self.request.user)
 
+    def perform_bulk_update(self, ids, values):
+        return bulk.update_destinations(self.request.user, ids, values)
+
+    def perform_bulk_destroy(self, ids):
+        return bulk.delete_destinations(self.request.user, ids)
+
+    @extend_schema(
+        description="Retrieve the destinations of a list of ids at once",
+        parameters=[
+            OpenApiParameter(
+                name='ids',
+                type=OpenApiTypes.STR,
+                description='Comma seperated destination IDs, \
+                    or a POST body {"ids": [...]}',
+            ),
+        ],
+        responses=serializers.DestinationBatchSerializer,
+    )
+    @action(methods=['GET', 'POST'], detail=False, url_path='batch')
+    def batch(self, request):
+        """
+        Return the destinations of the ids owned by the user in the
+        order of the ids, and the ids not found
+        """
+        if request.method == 'GET':
+            ids = request.query_params.get('ids', '')
+            data = {'ids': ids.split(',') if ids else []}
+        else:
+            data = request.data
+        serializer = self.get_serializer(data=data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ids = serializer.validated_data['ids']
+        # one query for the destinations, one for each prefetch
+        destinations = {
+            destination.id: destination
+            for destination in self.get_queryset().filter(id__in=ids)
+        }
+        return Response(serializers.DestinationBatchSerializer({
+            'results': [destinations[id_] for id_ in ids
+                        if id_ in destinations],
+            'missing': [id_ for id_ in ids if id_ not in destinations],
+        }, context=self.get_serializer_context()).data)
+
     # @action decorator to create custom upload image action
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
@@ -101,9 +271,328 @@ class DestinationViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    def get_upload(self, destination, upload_id):
+        """Return the valid upload session of the destination or raise 404"""
+        return get_object_or_404(
+            ImageUpload,
+            id=upload_id,
+            destination=destination,
+            user=self.request.user,
+            created_at__gte=uploads.expiry()
+        )
+
+    def upload_response(self, upload, status_code=status.HTTP_200_OK):
+        """Return the upload state, with the received range as header"""
+        serializer = serializers.ImageUploadSerializer(upload)
+        response = Response(serializer.data, status=status_code)
+        if upload.offset:
+            response['Range'] = f'bytes=0-{upload.offset - 1}'
+        return response
+
+    def discard_upload(self, upload):
+        """Delete the upload session and its partial file"""
+        try:
+            os.remove(upload.temp_path)
+        except FileNotFoundError:
+            pass
+        upload.delete()
+
+    # resumable upload protocol:
+    # 1. POST uploads/ with file_name and size to open a session
+    # 2. PUT uploads/{id}/ with a Content-Range header for each chunk,
+    #    after a dropped connection GET uploads/{id}/ returns the offset
+    #    to resume from, so only the missing bytes are sent again; a
+    #    chunk is read in memory, so it is refused above
+    #    DATA_UPLOAD_MAX_MEMORY_SIZE bytes (2.5 MB by default)
+    # 3. POST uploads/{id}/finalize/ to attach the image to the destination
+    # a session expires RESUMABLE_UPLOAD_EXPIRY_HOURS after step 1,
+    # see api/uploads.py
+    @action(methods=['POST'], detail=True, url_path='uploads')
+    def uploads(self, request, pk=None):
+        """Start a resumable image upload for a destination"""
+        destination = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+
+        if serializer.is_valid():
+            os.makedirs(settings.RESUMABLE_UPLOAD_DIR, exist_ok=True)
+            upload = serializer.save(
+                user=request.user,
+                destination=destination
+            )
+            # create the empty partial file the chunks are written to
+            open(upload.temp_path, 'wb').close()
+            return self.upload_response(upload, status.HTTP_201_CREATED)
+
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    @extend_schema(parameters=[UPLOAD_ID_PARAMETER])
+    @action(methods=['GET'], detail=True,
+            url_path=r'uploads/(?P<upload_id>[^/.]+)')
+    def upload_session(self, request, pk=None, upload_id=None):
+        """Return how many bytes of the upload have been received"""
+        upload = self.get_upload(self.get_object(), upload_id)
+        return self.upload_response(upload)
+
+    @extend_schema(
+        request={'application/octet-stream': OpenApiTypes.BINARY},
+        parameters=[
+            UPLOAD_ID_PARAMETER,
+            OpenApiParameter(
+                name='Content-Range',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                required=True,
+                description='Byte range of the chunk, \
+                    e.g. "bytes 0-1048575/4194304"',
+            ),
+        ]
+    )
+    @upload_session.mapping.put
+    def upload_chunk(self, request, pk=None, upload_id=None):
+        """Write a chunk of the image at its byte offset"""
+        upload = self.get_upload(self.get_object(), upload_id)
+        match = CONTENT_RANGE_RE.match(
+            request.META.get('HTTP_CONTENT_RANGE', ''))
+        chunk = request.body
+
+        if match is None:
+            return Response(
+                {'detail': 'A "Content-Range: bytes start-end/size" '
+                           'header is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start, end, size = (int(value) for value in match.groups())
+        if size != upload.size or start > end or end >= size \
+                or end - start + 1 != len(chunk):
+            return Response(
+                {'detail': 'Content-Range does not match the upload '
+                           'size or the chunk length'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            # lock the session so concurrent retries of the same chunk
+            # cannot interleave their writes
+            upload = ImageUpload.objects.select_for_update().get(
+                pk=upload.pk)
+            # a gap before the chunk, the client must resume from offset
+            if start > upload.offset:
+                return self.upload_response(upload, status.HTTP_409_CONFLICT)
+            # skip bytes that were already received by an earlier attempt
+            if end >= upload.offset:
+                try:
+                    with open(upload.temp_path, 'r+b') as part:
+                        part.seek(upload.offset)
+                        part.write(chunk[upload.offset - start:])
+                except FileNotFoundError:
+                    # partial file is gone, restart the upload from zero
+                    open(upload.temp_path, 'wb').close()
+                    upload.offset = 0
+                    upload.save(update_fields=['offset'])
+                    return self.upload_response(
+                        upload, status.HTTP_409_CONFLICT)
+                upload.offset = end + 1
+                upload.save(update_fields=['offset'])
+
+        return self.upload_response(upload)
+
+    @extend_schema(parameters=[UPLOAD_ID_PARAMETER])
+    @upload_session.mapping.delete
+    def upload_abort(self, request, pk=None, upload_id=None):
+        """Cancel an upload and delete the received bytes"""
+        upload = self.get_upload(self.get_object(), upload_id)
+        self.discard_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @extend_schema(request=None, parameters=[UPLOAD_ID_PARAMETER])
+    @action(methods=['POST'], detail=True,
+            url_path=r'uploads/(?P<upload_id>[^/.]+)/finalize')
+    def upload_finalize(self, request, pk=None, upload_id=None):
+        """Attach a completely received upload as the destination image"""
+        destination = self.get_object()
+        upload = self.get_upload(destination, upload_id)
+
+        if not upload.is_complete:
+            return self.upload_response(upload, status.HTTP_409_CONFLICT)
+
+        # validate and store the file through the same serializer
+        # as the single request upload-image action
+        with open(upload.temp_path, 'rb') as part:
+            image = UploadedFile(part, name=upload.file_name,
+                                 size=upload.size)
+            serializer = self.get_serializer(
+                destination,
+                data={'image': image}
+            )
+            is_valid = serializer.is_valid()
+            if is_valid:
+                serializer.save()
+
+        self.discard_upload(upload)
+        if is_valid:
+            return Response(
+                serializer.data,
+                status=status.HTTP_200_OK
+            )
+
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+# parameters of the tag and feature lists besides is_*_destination
+ATTR_LIST_PARAMETERS = [
+    OpenApiParameter(
+        name='with_counts',
+        type=OpenApiTypes.INT, enum=[0, 1],
+        description='Return the number of destinations \
+            of each item as destination_count?',
+    ),
+    OpenApiParameter(
+        name='ordering',
+        type=OpenApiTypes.STR,
+        enum=list(ATTR_ORDERINGS),
+        description='Sort by name, the default is -name, \
+            or by the number of destinations',
+    ),
+]
+
+
+class AttrPagination(LimitOffsetPagination):
+    """
+    Pages of tags or features, only when ?limit= is given,
+    so the plain list stays as it was for existing clients
+    """
+    max_limit = 1000
+
+
+class BaseAttrViewSet(ReplicaReadMixin, WriteThrottleMixin, BulkMixin,
+                      viewsets.GenericViewSet,
+                      mixins.ListModelMixin,
+                      mixins.UpdateModelMixin,
+                      mixins.DestroyModelMixin,):
+    """Base viewset of the tags and features of the user"""
+    authentication_classes = (TokenAuthentication,)
+    # user must be authenticated to use this API endpoint
+    permission_classes = (IsAuthenticated,)
+    pagination_class = AttrPagination
+    # query parameter filtering the items assigned to a destination
+    assigned_param = None
+    # serializer of the items with their destination_count
+    count_serializer_class = None
+    # serializer of the values set by a bulk update
+    bulk_update_serializer_class = None
+    # relation of destinations to the items
+    relation = None
+
+    def with_counts(self):
+        """Whether the destination counts are returned or sorted by"""
+        return bool(int(self.request.query_params.get('with_counts', 0))) \
+            or 'destination_count' in self.get_ordering()
+
+    def has_bulk_filters(self):
+        # is_*_destination=0 lists all items
+        return bool(int(self.request.query_params.get(self.assigned_param, 0)))
+
+    def get_ordering(self):
+        ordering = self.request.query_params.get('ordering', '-name')
+        return ordering if ordering in ATTR_ORDERINGS else '-name'
+
+    # overwrite the get_queryset method
+    def get_queryset(self):
+        """Return objects for the current authenticated user only"""
+        queryset = self.queryset.filter(user=self.request.user)
+
+        # if is_*_destination is provided in the query params,
+        # filter the items that are assigned to a destination
+        if bool(int(self.request.query_params.get(self.assigned_param, 0))):
+            # EXISTS stops at the first destination of each item,
+            # instead of joining all of them and removing duplicates
+            model = self.queryset.model
+            queryset = queryset.filter(Exists(
+                model.destination_set.through.objects.filter(
+                    **{model._meta.model_name: OuterRef('pk')})))
+
+        if self.action == 'list' and self.with_counts():
+            queryset = queryset.annotate(
+                destination_count=Count('destination'))
+
+        # the id breaks ties, so pages do not overlap
+        return queryset.order_by(self.get_ordering(), 'id')
+
+    def get_serializer_class(self):
+        """Return appropriate serializer class"""
+        if self.action == 'list' and self.with_counts():
+            return self.count_serializer_class
+        elif self.action == 'bulk_update':
+            return self.bulk_update_serializer_class
+        elif self.action == 'bulk_destroy':
+            return serializers.BulkSelectionSerializer
+        elif self.action == 'merge':
+            return serializers.MergeSerializer
+        return self.serializer_class
+
+    def perform_update(self, serializer):
+        """Update the denormalized names when the item is renamed"""
+        old_name = serializer.instance.name
+        instance = serializer.save()
+        if instance.name != old_name:
+            updated = denorm.refresh(
+                instance.destination_set.values_list('id', flat=True),
+                (self.relation,))
+            events.publish(self.request.user.id, 'destinations',
+                           events.UPDATED, updated)
+
+    def perform_destroy(self, instance):
+        """Remove the item from the denormalized names"""
+        destination_ids = list(
+            instance.destination_set.values_list('id', flat=True))
+        instance.delete()
+        denorm.refresh(destination_ids, (self.relation,))
+        events.publish(self.request.user.id, 'destinations', events.UPDATED,
+                       destination_ids)
+
+    # merges are done with set-based statements, so merging items linked
+    # to many destinations stays a short transaction
+    @action(methods=['POST'], detail=True, url_path='merge')
+    def merge(self, request, pk=None):
+        """
+        Fold the source items into this one: their destinations are
+        linked to it and the sources are deleted
+        """
+        target = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sources = serializer.validated_data['sources']
+        if target.id in sources:
+            raise ValidationError(
+                {'sources': ['An item cannot be merged into itself.']})
+        found = set(self.get_queryset().filter(id__in=sources)
+                    .values_list('id', flat=True))
+        missing = [source for source in sources if source not in found]
+        if missing:
+            raise ValidationError(
+                {'sources': [f'Unknown ids: {missing}']})
+
+        bulk.merge_targets(
+            self.queryset.model, request.user, target.id, sources)
+        target = self.queryset.annotate(
+            destination_count=Count('destination')).get(id=target.id)
+        return Response(self.count_serializer_class(target).data)
+
+    def perform_bulk_update(self, ids, values):
+        return bulk.update_targets(
+            self.queryset.model, self.request.user, ids, values)
+
+    def perform_bulk_destroy(self, ids):
+        return bulk.delete_targets(
+            self.queryset.model, self.request.user, ids)
+
 
-# viewsets.GenericViewSet allows to use the mixins
-# which allows GET and PATCH
 # extend_schema_view decorator to extend
 # auto-generated schema by drf-spectacular
 @extend_schema_view(
@@ -116,36 +605,20 @@ class DestinationViewSet(viewsets.ModelViewSet):
                 description='Is filter tags that \
                     are assigned to a destination?',
             ),
+            *ATTR_LIST_PARAMETERS,
         ]
     ),
+    merge=extend_schema(responses=serializers.TagCountSerializer),
 )
-class TagViewSet(viewsets.GenericViewSet,
-                 mixins.ListModelMixin,
-                 mixins.UpdateModelMixin,
-                 mixins.DestroyModelMixin,):
+class TagViewSet(BaseAttrViewSet):
     """Manage tags in the database"""
     serializer_class = serializers.TagSerializer
+    count_serializer_class = serializers.TagCountSerializer
+    bulk_update_serializer_class = serializers.TagBulkUpdateSerializer
     # query the database for all tags
     queryset = Tag.objects.all()
-    authentication_classes = (TokenAuthentication,)
-    permission_classes = (IsAuthenticated,)
-
-    # overwrite the get_queryset method
-    def get_queryset(self):
-        """Return objects for the current authenticated user only"""
-
-        # if is_tag_destination is provided in the query params
-        is_tag_destination = bool(int(
-            self.request.query_params.get('is_tag_destination', 0)))
-
-        queryset = self.queryset
-        # if True, filter tags that are assigned to a destination
-        if is_tag_destination:
-            queryset = queryset.filter(destination__isnull=False)
-
-        return (queryset.filter(user=self.request.user)
-                .order_by('-name')
-                .distinct())
+    assigned_param = 'is_tag_destination'
+    relation = 'tags'
 
 
 @extend_schema_view(
@@ -158,33 +631,115 @@ class TagViewSet(viewsets.GenericViewSet,
                 description='Is filter features that \
                     are assigned to a destination?',
             ),
+            *ATTR_LIST_PARAMETERS,
         ]
     ),
+    merge=extend_schema(responses=serializers.FeatureCountSerializer),
 )
-class FeatureViewSet(viewsets.GenericViewSet,
-                     mixins.ListModelMixin,
-                     mixins.UpdateModelMixin,
-                     mixins.DestroyModelMixin,):
+class FeatureViewSet(BaseAttrViewSet):
     """Manage features in the database"""
     serializer_class = serializers.FeatureSerializer
-
+    count_serializer_class = serializers.FeatureCountSerializer
+    bulk_update_serializer_class = serializers.FeatureBulkUpdateSerializer
     # query the database for all features
     queryset = Feature.objects.all()
+    assigned_param = 'is_feature_destination'
+    relation = 'features'
 
+
+class DestinationStatsView(ReplicaReadMixin, APIView):
+    """
+    Destination count and average rating of the user, in total and per
+    country, tag and feature, read from the statistics maintained on
+    every write instead of aggregating the destinations
+    """
     authentication_classes = (TokenAuthentication,)
-    # user must be authenticated to use this API endpoint
     permission_classes = (IsAuthenticated,)
 
-    def get_queryset(self):
-        """Return objects for the current authenticated user only"""
+    @extend_schema(responses=serializers.DestinationStatsSerializer)
+    def get(self, request, *args, **kwargs):
+        rows = {dimension: [] for dimension, _ in UserStat.DIMENSIONS}
+        for row in UserStat.objects.filter(user=request.user,
+                                           destination_count__gt=0):
+            row.average_rating = \
+                (row.rating_sum / row.destination_count).quantize(
+                    Decimal('0.01'))
+            rows[row.dimension].append(row)
+        total = next(iter(rows[UserStat.TOTAL]), None)
 
-        is_feature_destination = bool(int(
-            self.request.query_params.get('is_feature_destination', 0)))
+        data = {
+            'destination_count': total.destination_count if total else 0,
+            'average_rating': total.average_rating if total else None,
+            'countries': [
+                {'country': row.key,
+                 'destination_count': row.destination_count,
+                 'average_rating': row.average_rating}
+                for row in rows[UserStat.COUNTRY]],
+        }
+        for name, model, dimension in (('tags', Tag, UserStat.TAG),
+                                       ('features', Feature,
+                                        UserStat.FEATURE)):
+            names = dict(model.objects.filter(
+                user=request.user,
+                id__in=[int(row.key) for row in rows[dimension]]
+            ).values_list('id', 'name'))
+            data[name] = [
+                {'id': int(row.key), 'name': names[int(row.key)],
+                 'destination_count': row.destination_count,
+                 'average_rating': row.average_rating}
+                for row in rows[dimension] if int(row.key) in names]
+        for items in (data['countries'], data['tags'], data['features']):
+            items.sort(key=lambda item: -item['destination_count'])
 
-        queryset = self.queryset
-        if is_feature_destination:
-            queryset = queryset.filter(destination__isnull=False)
+        return Response(serializers.DestinationStatsSerializer(data).data)
 
-        return (queryset.filter(user=self.request.user)
-                .order_by('-name')
-                .distinct())
+
+class DestinationChangesView(APIView):
+    """
+    Destinations, tags and features of the user changed or deleted
+    since the cursor of the previous sync, a page at a time. Without a
+    cursor every item is sent, the cursor of the response continues
+    from there. The last few seconds of changes are held back until
+    the writes in progress commit.
+    """
+    # read from the primary, the changes are not held back long enough
+    # for the replication lag
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name='since',
+                type=OpenApiTypes.STR,
+                description='Cursor of the previous response',
+            ),
+            OpenApiParameter(
+                name='limit',
+                type=OpenApiTypes.INT,
+                description='Most changes in the page',
+            ),
+        ],
+        responses={200: serializers.ChangesSerializer,
+                   410: OpenApiTypes.OBJECT},
+    )
+    def get(self, request, *args, **kwargs):
+        cursor = sync.START
+        if request.query_params.get('since'):
+            try:
+                cursor = sync.parse_cursor(request.query_params['since'])
+            except ValueError:
+                raise ValidationError({'since': ['Invalid cursor.']})
+        if sync.expired(cursor):
+            return Response(
+                {'detail': 'The cursor expired, sync again without it.'},
+                status=status.HTTP_410_GONE)
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.SYNC_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'limit': ['A valid integer is required.']})
+        limit = max(1, min(limit, settings.SYNC_PAGE_SIZE))
+
+        page = sync.changes(request.user, cursor, limit)
+        return Response(serializers.ChangesSerializer(page).data)
@@ -1,12 +1,19 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, authentication, permissions, status
+from rest_framework.response import Response
 from user.serializers import UserSerializer, AuthTokenSerializer
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from api import purge
+from api.throttling import IPTokenBucketThrottle
+from drf_spectacular.utils import extend_schema
 
 
 class CreateUserView(generics.CreateAPIView):
     """Create a new user in the system"""
     serializer_class = UserSerializer
+    # hashing the password is expensive, limit the calls per client
+    throttle_classes = (IPTokenBucketThrottle,)
+    throttle_scope = 'auth'
 
 
 class CreateTokenView(ObtainAuthToken):
@@ -14,10 +21,12 @@ class CreateTokenView(ObtainAuthToken):
     # add renderer_classes to enable the view in the django admin page
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
     serializer_class = AuthTokenSerializer
+    throttle_classes = (IPTokenBucketThrottle,)
+    throttle_scope = 'auth'
 
 
-class UpdateUserView(generics.RetrieveUpdateAPIView):
-    """Update the authenticated user"""
+class UpdateUserView(generics.RetrieveUpdateDestroyAPIView):
+    """Update or delete the authenticated user"""
     serializer_class = UserSerializer
     # add authentication and permission classes
     authentication_classes = (authentication.TokenAuthentication,)
@@ -27,3 +36,12 @@ class UpdateUserView(generics.RetrieveUpdateAPIView):
         """Get and return the authenticated user"""
         # the user is automatically assigned to the request
         return self.request.user
+
+    @extend_schema(responses={202: None})
+    def delete(self, request, *args, **kwargs):
+        """
+        Deactivate the authenticated user at once, their data is deleted
+        in the background by the purge_users command
+        """
+        purge.request(self.get_object())
+        return Response(status=status.HTTP_202_ACCEPTED)
@@ -5,6 +5,12 @@ server {
         alias /app/proxy/static;
     }
 
+    location /api/async/ {
+        proxy_pass http://${ASYNC_APP_HOST}:${ASYNC_APP_PORT};
+        proxy_http_version 1.1;
+        proxy_buffering off;
+    }
+
     location / {
         uwsgi_pass ${APP_HOST}:${APP_PORT};
         include /etc/nginx/uwsgi_params;
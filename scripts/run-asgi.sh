@@ -0,0 +1,11 @@
+#!/bin/sh
+
+# Run the ASGI server for the async read path,
+# migrations are applied by the uWSGI container (scripts/run.sh)
+
+set -e
+
+python manage.py wait_for_db
+
+uvicorn app.asgi:application --host 0.0.0.0 --port 9000 \
+    --workers "${WORKERS:-4}" --no-access-log
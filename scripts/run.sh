@@ -4,8 +4,13 @@
 
 set -e
 
-python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
+# wait for the database, then collect static files and migrate only
+# when something changed, in a single process
+python manage.py startup
 
-uwsgi --socket :9090 --workers 4 --master --enable-threads --module app.wsgi
+# start the counters of the new workers from zero
+rm -rf "${METRICS_DIR:-/tmp/metrics}"
+
+# the application is loaded once in the master and shared by the forked
+# workers, see app/wsgi.py, so do not add --lazy-apps
+uwsgi --socket :9090 --workers "${WORKERS:-4}" --master --enable-threads --module app.wsgi